@@ -1,94 +1,48 @@
 import random
+import ChessLogging
+from ChessEvaluation import evaluate, MATE_SCORE, DRAW_SCORE
 from ChessEngine import GameState
+from ChessSearch import Searcher
+from ChessTranspositionTable import TranspositionTable
 
-piecesScore = {
-    "K": 0, "Q": 90, "R": 50,
-    "B": 30, "N": 30, "p": 10
-}
-
-wK = [
-    [-3.0, -4.0, -4.0, -5.0, -5.0, -4.0, -4.0, -3.0],
-    [-3.0, -4.0, -4.0, -5.0, -5.0, -4.0, -4.0, -3.0],
-    [-3.0, -4.0, -4.0, -5.0, -5.0, -4.0, -4.0, -3.0],
-    [-3.0, -4.0, -4.0, -5.0, -5.0, -4.0, -4.0, -3.0],
-    [-2.0, -3.0, -3.0, -4.0, -4.0, -3.0, -3.0, -2.0],
-    [-1.0, -2.0, -2.0, -2.0, -2.0, -2.0, -2.0, -1.0],
-    [2.0, 2.0, 0.0, 0.0, 0.0, 0.0, 2.0, 2.0],
-    [2.0, 3.0, 1.0, 0.0, 0.0, 1.0, 3.0, 2.0]
-]
-
-wQ = [
-    [-2, -1, -1, -0.5, -0, .5 - 1, -1, -2],
-    [-1, 0, 0, 0, 0, 0, 0, -1],
-    [-1, 0, 0.5, 0.5, 0.5, 0.5, 0, -1],
-    [-0.5, 0, 0.5, 0.5, 0.5, 0.5, 0, -0.5],
-    [0, 0, 0.5, 0.5, 0.5, 0.5, 0, -0.5],
-    [-1, 0.5, 0.5, 0.5, 0.5, 0.5, 0, -1],
-    [-1, 0, 0.5, 0, 0, 0, 0, -1],
-    [-2, -1, -1, -0.5, -0.5, -1, -1, -2]
-]
-
-wR = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [0.5, 1, 1, 1, 1, 1, 1, 0.5],
-    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
-    [0, 0, 0, 0.5, 0.5, 0, 0, 0]
-]
-
-wB = [
-    [-2, -1, -1, -1, -1, -1, -1, -2],
-    [-1, 0, 0, 0, 0, 0, 0, -1],
-    [-1, 0, 0.5, 1, 1, 0.5, 0, -1],
-    [-1, 0.5, 0.5, 1, 1, 0.5, 0.5, -1],
-    [-1, 0, 1, 1, 1, 1, 0, -1],
-    [-1, 1, 1, 1, 1, 1, 1, -1],
-    [-2, -1, -1, -1, -1, -1, -1, -2]
-]
-
-wN = [
-    [-5, -4, -3, -3, -3, -3, -4, -5],
-    [-4, -2, 0, 0, 0, 0, -2, -4],
-    [-3, 0, 1, 1.5, 1.5, 1, 0, -3],
-    [-3, 0.5, 1.5, 2, 2, 1.5, 0.5, -3],
-    [-3, 0.5, 1, 1.5, 1.5, 1, 0.5, -3],
-    [-4, -2, 0, 0.5, 0.5, 0, -2, -4],
-    [-5, -4, -3, -3, -3, -3, -4, -5]
-]
-
-wp = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [5, 5, 5, 5, 5, 5, 5, 5],
-    [1, 1, 2, 3, 3, 2, 1, 1],
-    [0.5, 0.5, 1, 2.5, 2.5, 1, 0.5, 0.5],
-    [0, 0, 0, 2, 2, 0, 0, 0],
-    [0.5, -0.5, -1, 0, 0, -1, -0.5, 0.5],
-    [0.5, 1, 1, -2, -2, 1, 1, 0.5],
-    [0, 0, 0, 0, 0, 0, 0, 0]
-]
-
-CHECKMATE = 1000
-STALEMATE = -10000
-DEPTH = 2
-
-MAX_PLAYER_WORST = -10000
-MIN_PLAYER_WORST = 10000
+logger = ChessLogging.getLogger("ChessAI")
 
 MIN_MAX_WITHOUT_PRUNING = 1
 MIN_MAX_WITH_BETA_PRUNING = 2
 MIN_MAX_WITHOUT_PRUNING_EASY = 3
 NAIVE_BAYES_ML = 4
+# alpha-beta with the root moves split between worker processes (ChessParallelSearch)
+PARALLEL_ALPHA_BETA = 5
+
+# * Time budget of one move: remaining time / MOVES_TO_GO + most of the increment,
+# * never more than MAX_TIME_SHARE of the clock
+MOVES_TO_GO = 30
+INCREMENT_SHARE = 0.8
+MAX_TIME_SHARE = 0.25
+MIN_MOVE_TIME = 0.05
+
+# * The searcher of the game: its transposition table, killers and history carry over from one move to the next
+searcher = Searcher()
+
+
+'''
+workers: number of processes of the PARALLEL_ALPHA_BETA strategy, one per CPU core by default
+on_iteration: optional callback of the alpha-beta strategies, called with the ChessSearch.SearchResult so far
+after every completed iteration (depth, score, pv, nodes, stats), e.g. to display the search while it runs
+'''
 
 
-def move_with_strategy(gs: GameState, depth: int = 2, strategy=MIN_MAX_WITH_BETA_PRUNING, validMoves=None, chess_ml_engine = None):
-    global nextMove
-    nextMove = None
-    if strategy == MIN_MAX_WITH_BETA_PRUNING:
-        chess_alpha_beta_best_move(node=gs, depth=depth, alpha=MAX_PLAYER_WORST, beta=MIN_PLAYER_WORST,
-                                   is_max_player=True)
+def move_with_strategy(gs: GameState, depth: int = 2, strategy=MIN_MAX_WITH_BETA_PRUNING, validMoves=None, chess_ml_engine = None,
+                       time_limit=None, workers=None, on_iteration=None):
+    if strategy == PARALLEL_ALPHA_BETA:
+        from ChessParallelSearch import findBestMoveParallel
+        return findBestMoveParallel(gs, depth, workers, time_limit, searcher=searcher,
+                                    onIteration=on_iteration).bestMove
+    elif strategy == MIN_MAX_WITH_BETA_PRUNING:
+        # without a clock, a single iteration at the requested depth
+        result = searcher.search(gs, depth, time_limit, minDepth=1 if time_limit is not None else depth,
+                                 onIteration=on_iteration)
+        return result.bestMove
     # elif strategy == MIN_MAX_WITHOUT_PRUNING:
     #     findBestMoveMinMax(gs=gs, validMoves=validMoves, depth=depth)
     # elif strategy == MIN_MAX_WITHOUT_PRUNING_EASY:
@@ -96,93 +50,34 @@ def move_with_strategy(gs: GameState, depth: int = 2, strategy=MIN_MAX_WITH_BETA
     #     findBestMoveMinMaxEasy(gs=gs, validMoves=validMoves, depth=1)
     elif strategy == NAIVE_BAYES_ML:
         if not chess_ml_engine:
-            print("Engine not loading when making move")
-            raise Error("Unloaded Chess Engine")
-        from ChessHelper import ChessHelper
-        board_fen = ChessHelper.board_to_fen(gs.board)
-        nextMove = chess_ml_engine.predict_next_move(validMoves,board_fen )
+            logger.error("Engine not loading when making move")
+            raise RuntimeError("Unloaded Chess Engine")
+        return chess_ml_engine.predict_next_move(validMoves, gs.getFen())
     else:
         if depth > 1:
-            findBestMoveMinMax(gs, validMoves, depth)
+            return findBestMoveMinMax(gs, validMoves, depth)
         else:
-            findBestMoveMinMaxEasy(gs, validMoves)
-    return nextMove
+            return findBestMoveMinMaxEasy(gs, validMoves)
 
 
-# * ------------------- Code Refactor +  Alpha - beta pruning ----------------
-def isTerminalNode(gs: GameState):
-    return gs.check_game_ended()
+'''
+Time budget (seconds) for one move from the time left on the clock of the side to move and the increment per move
+'''
 
 
-# TODO: Calculate heuristic for the node based on material and the game flow (Some combination of pieces position are more powerful than others)
-def calculateHeuristicScoreForNode(gs: GameState):
-    return scoreMaterial(gs.board)
+def allocateMoveTime(remainingTime, increment=0, movesToGo=MOVES_TO_GO):
+    if remainingTime <= 0:
+        return MIN_MOVE_TIME
+    budget = remainingTime / movesToGo + increment * INCREMENT_SHARE
+    return max(MIN_MOVE_TIME, min(budget, remainingTime * MAX_TIME_SHARE))
 
 
-# TODO: For better performance we should not choose moves randomly when searching
-# TODO: ---> Move Order matters: Check for pawn structures + isolation + king postition + forks and pins
-# TODO: Below code is wrong in part that child is not a game state: GS = makeMove(currentGameState, child);
-def chessAlphaBeta(node: GameState, depth: int = 2, alpha: int = MAX_PLAYER_WORST, beta: int = MIN_PLAYER_WORST,
-                   is_max_player: bool = True):
-    if depth == 0 or isTerminalNode(node):
-        return calculateHeuristicScoreForNode(node)
-    if is_max_player:
-        value = MAX_PLAYER_WORST
-        for move in node.getValidMoves():
-            node.makeMove(move)
-            value = max(value, chessAlphaBeta(
-                node, depth - 1, alpha, beta, False))
-            node.undoMove()
-            if (value >= beta):
-                break  # Beta cutofff
-            alpha = max(alpha, value)
-        return value
-    # * Min Player:
-    else:
-        value = MIN_PLAYER_WORST
-        for move in node.getValidMoves():
-            node.makeMove(move)
-            value = min(value, chessAlphaBeta(
-                node, depth - 1, alpha, beta, True))
-            node.undoMove()
-            if value <= alpha:
-                break  # Alpha cutoff
-            beta = min(beta, value)
-        return value
+def setTranspositionTableSize(sizeMB):
+    searcher.transpositionTable = TranspositionTable(sizeMB)
 
 
-def chess_alpha_beta_best_move(node: GameState, depth, alpha, beta, is_max_player):
-    global nextMove
-    if depth == 0 or isTerminalNode(node):
-        return calculateHeuristicScoreForNode(node)
-    if is_max_player:
-        value = MAX_PLAYER_WORST
-        for move in node.getValidMoves():
-            node.makeMove(move)
-            value = max(value, chessAlphaBeta(
-                node, depth - 1, alpha, beta, False))
-            node.undoMove()
-            if (value >= beta):
-                break  # Beta cutofff
-            if value > alpha:
-                alpha = value
-                nextMove = move
-        return value
-    # * Min Player:
-    else:
-        value = MIN_PLAYER_WORST
-        for move in node.getValidMoves():
-            node.makeMove(move)
-            value = min(value, chessAlphaBeta(
-                node, depth - 1, alpha, beta, True))
-            node.undoMove()
-            if value <= alpha:
-                break  # Alpha cutoff
-            if value < beta:
-                beta = value
-                nextMove = move
-            beta = min(beta, value)
-        return value
+def setQuiescenceDepth(qDepth):
+    searcher.quiescenceDepth = qDepth
 
 
 # * ----------------------------------------------------------- *
@@ -190,146 +85,50 @@ def findRandomMove(validMoves):
     return validMoves[random.randint(0, len(validMoves) - 1)]
 
 
-def findBestMove(gs, validMoves):
-    turnMultiplier = 1 if gs.whiteToMove else -1
-    opponentMinMaxScore = CHECKMATE
-    bestPlayerMove = None
-    random.shuffle(validMoves)
-    for playerMove in validMoves:
-        gs.makeMove(playerMove)
-        opponentsMoves = gs.getValidMoves()
-        opponentMaxScore = -CHECKMATE
-        for opponentsMove in opponentsMoves:
-            gs.makeMove(opponentsMove)
-            if gs.checkmate:
-                score = -turnMultiplier * CHECKMATE
-            elif gs.stalemate:
-                score = STALEMATE
-            else:
-                score = -turnMultiplier * scoreMaterial(gs.board)
-            if score > opponentMaxScore:
-                opponentMaxScore = score
-            gs.undoMove()
-        if opponentMinMaxScore > opponentMaxScore:
-            opponentMinMaxScore = opponentMaxScore
-            bestPlayerMove = playerMove
-        gs.undoMove()
-    return bestPlayerMove
+def findBestMoveMinMax(gs: GameState, validMoves, depth=2):
+    return findMoveMinMax(gs, validMoves, depth, gs.whiteToMove)[1]
 
 
-def findBestMoveMinMax(gs: GameState, validMoves, depth=2):
-    global nextMove
-    nextMove = None
-    findMoveMinMax(gs, validMoves, depth, gs.whiteToMove)
-    return nextMove
+'''
+Plain minimax, the moves being shuffled so that equal scores do not always give the same move.
+Scores on the scale of the search: +/-MATE_SCORE for a mate, DRAW_SCORE for a stalemate.
+Return: (white-relative score, best Move of this node)
+'''
 
 
 def findMoveMinMax(gs, validMoves, depth, whiteToMove):
-    global nextMove
+    if not validMoves:
+        # checkmated or stalemate (gs.inCheck is set by getValidMoves)
+        return ((-MATE_SCORE if whiteToMove else MATE_SCORE) if gs.inCheck else DRAW_SCORE), None
     if depth == 0:
-        return scoreMaterial(gs.board)
+        return evaluate(gs), None
+    bestMove = None
     if whiteToMove:
-        maxScore = -CHECKMATE
+        maxScore = -MATE_SCORE
         random.shuffle(validMoves)
         for move in validMoves:
             gs.makeMove(move)
             nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves, depth - 1, False)
-            if score > maxScore:
+            score = findMoveMinMax(gs, nextMoves, depth - 1, False)[0]
+            if score > maxScore or bestMove is None:
                 maxScore = score
-                if depth == DEPTH:
-                    nextMove = move
+                bestMove = move
             gs.undoMove()
-        return maxScore
+        return maxScore, bestMove
     else:
-        minScore = CHECKMATE
+        minScore = MATE_SCORE
         random.shuffle(validMoves)
         for move in validMoves:
             gs.makeMove(move)
             nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves, depth - 1, True)
-            if score < minScore:
+            score = findMoveMinMax(gs, nextMoves, depth - 1, True)[0]
+            if score < minScore or bestMove is None:
                 minScore = score
-                if depth == DEPTH:
-                    nextMove = move
+                bestMove = move
             gs.undoMove()
-        return minScore
+        return minScore, bestMove
 
 
+# Move chosen is almost random: one ply only
 def findBestMoveMinMaxEasy(gs, validMoves):
-    global nextMove
-    nextMove = None
-    findMoveMinMaxEasy(gs, validMoves, 1, gs.whiteToMove)
-    return nextMove
-
-
-def findMoveMinMaxEasy(gs, validMoves, depth, whiteToMove):
-    global nextMove
-    if depth == 0:
-        return scoreMaterial(gs.board)
-    if whiteToMove:
-        maxScore = -CHECKMATE
-        random.shuffle(validMoves)
-        for move in validMoves:
-            gs.makeMove(move)
-            nextMoves = gs.getValidMoves()
-            score = findMoveMinMaxEasy(gs, nextMoves, depth - 1, False)
-            if score > maxScore:
-                maxScore = score
-                if depth == 1:
-                    nextMove = move
-            gs.undoMove()
-        return maxScore
-    else:
-        minScore = CHECKMATE
-        random.shuffle(validMoves)
-        for move in validMoves:
-            gs.makeMove(move)
-            nextMoves = gs.getValidMoves()
-            score = findMoveMinMaxEasy(gs, nextMoves, depth - 1, True)
-            if score < minScore:
-                minScore = score
-                if depth == 1:
-                    nextMove = move
-            gs.undoMove()
-        return minScore
-
-
-'''
->0 score -> good for white
-<0 score -> good for black
-'''
-
-
-def scoreBoard(gs):
-    if gs.checkmate:
-        if gs.whiteToMove:
-            return -CHECKMATE  # black wins
-        else:
-            return CHECKMATE  # white wins
-    elif gs.stalemate:
-        return STALEMATE
-    score = 0
-    for row in gs.board:
-        for square in row:
-            if square[0] == 'w':
-                score += piecesScore[square[1]]
-            elif square[0] == 'b':
-                score -= piecesScore[square[1]]
-    return score
-
-
-'''
-Score the board base on material
-'''
-
-
-def scoreMaterial(board):
-    score = 0
-    for row in board:
-        for square in row:
-            if square[0] == 'w':
-                score += piecesScore[square[1]]
-            elif square[0] == 'b':
-                score -= piecesScore[square[1]]
-    return score
+    return findMoveMinMax(gs, validMoves, 1, gs.whiteToMove)[1]
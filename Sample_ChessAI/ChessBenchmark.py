@@ -0,0 +1,191 @@
+import argparse
+import json
+import time
+
+import ChessEngine
+import ChessParallelSearch
+from ChessPerft import PERFT_SUITE, loadPosition
+from ChessSearch import Searcher, DEFAULT_QUIESCENCE_DEPTH, FUTILITY_MARGIN, EXTENDED_FUTILITY_MARGIN, RAZOR_MARGIN
+
+"""
+    Search benchmark: node count, time and best move of a ChessSearch.Searcher search at a fixed depth
+    on the perft positions, so that search changes (move ordering, pruning...) can be compared run to run.
+    Every (position, depth) search gets a new Searcher: empty transposition table and fresh killers / history.
+
+    Usage:
+        python ChessBenchmark.py                          # depths 3 to 5, all positions
+        python ChessBenchmark.py -d 3 4 --compare-ordering -o search.json
+        python ChessBenchmark.py -d 4 --workers 2 4 8     # speedup of the parallel root search
+"""
+
+DEFAULT_DEPTHS = [3, 4, 5]
+
+
+def searchPosition(fen, depth, engine=ChessEngine.MAILBOX_ENGINE, searcherSettings=None):
+    gameState = loadPosition(fen, engine)
+    searcher = Searcher(**(searcherSettings or {}))
+    result = searcher.search(gameState, depth, minDepth=depth)
+    return {
+        "depth": depth,
+        "nodes": result.nodes,
+        "seconds": round(result.elapsed, 4),
+        "nodesPerSecond": result.nodesPerSecond,
+        "score": result.score,
+        "bestMove": result.bestMove.getUciNotation() if result.bestMove else None,
+        "pv": [move.getUciNotation() for move in result.pv],
+        "ttHitRate": round(result.stats.ttHitRate, 4),
+        "stats": result.stats.toDict(),
+    }
+
+
+'''
+Same search with the root moves split between worker processes (ChessParallelSearch).
+The pool is started before the clock and every worker starts with an empty transposition table.
+'''
+
+
+def searchPositionParallel(fen, depth, workers, engine=ChessEngine.MAILBOX_ENGINE, shared=True, searcherSettings=None):
+    gameState = loadPosition(fen, engine)
+    searcher = Searcher(**(searcherSettings or {}))
+    ChessParallelSearch.shutdownPool()
+    ChessParallelSearch.getPool(workers, shared, searcher.transpositionTable.sizeMB)
+    start = time.perf_counter()
+    result = ChessParallelSearch.findBestMoveParallel(gameState, depth, workers, engine=engine, shared=shared,
+                                                      searcher=searcher)
+    elapsed = time.perf_counter() - start
+    return {
+        "depth": depth,
+        "workers": workers,
+        "nodes": result.nodes,
+        "seconds": round(elapsed, 4),
+        "nodesPerSecond": round(result.nodes / elapsed) if elapsed > 0 else None,
+        "score": result.score,
+        "bestMove": result.bestMove.getUciNotation() if result.bestMove else None,
+        "stats": result.stats.toDict(),
+    }
+
+
+'''
+searcherSettings: keyword arguments of the Searcher of every search (see ChessSearch.SEARCHER_SETTINGS)
+'''
+
+
+def runBenchmark(depths=DEFAULT_DEPTHS, engine=ChessEngine.MAILBOX_ENGINE, names=None, workerCounts=(),
+                 sharedTable=True, searcherSettings=None):
+    searcherSettings = searcherSettings or {}
+    positions = []
+    for name, (fen, _) in PERFT_SUITE.items():
+        if names and name not in names:
+            continue
+        results = [searchPosition(fen, depth, engine, searcherSettings) for depth in depths]
+        for result in results:
+            result["parallel"] = []
+            for workers in workerCounts:
+                parallel = searchPositionParallel(fen, result["depth"], workers, engine, sharedTable,
+                                                  searcherSettings)
+                parallel["speedup"] = round(result["seconds"] / parallel["seconds"], 2) if parallel["seconds"] else None
+                result["parallel"].append(parallel)
+        positions.append({"name": name, "fen": fen, "results": results})
+    return {
+        "engine": engine,
+        "settings": Searcher(**searcherSettings).getSettings(),
+        "workerCounts": list(workerCounts),
+        "sharedTable": sharedTable,
+        "nodes": sum(result["nodes"] for position in positions for result in position["results"]),
+        "seconds": round(sum(result["seconds"] for position in positions for result in position["results"]), 4),
+        "positions": positions,
+    }
+
+
+def printReport(report):
+    settings = "  ".join(f"{name}: {value}" for name, value in report["settings"].items())
+    print(f"Engine: {report['engine']}  {settings}")
+    for position in report["positions"]:
+        for result in position["results"]:
+            print(f"{position['name']:<10} depth {result['depth']}: {result['nodes']:>9} nodes "
+                  f"{result['seconds']:>8.2f}s  score {result['score']:>6}  best {result['bestMove']}  "
+                  f"tt hits {result['ttHitRate']:.1%}")
+            stats = result["stats"]
+            print(f"{'':<10} eval cache hits {stats['evalCacheHitRate']:.1%}  "
+                  f"pawn table hits {stats['pawnTableHitRate']:.1%}")
+            print(f"{'':<10} qnodes {stats['qnodes']:>9}  evals {stats['evaluations']:>9}  "
+                  f"cutoffs {stats['cutoffs']:>7} ({stats['firstMoveCutoffRate']:.1%} first move)  "
+                  f"tt cutoffs {stats['ttCutoffs']:>6}  {result['nodesPerSecond'] or 0} nodes/s")
+            print(f"{'':<10} null moves {stats['nullMoves']:>6} ({stats['nullMoveCutoffs']} cutoffs)  "
+                  f"reductions {stats['reductions']:>6} ({stats['reSearches']} re-searches)  "
+                  f"check extensions {stats['extensions']:>6}")
+            print(f"{'':<10} pvs re-searches {stats['pvsReSearches']:>6}  "
+                  f"aspiration re-searches {stats['aspirationReSearches']:>3}  "
+                  f"see prunes {stats['seePrunes']:>6}  pv {' '.join(result['pv'])}")
+            print(f"{'':<10} futility prunes {stats['futilityPrunes']:>6}  "
+                  f"extended futility prunes {stats['extendedFutilityPrunes']:>6}  "
+                  f"razor cutoffs {stats['razorCutoffs']:>6}")
+            for parallel in result.get("parallel", ()):
+                print(f"{'':<10} {parallel['workers']:>2} workers: {parallel['nodes']:>9} nodes "
+                      f"{parallel['seconds']:>8.2f}s  score {parallel['score']:>6}  best {parallel['bestMove']}  "
+                      f"speedup {parallel['speedup']}x")
+    print(f"Total: {report['nodes']} nodes in {report['seconds']:.2f}s")
+    if report.get("workerCounts"):
+        print(f"Worker transposition table: {'shared' if report['sharedTable'] else 'private'}")
+    for workers in report.get("workerCounts", ()):
+        results = [parallel for position in report["positions"] for result in position["results"]
+                   for parallel in result["parallel"] if parallel["workers"] == workers]
+        seconds = sum(parallel["seconds"] for parallel in results)
+        if seconds:
+            print(f"{workers} workers: {seconds:.2f}s, speedup {report['seconds'] / seconds:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Node counts of the principal variation search on the perft positions")
+    parser.add_argument("-d", "--depth", type=int, nargs="+", default=DEFAULT_DEPTHS)
+    parser.add_argument("-e", "--engine", default=ChessEngine.MAILBOX_ENGINE, choices=ChessEngine.AVAILABLE_ENGINES)
+    parser.add_argument("-p", "--position", action="append", choices=list(PERFT_SUITE),
+                        help="suite position to run (repeatable), all of them by default")
+    parser.add_argument("--compare-ordering", action="store_true",
+                        help="also run with the move ordering off (hash move only) and print both")
+    parser.add_argument("-q", "--quiescence-depth", type=int, default=DEFAULT_QUIESCENCE_DEPTH,
+                        help="longest capture sequence searched at the leaves (0: static evaluation)")
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[],
+                        help="also run the parallel root search with these numbers of worker processes")
+    parser.add_argument("--private-tables", action="store_true",
+                        help="give every worker its own transposition table instead of the shared one")
+    parser.add_argument("--no-null-move", action="store_true", help="turn the null-move pruning off")
+    parser.add_argument("--no-lmr", action="store_true", help="turn the late move reductions off")
+    parser.add_argument("--no-check-extensions", action="store_true", help="turn the check extensions off")
+    parser.add_argument("--no-aspiration", action="store_true",
+                        help="search every iteration with the full window instead of an aspiration window")
+    parser.add_argument("--no-see", action="store_true",
+                        help="turn the static exchange evaluation off (capture ordering and quiescence pruning)")
+    parser.add_argument("--no-futility", action="store_true", help="turn the futility pruning off")
+    parser.add_argument("--no-razoring", action="store_true", help="turn the razoring off")
+    parser.add_argument("--futility-margin", type=int, default=FUTILITY_MARGIN,
+                        help="futility margin at depth 1, in evaluation units (pawn = 10)")
+    parser.add_argument("--extended-futility-margin", type=int, default=EXTENDED_FUTILITY_MARGIN,
+                        help="futility margin at depth 2")
+    parser.add_argument("--razor-margin", type=int, default=RAZOR_MARGIN, help="razoring margin")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+    searcherSettings = {"quiescenceDepth": args.quiescence_depth, "nullMovePruning": not args.no_null_move,
+                        "lateMoveReductions": not args.no_lmr, "checkExtensions": not args.no_check_extensions,
+                        "aspirationWindows": not args.no_aspiration, "staticExchange": not args.no_see,
+                        "futilityPruning": not args.no_futility, "razoring": not args.no_razoring,
+                        "futilityMargin": args.futility_margin, "extendedFutilityMargin": args.extended_futility_margin,
+                        "razorMargin": args.razor_margin}
+
+    reports = []
+    if args.compare_ordering:
+        reports.append(runBenchmark(args.depth, args.engine, args.position,
+                                    searcherSettings=dict(searcherSettings, moveOrdering=False)))
+        printReport(reports[-1])
+    reports.append(runBenchmark(args.depth, args.engine, args.position, args.workers, not args.private_tables,
+                                searcherSettings))
+    printReport(reports[-1])
+    if len(reports) == 2 and reports[1]["nodes"]:
+        print(f"Nodes without / with move ordering: {reports[0]['nodes'] / reports[1]['nodes']:.2f}x")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports if len(reports) > 1 else reports[0], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
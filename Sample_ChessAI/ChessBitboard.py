@@ -0,0 +1,403 @@
+from ChessEngine import GameState, Move, getMove, DIRECTIONS, OPPOSITE_DIRECTIONS, KNIGHT_TARGETS, KING_TARGETS, RAYS, \
+    ALL_MOVES, CAPTURE_MOVES, QUIET_MOVES, CASTLE_WKS, CASTLE_BKS, CASTLE_WQS, CASTLE_BQS
+from ChessTypes import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK
+
+"""
+    Bitboard move generator.
+
+    Bit i of every 64-bit set is the square i of GameState.squares (row * 8 + col, a8 = 0, h1 = 63).
+    The position is kept as 12 piece sets (indexed by integer piece code) plus one occupancy set per side,
+    updated incrementally by makeMove / undoMove on top of the regular GameState bookkeeping.
+
+    Sliding attacks: for every square and every line through it (rank, file, diagonal, anti-diagonal)
+    the attack set is precomputed for each possible occupancy of that line.
+    The masked occupancy is looked up in a dict, which plays the role of the magic multiply / shift:
+        rookAttacks(sq, occ) = RANK_ATTACKS[sq][occ & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occ & FILE_MASKS[sq]]
+"""
+
+FULL_BOARD = (1 << 64) - 1
+FILE_A = sum(1 << (row * 8) for row in range(8))
+FILE_H = FILE_A << 7
+# Squares a pawn reaches after a single push from its starting row
+WHITE_DOUBLE_PUSH_ROW = 0xFF << 40
+BLACK_DOUBLE_PUSH_ROW = 0xFF << 16
+# Rows 8 and 1: a pawn getting there promotes
+PROMOTION_ROWS = 0xFF | (0xFF << 56)
+
+
+def _bits(squares):
+    bb = 0
+    for sq in squares:
+        bb |= 1 << sq
+    return bb
+
+
+def _iter_subsets(mask):
+    # Carry-Rippler trick: enumerate every subset of the mask
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0:
+            return
+
+
+def _line_tables(directions):
+    masks = []
+    tables = []
+    for sq in range(64):
+        mask = _bits(target for d in directions for target in RAYS[sq][d])
+        table = {}
+        for occupancy in _iter_subsets(mask):
+            attacks = 0
+            for d in directions:
+                for target in RAYS[sq][d]:
+                    attacks |= 1 << target
+                    if occupancy & (1 << target):
+                        break
+            table[occupancy] = attacks
+        masks.append(mask)
+        tables.append(table)
+    return tuple(masks), tuple(tables)
+
+
+KNIGHT_ATTACKS = tuple(_bits(targets) for targets in KNIGHT_TARGETS)
+KING_ATTACKS = tuple(_bits(targets) for targets in KING_TARGETS)
+# PAWN_ATTACKS[side][sq]: squares attacked by a pawn of that side standing on sq
+PAWN_ATTACKS = {
+    WHITE: tuple(_bits(RAYS[sq][d][0] for d in (4, 5) if RAYS[sq][d]) for sq in range(64)),
+    BLACK: tuple(_bits(RAYS[sq][d][0] for d in (6, 7) if RAYS[sq][d]) for sq in range(64)),
+}
+# Directions refer to ChessEngine.DIRECTIONS: 0/2 file, 1/3 rank, 4/7 diagonal, 5/6 anti-diagonal
+RANK_MASKS, RANK_ATTACKS = _line_tables((1, 3))
+FILE_MASKS, FILE_ATTACKS = _line_tables((0, 2))
+DIAGONAL_MASKS, DIAGONAL_ATTACKS = _line_tables((4, 7))
+ANTI_DIAGONAL_MASKS, ANTI_DIAGONAL_ATTACKS = _line_tables((5, 6))
+
+
+def _between_and_line():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for d in range(len(DIRECTIONS)):
+            ray = RAYS[sq][d]
+            full_line = _bits(ray) | _bits(RAYS[sq][OPPOSITE_DIRECTIONS[d]]) | (1 << sq)
+            passed = 0
+            for target in ray:
+                between[sq][target] = passed
+                line[sq][target] = full_line
+                passed |= 1 << target
+    return between, line
+
+
+# BETWEEN[a][b]: squares strictly between a and b when they share a line, LINE[a][b]: the whole line through both
+BETWEEN, LINE = _between_and_line()
+
+
+def rookAttacks(sq, occupancy):
+    return RANK_ATTACKS[sq][occupancy & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occupancy & FILE_MASKS[sq]]
+
+
+def bishopAttacks(sq, occupancy):
+    return DIAGONAL_ATTACKS[sq][occupancy & DIAGONAL_MASKS[sq]] | \
+        ANTI_DIAGONAL_ATTACKS[sq][occupancy & ANTI_DIAGONAL_MASKS[sq]]
+
+
+class BitboardGameState(GameState):
+    def __init__(self):
+        self.bitboards = [0] * ((BLACK | KING) + 1)
+        self.occupied = {WHITE: 0, BLACK: 0}
+        # GameState.__init__ assigns the initial board, which fills the piece sets (see setSquares)
+        super().__init__()
+
+    '''
+    Rebuild every piece set from GameState.squares
+    '''
+
+    def syncBitboards(self):
+        bitboards = [0] * len(self.bitboards)
+        occupied = {WHITE: 0, BLACK: 0}
+        for sq, piece in enumerate(self.squares):
+            if piece:
+                bitboards[piece] |= 1 << sq
+                occupied[WHITE if piece & WHITE else BLACK] |= 1 << sq
+        self.bitboards = bitboards
+        self.occupied = occupied
+
+    def setSquares(self, squares):
+        super().setSquares(squares)
+        self.syncBitboards()
+
+    '''
+    Apply (or revert, xor being its own inverse) the bitboard changes of a move
+    '''
+
+    def toggleMove(self, move: Move):
+        bitboards = self.bitboards
+        occupied = self.occupied
+        piece = move.pieceMoved
+        side = WHITE if piece & WHITE else BLACK
+        fromTo = (1 << move.startSq) | (1 << move.endSq)
+        bitboards[piece] ^= fromTo
+        occupied[side] ^= fromTo
+        if move.promotionPiece:  # the pawn turns into the promotion piece on the end square
+            endBit = 1 << move.endSq
+            bitboards[piece] ^= endBit
+            bitboards[side | move.promotionPiece] ^= endBit
+        captured = move.pieceCaptured
+        if captured:
+            capturedBit = 1 << (move.startRow * 8 + move.endCol if move.isEnPassantMove else move.endSq)
+            bitboards[captured] ^= capturedBit
+            occupied[side ^ (WHITE | BLACK)] ^= capturedBit
+        if move.isCastleMove:
+            if move.endSq - move.startSq == 2:  # king side
+                rookFromTo = (1 << (move.endSq + 1)) | (1 << (move.endSq - 1))
+            else:  # queen side
+                rookFromTo = (1 << (move.endSq - 2)) | (1 << (move.endSq + 1))
+            bitboards[side | ROOK] ^= rookFromTo
+            occupied[side] ^= rookFromTo
+
+    def makeMove(self, move: Move):
+        super().makeMove(move)
+        self.toggleMove(move)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            # the pawn was already swapped for a piece by pawnPromotion (promotion chosen in the UI)
+            promoted = move.isPawnPromotion and not move.promotionPiece and \
+                self.squares[move.endSq] != move.pieceMoved
+            super().undoMove()
+            if promoted:
+                self.syncBitboards()
+            else:
+                self.toggleMove(move)
+
+    def pawnPromotion(self, char):
+        super().pawnPromotion(char)
+        self.syncBitboards()
+
+    '''
+    Bitboard of the pieces of the given side attacking sq, sliders seen through the given occupancy
+    '''
+
+    def attackersTo(self, sq, side, occupancy):
+        bitboards = self.bitboards
+        queens = bitboards[side | QUEEN]
+        return (KNIGHT_ATTACKS[sq] & bitboards[side | KNIGHT]) | \
+            (KING_ATTACKS[sq] & bitboards[side | KING]) | \
+            (PAWN_ATTACKS[side ^ (WHITE | BLACK)][sq] & bitboards[side | PAWN]) | \
+            (rookAttacks(sq, occupancy) & (bitboards[side | ROOK] | queens)) | \
+            (bishopAttacks(sq, occupancy) & (bitboards[side | BISHOP] | queens))
+
+    def squareAttackers(self, sq, side):
+        return self.attackersTo(sq, side, self.occupied[WHITE] | self.occupied[BLACK])
+
+    def getOccupancy(self):
+        return self.occupied[WHITE] | self.occupied[BLACK]
+
+    def isSquareAttacked(self, sq, side):
+        return self.attackersTo(sq, side, self.occupied[WHITE] | self.occupied[BLACK]) != 0
+
+    def squareUnderAttack(self, sq):
+        return self.isSquareAttacked(sq, BLACK if self.whiteToMove else WHITE)
+
+    '''
+    King steps of the king located at sq (GameState.findLegalMove): the king is taken off the occupancy,
+    not only off the squares, so that it does not shield the squares behind it on the ray of a checking slider
+    '''
+
+    def getKingMoves(self, sq, moves, kind=ALL_MOVES):
+        squares = self.squares
+        us, them = (WHITE, BLACK) if self.whiteToMove else (BLACK, WHITE)
+        occupancyWithoutKing = (self.occupied[WHITE] | self.occupied[BLACK]) ^ (1 << sq)
+        targets = KING_ATTACKS[sq] & ~self.occupied[us]
+        if kind == CAPTURE_MOVES:
+            targets &= self.occupied[them]
+        elif kind == QUIET_MOVES:
+            targets &= ~occupancyWithoutKing
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            endSq = low.bit_length() - 1
+            if not self.attackersTo(endSq, them, occupancyWithoutKing):
+                moves.append(getMove(sq, endSq, squares))
+
+    '''
+    All legal moves: pins and checks are resolved with set operations instead of looking square by square.
+    The kind of moves (see GameState.getValidMoves) is one more mask on the target squares.
+    '''
+
+    def getValidMoves(self, kind=ALL_MOVES):
+        squares = self.squares
+        bitboards = self.bitboards
+        if self.whiteToMove:
+            us, them = WHITE, BLACK
+            kingSq = self.whiteKingSquare
+        else:
+            us, them = BLACK, WHITE
+            kingSq = self.blackKingSquare
+        ours = self.occupied[us]
+        theirs = self.occupied[them]
+        occupancy = ours | theirs
+        moves = []
+        if kind == CAPTURE_MOVES:
+            targetMask = theirs
+        elif kind == QUIET_MOVES:
+            targetMask = ~occupancy & FULL_BOARD
+        else:
+            targetMask = FULL_BOARD
+
+        checkers = self.attackersTo(kingSq, them, occupancy)
+        self.inCheck = checkers != 0
+
+        # King steps: the king itself must not shield the square it steps to
+        occupancyWithoutKing = occupancy ^ (1 << kingSq)
+        targets = KING_ATTACKS[kingSq] & ~ours & targetMask
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            endSq = low.bit_length() - 1
+            if not self.attackersTo(endSq, them, occupancyWithoutKing):
+                moves.append(getMove(kingSq, endSq, squares))
+
+        # Double check: only the king can move
+        if checkers & (checkers - 1) == 0:
+            if checkers:
+                checkerSq = checkers.bit_length() - 1
+                checkMask = checkers | BETWEEN[kingSq][checkerSq]
+            else:
+                checkMask = FULL_BOARD
+
+            # Pinned pieces: one of our pieces alone between the king and an enemy slider
+            pinned = 0
+            theirQueens = bitboards[them | QUEEN]
+            snipers = (rookAttacks(kingSq, 0) & (bitboards[them | ROOK] | theirQueens)) | \
+                      (bishopAttacks(kingSq, 0) & (bitboards[them | BISHOP] | theirQueens))
+            while snipers:
+                low = snipers & -snipers
+                snipers ^= low
+                blockers = BETWEEN[kingSq][low.bit_length() - 1] & occupancy
+                if blockers and blockers & (blockers - 1) == 0 and blockers & ours:
+                    pinned |= blockers
+
+            self.getBitboardPawnMoves(moves, us, them, kingSq, occupancy, pinned, checkMask, kind)
+            pieceAttacks = ((KNIGHT, None), (BISHOP, bishopAttacks), (ROOK, rookAttacks), (QUEEN, None))
+            for pieceType, attacks in pieceAttacks:
+                pieces = bitboards[us | pieceType]
+                while pieces:
+                    low = pieces & -pieces
+                    pieces ^= low
+                    sq = low.bit_length() - 1
+                    if pieceType == KNIGHT:
+                        if low & pinned:
+                            continue
+                        targets = KNIGHT_ATTACKS[sq]
+                    elif pieceType == QUEEN:
+                        targets = rookAttacks(sq, occupancy) | bishopAttacks(sq, occupancy)
+                    else:
+                        targets = attacks(sq, occupancy)
+                    targets &= ~ours & checkMask & targetMask
+                    if low & pinned:
+                        targets &= LINE[kingSq][sq]
+                    while targets:
+                        lowTarget = targets & -targets
+                        targets ^= lowTarget
+                        moves.append(getMove(sq, lowTarget.bit_length() - 1, squares))
+
+            if not checkers and kind != CAPTURE_MOVES:
+                self.getBitboardCastleMoves(moves, us, them, kingSq, occupancy)
+
+        if kind == ALL_MOVES and len(moves) == 0:
+            if self.inCheck:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        return moves
+
+    def getBitboardPawnMoves(self, moves, us, them, kingSq, occupancy, pinned, checkMask, kind=ALL_MOVES):
+        squares = self.squares
+        pawns = self.bitboards[us | PAWN]
+        theirs = self.occupied[them]
+        empty = ~occupancy & FULL_BOARD
+        if us == WHITE:
+            singles = (pawns >> 8) & empty
+            doubles = ((singles & WHITE_DOUBLE_PUSH_ROW) >> 8) & empty
+            captureLeft = ((pawns & ~FILE_A) >> 9)
+            captureRight = ((pawns & ~FILE_H) >> 7)
+            # (targets, distance back to the pawn)
+            pushes = ((singles, 8), (doubles, 16))
+            captures = ((captureLeft, 9), (captureRight, 7))
+        else:
+            singles = (pawns << 8) & empty
+            doubles = ((singles & BLACK_DOUBLE_PUSH_ROW) << 8) & empty
+            captureLeft = ((pawns & ~FILE_A) << 7) & FULL_BOARD
+            captureRight = ((pawns & ~FILE_H) << 9) & FULL_BOARD
+            pushes = ((singles, -8), (doubles, -16))
+            captures = ((captureLeft, -7), (captureRight, -9))
+        # promotions count as captures
+        if kind == CAPTURE_MOVES:
+            pushes = ((singles & PROMOTION_ROWS, pushes[0][1]),)
+        elif kind == QUIET_MOVES:
+            pushes = ((singles & ~PROMOTION_ROWS, pushes[0][1]), pushes[1])
+            captures = ()
+
+        for targets, back in pushes:
+            targets &= checkMask
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                endSq = low.bit_length() - 1
+                startSq = endSq + back
+                if (1 << startSq) & pinned and not low & LINE[kingSq][startSq]:
+                    continue
+                self.addPawnMove(startSq, endSq, moves)
+
+        for attacks, back in captures:
+            targets = attacks & theirs & checkMask
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                endSq = low.bit_length() - 1
+                startSq = endSq + back
+                if (1 << startSq) & pinned and not low & LINE[kingSq][startSq]:
+                    continue
+                self.addPawnMove(startSq, endSq, moves)
+            if self.enPassantSquare >= 0 and attacks & (1 << self.enPassantSquare):
+                startSq = self.enPassantSquare + back
+                if self.isLegalBitboardEnPassant(startSq, self.enPassantSquare, us, them, kingSq, occupancy):
+                    moves.append(getMove(startSq, self.enPassantSquare, squares, True))
+
+    '''
+    En passant removes two pieces from the same rank, so simply replay it on the occupancy and look for attacks
+    '''
+
+    def isLegalBitboardEnPassant(self, startSq, endSq, us, them, kingSq, occupancy):
+        bitboards = self.bitboards
+        capturedBit = 1 << ((startSq & ~7) | (endSq & 7))
+        occupancyAfter = (occupancy ^ (1 << startSq) ^ capturedBit) | (1 << endSq)
+        theirQueens = bitboards[them | QUEEN]
+        if rookAttacks(kingSq, occupancyAfter) & (bitboards[them | ROOK] | theirQueens):
+            return False
+        if bishopAttacks(kingSq, occupancyAfter) & (bitboards[them | BISHOP] | theirQueens):
+            return False
+        if KNIGHT_ATTACKS[kingSq] & bitboards[them | KNIGHT]:
+            return False
+        return not PAWN_ATTACKS[us][kingSq] & bitboards[them | PAWN] & ~capturedBit
+
+    def getBitboardCastleMoves(self, moves, us, them, kingSq, occupancy):
+        squares = self.squares
+        rooks = self.bitboards[us | ROOK]
+        if us == WHITE:
+            kingSide, queenSide = self.castlingRights & CASTLE_WKS, self.castlingRights & CASTLE_WQS
+        else:
+            kingSide, queenSide = self.castlingRights & CASTLE_BKS, self.castlingRights & CASTLE_BQS
+        if kingSide and rooks & (1 << (kingSq + 3)) and not occupancy & ((1 << (kingSq + 1)) | (1 << (kingSq + 2))):
+            if not self.attackersTo(kingSq + 1, them, occupancy) and \
+                    not self.attackersTo(kingSq + 2, them, occupancy):
+                moves.append(getMove(kingSq, kingSq + 2, squares, isCastleMove=True))
+        if queenSide and rooks & (1 << (kingSq - 4)) and \
+                not occupancy & ((1 << (kingSq - 1)) | (1 << (kingSq - 2)) | (1 << (kingSq - 3))):
+            if not self.attackersTo(kingSq - 1, them, occupancy) and \
+                    not self.attackersTo(kingSq - 2, them, occupancy):
+                moves.append(getMove(kingSq, kingSq - 2, squares, isCastleMove=True))
@@ -1,5 +1,101 @@
+import random
+
+import ChessLogging
+from ChessEvaluation import PIECE_SQUARE_SCORES, PHASE_WEIGHTS, EXCHANGE_VALUES, computePieceSquareScore, evaluate, \
+    MATE_SCORE, DRAW_SCORE
 from ChessTypes import PiecePosTuple, MoveTuple, EMPTY_CELL, WHITE_PIECE_PREFIX, BLACK_PIECE_PREFIX, \
-    ROOK_PIECE, BISHOP_PIECE, PAWN_PIECE, QUEEN_PIECE, KING_PIECE, KNIGHT_PIECE
+    EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_TYPE_MASK, WHITE, BLACK, \
+    WHITE_PAWN, WHITE_KING, BLACK_PAWN, BLACK_KING, PIECE_CODES, PIECE_NAMES, PIECE_TYPE_LETTERS
+
+# * The board is a flat list of 64 integer piece codes (see ChessTypes).
+# * Square index = row * 8 + col, row 0 being rank 8 like the old 2D board, so row = sq >> 3 and col = sq & 7.
+# * Every move table below is precomputed once so that the generators never do bounds checks.
+
+# Directions as (row step, col step): 0-3 orthogonal, 4-7 diagonal
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1),
+              (-1, -1), (-1, 1), (1, -1), (1, 1))
+ORTHOGONAL_DIRECTIONS = (0, 1, 2, 3)
+DIAGONAL_DIRECTIONS = (4, 5, 6, 7)
+OPPOSITE_DIRECTIONS = (2, 3, 0, 1, 7, 6, 5, 4)
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                  (1, -2), (1, 2), (2, -1), (2, 1))
+# Marks a check given by a knight: there is no ray to block
+KNIGHT_CHECK = -1
+# Pieces a pawn can promote to, in the order the generators emit them
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+logger = ChessLogging.getLogger("ChessEngine")
+
+# Occupancy mask with every square set: the board as it stands (see GameState.attackersTo)
+ALL_SQUARES = (1 << 64) - 1
+
+# Kinds of moves getValidMoves can be asked for: captures include en passant and every promotion
+ALL_MOVES = 0
+CAPTURE_MOVES = 1
+QUIET_MOVES = 2
+# Piece codes a knight or king move of each kind lands on (see GameState.getTargetPieces)
+WHITE_PIECES = frozenset(WHITE | pieceType for pieceType in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING))
+BLACK_PIECES = frozenset(BLACK | pieceType for pieceType in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING))
+EMPTY_TARGETS = frozenset((EMPTY,))
+
+
+def _squares_from(sq, steps, sliding):
+    row, col = sq >> 3, sq & 7
+    targets = []
+    for dr, dc in steps:
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            targets.append(r * 8 + c)
+            if not sliding:
+                break
+            r, c = r + dr, c + dc
+    return tuple(targets)
+
+
+# RAYS[sq][j]: squares walked from sq in direction j until the edge of the board
+RAYS = tuple(tuple(_squares_from(sq, (d,), True) for d in DIRECTIONS) for sq in range(64))
+KNIGHT_TARGETS = tuple(_squares_from(sq, KNIGHT_OFFSETS, False) for sq in range(64))
+KING_TARGETS = tuple(_squares_from(sq, DIRECTIONS, False) for sq in range(64))
+# PAWN_ATTACKER_SQUARES[side][sq]: squares a pawn of that side attacks sq from (a white pawn captures upward)
+PAWN_ATTACKER_SQUARES = {
+    WHITE: tuple(tuple(RAYS[sq][d][0] for d in (6, 7) if RAYS[sq][d]) for sq in range(64)),
+    BLACK: tuple(tuple(RAYS[sq][d][0] for d in (4, 5) if RAYS[sq][d]) for sq in range(64)),
+}
+
+# * Zobrist hashing: one random 64-bit key per (piece code, square), side to move, castling right and en passant file.
+# * The position key is the xor of the keys of everything present, so a move only xors in/out what it changes.
+# * Fixed seed: keys (and so hashes stored on disk, e.g. by a prediction cache) are the same from run to run.
+ZOBRIST_SEED = 20230101
+_zobristRandom = random.Random(ZOBRIST_SEED)
+ZOBRIST_PIECE_KEYS = tuple(tuple(_zobristRandom.getrandbits(64) for _ in range(64))
+                           if PIECE_NAMES[piece] != EMPTY_CELL else (0,) * 64 for piece in range(len(PIECE_NAMES)))
+ZOBRIST_BLACK_TO_MOVE_KEY = _zobristRandom.getrandbits(64)
+# wks, bks, wqs, bqs
+ZOBRIST_CASTLE_KEYS = tuple(_zobristRandom.getrandbits(64) for _ in range(4))
+ZOBRIST_EN_PASSANT_KEYS = tuple(_zobristRandom.getrandbits(64) for _ in range(8))
+
+
+# * Castling rights are kept as a 4-bit mask (GameState.castlingRights)
+CASTLE_WKS, CASTLE_BKS, CASTLE_WQS, CASTLE_BQS = 1, 2, 4, 8
+ALL_CASTLE_RIGHTS = CASTLE_WKS | CASTLE_BKS | CASTLE_WQS | CASTLE_BQS
+# CASTLE_RIGHTS_KEPT[sq]: rights left after a move from or to sq, whatever the piece (king and rook home squares)
+CASTLE_RIGHTS_KEPT = [ALL_CASTLE_RIGHTS] * 64
+CASTLE_RIGHTS_KEPT[60] = ALL_CASTLE_RIGHTS & ~(CASTLE_WKS | CASTLE_WQS)  # e1
+CASTLE_RIGHTS_KEPT[63] = ALL_CASTLE_RIGHTS & ~CASTLE_WKS  # h1
+CASTLE_RIGHTS_KEPT[56] = ALL_CASTLE_RIGHTS & ~CASTLE_WQS  # a1
+CASTLE_RIGHTS_KEPT[4] = ALL_CASTLE_RIGHTS & ~(CASTLE_BKS | CASTLE_BQS)  # e8
+CASTLE_RIGHTS_KEPT[7] = ALL_CASTLE_RIGHTS & ~CASTLE_BKS  # h8
+CASTLE_RIGHTS_KEPT[0] = ALL_CASTLE_RIGHTS & ~CASTLE_BQS  # a8
+CASTLE_RIGHTS_KEPT = tuple(CASTLE_RIGHTS_KEPT)
+# Zobrist key of every castling rights mask: xor of the ZOBRIST_CASTLE_KEYS of its bits
+ZOBRIST_CASTLING_RIGHTS_KEYS = tuple(
+    (ZOBRIST_CASTLE_KEYS[0] if mask & CASTLE_WKS else 0) ^ (ZOBRIST_CASTLE_KEYS[1] if mask & CASTLE_BKS else 0) ^
+    (ZOBRIST_CASTLE_KEYS[2] if mask & CASTLE_WQS else 0) ^ (ZOBRIST_CASTLE_KEYS[3] if mask & CASTLE_BQS else 0)
+    for mask in range(ALL_CASTLE_RIGHTS + 1))
+
+
+'''
+Readable view of a castling rights mask
+'''
 
 
 class CastleRights:
@@ -9,8 +105,20 @@ class CastleRights:
         self.wqs = wqs
         self.bqs = bqs
 
+    @classmethod
+    def fromMask(cls, mask):
+        return cls(bool(mask & CASTLE_WKS), bool(mask & CASTLE_BKS), bool(mask & CASTLE_WQS), bool(mask & CASTLE_BQS))
+
+    def toMask(self):
+        return (CASTLE_WKS if self.wks else 0) | (CASTLE_BKS if self.bks else 0) | \
+            (CASTLE_WQS if self.wqs else 0) | (CASTLE_BQS if self.bqs else 0)
+
 
 class Move:
+    # Moves generated by the engine are shared (see getMove): never modify one after creating it
+    __slots__ = ('startSq', 'endSq', 'startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured',
+                 'isEnPassantMove', 'modeID', 'isCastleMove', 'isPawnPromotion', 'promotionPiece')
+
     # maps keys to values:
     # key : value
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4,
@@ -27,643 +135,983 @@ class Move:
     }
 
     # Typing declarations:
+    startSq: int
+    endSq: int
     startRow: int
     startCol: int
     endRow: int
     endCol: int
-    pieceMoved: str
-    pieceCaptured: str
+    pieceMoved: int
+    pieceCaptured: int
     isEnPassantMove: bool
     modeID: float
     isCastleMove: bool
+    isPawnPromotion: bool
+    promotionPiece: int
+
+    '''
+    startSq, endSq are either flat square indexes read from GameState.squares (engine side)
+    or (row, col) tuples read from a 2D board of 'wp' like names (UI side, e.g. gameState.board)
+    promotionPiece is the piece type (QUEEN, ROOK, ...) a pawn reaching the last rank turns into.
+    A promotion without a promotionPiece is left to GameState.pawnPromotion (promotion menu of the UI).
+    '''
 
-    def __init__(self, startSq, endSq, board, isEnPassantMove=False, isCastleMove=False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
+    def __init__(self, startSq, endSq, board, isEnPassantMove=False, isCastleMove=False, promotionPiece=EMPTY):
+        if isinstance(startSq, tuple):
+            self.startRow, self.startCol = startSq
+            self.endRow, self.endCol = endSq
+            self.startSq = self.startRow * 8 + self.startCol
+            self.endSq = self.endRow * 8 + self.endCol
+            self.pieceMoved = PIECE_CODES.get(board[self.startRow][self.startCol][:2], EMPTY)
+            self.pieceCaptured = PIECE_CODES.get(board[self.endRow][self.endCol][:2], EMPTY)
+        else:
+            self.startSq = startSq
+            self.endSq = endSq
+            self.startRow = startSq >> 3
+            self.startCol = startSq & 7
+            self.endRow = endSq >> 3
+            self.endCol = endSq & 7
+            self.pieceMoved = board[startSq]
+            self.pieceCaptured = board[endSq]
         # en passant
         self.isEnPassantMove = isEnPassantMove
         if self.isEnPassantMove:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
+            self.pieceCaptured = WHITE_PAWN if self.pieceMoved == BLACK_PAWN else BLACK_PAWN
         self.modeID = self.startRow * 1000 + self.startCol * \
             100 + self.endRow * 10 + self.endCol
         self.isCastleMove = isCastleMove
+        self.isPawnPromotion = (self.pieceMoved == WHITE_PAWN and self.endRow == 0) or \
+                               (self.pieceMoved == BLACK_PAWN and self.endRow == 7)
+        self.promotionPiece = promotionPiece
 
     '''Override'''
 
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.modeID == other.modeID
+            return self.modeID == other.modeID and self.promotionPiece == other.promotionPiece
         return False
 
+    def __hash__(self):
+        return self.startSq | self.endSq << 6 | self.promotionPiece << 12
+
     def getChessNotation(self):
-        from ChessHelper import ChessHelper
-        piece_key = ChessHelper.get_piece_side_and_type(self.pieceMoved)
+        piece_key = PIECE_NAMES[self.pieceMoved]
         return self.UNICODE_PIECES[piece_key] + self.getRankFile(self.endRow, self.endCol)
 
     def getRankFile(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
 
-
-ORIGINAL_BLACK_PIECES = ['bR1', 'bN1', 'bB1', 'bQ', 'bK', 'bB2', 'bN2', 'bR2', 'bp1', 'bp2', 'bp3', 'bp4', 'bp5', 'bp6',
-                         'bp7', 'bp8']
-
-ORIGINAL_WHITE_PIECES = ['wp1', 'wp2', 'wp3', 'wp4', 'wp5', 'wp6', 'wp7', 'wp8', 'wR1', 'wN1', 'wB1', 'wQ', 'wK', 'wB2',
-                         'wN2', 'wR2']
-
-ORIGINAL_BLACK_PIECES_SET = {'bR1', 'bN1', 'bB1', 'bQ', 'bK', 'bB2', 'bN2', 'bR2', 'bp1',
-                             'bp2', 'bp3', 'bp4', 'bp5', 'bp6',
-                             'bp7', 'bp8'}
-
-ORIGINAL_WHITE_PIECES_SET = {'wp1', 'wp2', 'wp3', 'wp4', 'wp5', 'wp6', 'wp7', 'wp8', 'wR1', 'wN1', 'wB1', 'wQ', 'wK',
-                             'wB2',
-                             'wN2', 'wR2'}
-
-# Sets for fast checking draw by insufficient materials:
+    # Long algebraic notation as used by UCI engines, e.g. e2e4 or a7a8q
+    def getUciNotation(self):
+        promotion = PIECE_TYPE_LETTERS[self.promotionPiece].lower() if self.promotionPiece else ''
+        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol) + promotion
+
+
+# * Move table: the generators draw their moves from MOVE_TABLE instead of allocating a new Move at every node.
+# * A move is fully described by its squares, the pieces on them, its flags and its promotion piece, packed in one int:
+# *     start | end << 6 | piece moved << 12 | piece on the end square << 17 | promotion << 22 | en passant << 25 | castle << 26
+# * The table is filled on first use: only the few thousand moves actually met during the games are ever built.
+MOVE_TABLE = {}
+
+
+def getMove(startSq, endSq, squares, isEnPassantMove=False, isCastleMove=False, promotionPiece=EMPTY):
+    key = startSq | endSq << 6 | squares[startSq] << 12 | squares[endSq] << 17 | promotionPiece << 22 | \
+        isEnPassantMove << 25 | isCastleMove << 26
+    move = MOVE_TABLE.get(key)
+    if move is None:
+        move = MOVE_TABLE[key] = Move(startSq, endSq, squares, isEnPassantMove, isCastleMove, promotionPiece)
+    return move
+
+
+'''
+Packed key of a move, the one getMove files it under (en passant: the end square was empty)
+'''
+
+
+def packMove(move: Move):
+    captured = EMPTY if move.isEnPassantMove else move.pieceCaptured
+    return move.startSq | move.endSq << 6 | move.pieceMoved << 12 | captured << 17 | move.promotionPiece << 22 | \
+        move.isEnPassantMove << 25 | move.isCastleMove << 26
+
+
+'''
+Move of a packed key, e.g. read back from a table shared with other processes
+'''
+
+
+def unpackMove(key):
+    move = MOVE_TABLE.get(key)
+    if move is None:
+        startSq, endSq = key & 63, key >> 6 & 63
+        # only the start and end squares of the board are read
+        squares = {startSq: key >> 12 & 31, endSq: key >> 17 & 31}
+        move = MOVE_TABLE[key] = Move(startSq, endSq, squares, bool(key >> 25 & 1), bool(key >> 26 & 1),
+                                      key >> 22 & 7)
+    return move
+
+
+INITIAL_BOARD = [
+    ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR'],
+    ['bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp'],
+    ['--', '--', '--', '--', '--', '--', '--', '--'],
+    ['--', '--', '--', '--', '--', '--', '--', '--'],
+    ['--', '--', '--', '--', '--', '--', '--', '--'],
+    ['--', '--', '--', '--', '--', '--', '--', '--'],
+    ['wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp', 'wp'],
+    ['wR', 'wN', 'wB', 'wQ', 'wK', 'wB', 'wN', 'wR'],
+]
+
+# * FEN letters: uppercase for white, lowercase for black
+FEN_PIECE_CODES = {(letter if side == WHITE else letter.lower()): side | pieceType
+                   for pieceType, letter in ((PAWN, 'P'), (KNIGHT, 'N'), (BISHOP, 'B'),
+                                             (ROOK, 'R'), (QUEEN, 'Q'), (KING, 'K'))
+                   for side in (WHITE, BLACK)}
+FEN_PIECE_LETTERS = {code: letter for letter, code in FEN_PIECE_CODES.items()}
+# in the order FEN writes them
+FEN_CASTLING_RIGHTS = {'K': CASTLE_WKS, 'Q': CASTLE_WQS, 'k': CASTLE_BKS, 'q': CASTLE_BQS}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Sets for fast checking draw by insufficient materials (sorted piece names still on the board):
 KING_VS_KING = {('bK', 'wK')}
-KING_BISHOP_VS_KING = {('bK', 'wB', 'wK'), ('wK', 'bB', 'bK')}
-KING_KNIGHT_VS_KING = {('bK', 'wN', 'wK'), ('wK', 'bN', 'bK')}
-KING_BISHOP_VS_KING_BISHOP = {('bK', 'bB', 'wB', 'wK')}
+KING_BISHOP_VS_KING = {('bK', 'wB', 'wK'), ('bB', 'bK', 'wK')}
+KING_KNIGHT_VS_KING = {('bK', 'wK', 'wN'), ('bK', 'bN', 'wK')}
+KING_BISHOP_VS_KING_BISHOP = {('bB', 'bK', 'wB', 'wK')}
 
 
 class GameState:
     def __init__(self):
         # self.color = randint(0,1)
-        self.board = [
-            ['bR1', 'bN1', 'bB1', 'bQ', 'bK', 'bB2', 'bN2', 'bR2'],
-            ['bp1', 'bp2', 'bp3', 'bp4', 'bp5', 'bp6', 'bp7', 'bp8'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['--', '--', '--', '--', '--', '--', '--', '--'],
-            ['wp1', 'wp2', 'wp3', 'wp4', 'wp5', 'wp6', 'wp7', 'wp8'],
-            ['wR1', 'wN1', 'wB1', 'wQ', 'wK', 'wB2', 'wN2', 'wR2'],
-        ]
-
-        self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves,
-                              'B': self.getBishopMoves, 'K': self.getKingMoves, 'Q': self.getQueenMoves}
+        self.board = INITIAL_BOARD  # fills self.squares, self.pieceSquares and the king squares
+
+        self.moveFunctions = {PAWN: self.getPawnMoves, ROOK: self.getRookMoves, KNIGHT: self.getKnightMoves,
+                              BISHOP: self.getBishopMoves, KING: self.getKingMoves, QUEEN: self.getQueenMoves}
         self.whiteToMove = True  # White turn or not
         self.moveLog = []
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
         self.inCheck = False
-        self.pins = []
+        self.pins = {}
         self.checks = []
         self.promotionDone = True
-        # coordinates for the square where en passant capture is possible
-        self.enPassantPossible = ()
-        self.enPassantPossibleLog = [self.enPassantPossible]
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                             self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
+        # square where en passant capture is possible, -1 if none
+        self.enPassantSquare = -1
+        # CASTLE_WKS | CASTLE_BKS | CASTLE_WQS | CASTLE_BQS of the rights still available
+        self.castlingRights = ALL_CASTLE_RIGHTS
+        # half moves since the last capture or pawn move (fifty-move rule)
+        self.halfmoveClock = 0
+        # starts at 1 and goes up after each black move, as in FEN
+        self.fullmoveNumber = 1
         # Game Ending Flags: To know which outcome happened
         self.checkmate = False
         self.stalemate = False
         self.draw_by_insufficent_material = False
-        # Keep track of the captured pieces for game draw checking
-        self.blackCapturedPieces = []
-        self.whiteCapturedPieces = []
+        # One record per move of moveLog with the state undoMove cannot recompute: (castlingRights, enPassantSquare,
+        # captured piece code, boardHash, halfmoveClock, pieceSquareScore, phase, pawnHash) before the move
+        self.undoStack = []
 
-    def check_game_ended(self):
-        return self.checkmate or self.stalemate
+    '''
+    Conversion layer: 2D board of 'wp' / 'bR' / '--' names built from the integer squares.
+    Used by the UI (drawPieces, click handling), never by the move generators.
+    '''
 
-    def get_board_score_value(self):
-        from ChessAIEasy import CHECKMATE
-        from ChessAIEasy import STALEMATE
-        from ChessAIEasy import piecesScore
-        if self.checkmate and self.whiteToMove:
-            return 10000
+    @property
+    def board(self):
+        squares = self.squares
+        return [[PIECE_NAMES[piece] for piece in squares[row * 8:row * 8 + 8]] for row in range(8)]
+
+    @board.setter
+    def board(self, board):
+        self.setSquares([PIECE_CODES.get(cell[:2], EMPTY) for row in board for cell in row])
+
+    '''
+    Place the pieces of a flat list of 64 piece codes, and rebuild everything derived from them
+    '''
+
+    def setSquares(self, squares):
+        self.squares = squares
+        # pieceSquares[side]: squares occupied by the pieces of that side, kept up to date by makeMove / undoMove
+        self.pieceSquares = {WHITE: set(), BLACK: set()}
+        for sq, piece in enumerate(self.squares):
+            if piece:
+                self.pieceSquares[piece & (WHITE | BLACK)].add(sq)
+            if piece == WHITE_KING:
+                self.whiteKingSquare = sq
+            elif piece == BLACK_KING:
+                self.blackKingSquare = sq
+        self.boardHash = self.computeBoardHash()
+        self.pawnHash = self.computePawnHash()
+        # running evaluation terms (see ChessEvaluation), updated by makeMove / undoMove / pawnPromotion
+        self.pieceSquareScore, self.phase = computePieceSquareScore(squares)
+
+    '''
+    Setup the position from the six fields of a FEN string: piece placement, side to move, castling rights,
+    en passant square, halfmove clock and fullmove number (the last four can be left out).
+    The move history is cleared.
+    '''
+
+    def setFen(self, fen):
+        fields = fen.split()
+        if not fields or len(fields) > 6:
+            raise RuntimeError(f"Invalid FEN: {fen}")
+        fenRows = fields[0].split('/')
+        if len(fenRows) != 8:
+            raise RuntimeError(f"Invalid board in FEN: {fen}")
+        squares = []
+        for fenRow in fenRows:
+            rowStart = len(squares)
+            for char in fenRow:
+                if char in '12345678':
+                    squares.extend([EMPTY] * int(char))
+                elif char in FEN_PIECE_CODES:
+                    squares.append(FEN_PIECE_CODES[char])
+                else:
+                    raise RuntimeError(f"Invalid piece '{char}' in FEN: {fen}")
+            if len(squares) - rowStart != 8:
+                raise RuntimeError(f"Invalid row '{fenRow}' in FEN: {fen}")
+        if squares.count(WHITE_KING) != 1 or squares.count(BLACK_KING) != 1:
+            raise RuntimeError(f"FEN must have exactly one king per side: {fen}")
+        sideToMove = fields[1] if len(fields) > 1 else 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        enPassant = fields[3] if len(fields) > 3 else '-'
+        if sideToMove not in ('w', 'b'):
+            raise RuntimeError(f"Invalid side to move '{sideToMove}' in FEN: {fen}")
+        castlingRights = 0
+        if castling != '-':
+            for char in castling:
+                if char not in FEN_CASTLING_RIGHTS:
+                    raise RuntimeError(f"Invalid castling rights '{castling}' in FEN: {fen}")
+                castlingRights |= FEN_CASTLING_RIGHTS[char]
+        if enPassant == '-':
+            enPassantSquare = -1
+        elif len(enPassant) == 2 and enPassant[0] in Move.filesToCols and enPassant[1] in ('3', '6'):
+            enPassantSquare = Move.ranksToRows[enPassant[1]] * 8 + Move.filesToCols[enPassant[0]]
+        else:
+            raise RuntimeError(f"Invalid en passant square '{enPassant}' in FEN: {fen}")
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise RuntimeError(f"Invalid move counters in FEN: {fen}")
+
+        self.setSquares(squares)
+        self.whiteToMove = sideToMove == 'w'
+        self.castlingRights = castlingRights
+        self.enPassantSquare = enPassantSquare
+        self.halfmoveClock = halfmoveClock
+        self.fullmoveNumber = fullmoveNumber
+        self.moveLog = []
+        self.undoStack = []
+        self.promotionDone = True
+        self.checkmate = False
+        self.stalemate = False
+        self.draw_by_insufficent_material = self.check_for_insufficient_material()
+
+    def getFen(self):
+        squares = self.squares
+        fenRows = []
+        for row in range(8):
+            fenRow = ''
+            empty = 0
+            for piece in squares[row * 8:row * 8 + 8]:
+                if piece:
+                    if empty:
+                        fenRow += str(empty)
+                        empty = 0
+                    fenRow += FEN_PIECE_LETTERS[piece]
+                else:
+                    empty += 1
+            if empty:
+                fenRow += str(empty)
+            fenRows.append(fenRow)
+        castling = ''.join(char for char, right in FEN_CASTLING_RIGHTS.items() if self.castlingRights & right) or '-'
+        if self.enPassantSquare >= 0:
+            enPassant = Move.colsToFiles[self.enPassantSquare & 7] + Move.rowsToRanks[self.enPassantSquare >> 3]
+        else:
+            enPassant = '-'
+        return f"{'/'.join(fenRows)} {'w' if self.whiteToMove else 'b'} {castling} {enPassant} " \
+               f"{self.halfmoveClock} {self.fullmoveNumber}"
+
+    '''
+    Zobrist key of the position: side to move, castling rights and en passant file are xored in here rather than
+    in makeMove, because the UI and the FEN setup assign whiteToMove / castlingRights / enPassantSquare directly.
+    The pieces part (boardHash) is updated incrementally by makeMove / undoMove / pawnPromotion,
+    and so is pawnHash, the same xor over the pawns only: the key of the pawn structure (pawn hash table).
+    '''
+
+    @property
+    def zobristKey(self):
+        key = self.boardHash
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE_KEY
+        key ^= ZOBRIST_CASTLING_RIGHTS_KEYS[self.castlingRights]
+        if self.enPassantSquare >= 0:
+            key ^= ZOBRIST_EN_PASSANT_KEYS[self.enPassantSquare & 7]
+        return key
+
+    def computeBoardHash(self):
+        key = 0
+        for sq, piece in enumerate(self.squares):
+            if piece:
+                key ^= ZOBRIST_PIECE_KEYS[piece][sq]
+        return key
+
+    def computePawnHash(self):
+        key = 0
+        for sq, piece in enumerate(self.squares):
+            if piece & PIECE_TYPE_MASK == PAWN:
+                key ^= ZOBRIST_PIECE_KEYS[piece][sq]
+        return key
+
+    '''
+    Debug check of the incremental hash against a recomputation from scratch, enabled with debugZobrist
+    '''
+
+    debugZobrist = False
+
+    def checkZobristKey(self):
+        expected = self.computeBoardHash()
+        if self.boardHash != expected:
+            lastMove = self.moveLog[-1].getChessNotation() if self.moveLog else None
+            raise RuntimeError(f"Zobrist hash mismatch after {lastMove}: {self.boardHash:#018x} != {expected:#018x}")
+        expected = self.computePawnHash()
+        if self.pawnHash != expected:
+            lastMove = self.moveLog[-1].getChessNotation() if self.moveLog else None
+            raise RuntimeError(f"Pawn hash mismatch after {lastMove}: {self.pawnHash:#018x} != {expected:#018x}")
+
+    '''
+    castlingRights as a CastleRights object, for the code written against the old representation
+    '''
+
+    @property
+    def currentCastlingRight(self):
+        return CastleRights.fromMask(self.castlingRights)
+
+    @currentCastlingRight.setter
+    def currentCastlingRight(self, castleRights):
+        self.castlingRights = castleRights.toMask()
+
+    @property
+    def whiteKingLocation(self) -> MoveTuple:
+        return self.whiteKingSquare >> 3, self.whiteKingSquare & 7
+
+    @property
+    def blackKingLocation(self) -> MoveTuple:
+        return self.blackKingSquare >> 3, self.blackKingSquare & 7
+
+    @property
+    def enPassantPossible(self):
+        if self.enPassantSquare < 0:
+            return ()
+        return self.enPassantSquare >> 3, self.enPassantSquare & 7
+
+    '''
+    White-relative score of the position: MATE_SCORE for a mate, DRAW_SCORE for a stalemate, evaluate otherwise
+    '''
 
+    def get_board_score_value(self):
         if self.checkmate:
-            if self.whiteToMove:
-                return -CHECKMATE  # black wins
-            else:
-                return CHECKMATE  # white wins
+            return -MATE_SCORE if self.whiteToMove else MATE_SCORE
         elif self.stalemate:
-            return STALEMATE
-        score = 0
-        for row in self.board:
-            for square in row:
-                if square[0] == 'w':
-                    score += piecesScore[square[1]]
-                elif square[0] == 'b':
-                    score -= piecesScore[square[1]]
-        return score
-
-        # Alive pieces on the board
-        self.alive_pieces_dict = self.get_alive_pieces_dict()
-        # Seed to mark the pieces as promoted
-        self.promotion_seed = 3
-
-    # Self helper method
-    def check_game_ended(self):
-        return self.stalemate or self.checkmate or self.draw_by_insufficent_material
+            return DRAW_SCORE
+        return evaluate(self)
+
+    '''
+    Occupied squares of both sides in board order (a8, b8, ..., h1)
+    '''
+
+    def getOccupiedSquares(self):
+        return sorted(self.pieceSquares[WHITE] | self.pieceSquares[BLACK])
 
-    # Note: Expensive calculation, should be used sparingly
     # Return: example: [ ('wK', (1,1)) , ('bK', (2,2)) ]
     def get_alive_pieces_with_pos(self) -> list[PiecePosTuple]:
-        piece_pos_list = []
-        for (row_index, row) in enumerate(self.board):
-            for (col_index, cell) in enumerate(row):
-                from ChessHelper import ChessHelper
-                if not ChessHelper.is_empty_cell(self.get_pos_value((row_index, col_index))):
-                    piece_pos_tuple = (cell, (row_index, col_index))
-                    piece_pos_list.append(piece_pos_tuple)
-        return piece_pos_list
-
-    def get_alive_pieces_set(self) -> list[str]:
-        pass
-
-    # Note: Expensive calculation, should be used sparingly
-    def get_alive_pieces_dict(self) -> dict[str, MoveTuple]:
-        piece_pos_dict = {}
-        for (row_index, row) in enumerate(self.board):
-            for (col_index, cell) in enumerate(row):
-                from ChessHelper import ChessHelper
-                if not ChessHelper.is_empty_cell(cell):
-                    piece_pos_dict[cell] = (row_index, col_index)
-        return piece_pos_dict
-
-    def get_white_alive_pieces(self) -> list[str]:
-        return list(ORIGINAL_WHITE_PIECES_SET.difference(self.whiteCapturedPieces))
-
-    def get_black_alive_pieces(self) -> list[str]:
-        return list(ORIGINAL_BLACK_PIECES_SET.difference(self.blackCapturedPieces))
+        squares = self.squares
+        return [(PIECE_NAMES[squares[sq]], (sq >> 3, sq & 7)) for sq in self.getOccupiedSquares()]
+
+    # Return: example: { (1,1): 'wK' , (2,2): 'bK' }, keyed by square so that pieces of the same kind are all kept
+    def get_alive_pieces_dict(self) -> dict[MoveTuple, str]:
+        return {pos: name for name, pos in self.get_alive_pieces_with_pos()}
 
     # https://en.wikipedia.org/wiki/Draw_(chess)
     def check_for_insufficient_material(self) -> bool:
-        num_of_white_captured = len(self.whiteCapturedPieces)
-        num_of_black_captured = len(self.blackCapturedPieces)
-        total_alive_pieces = 32 - num_of_black_captured - num_of_white_captured
-        # Draw of this type only happen when there are at most 32 - 28 = 4 pieces left
-        if total_alive_pieces < 28:
+        total_alive_pieces = len(self.pieceSquares[WHITE]) + len(self.pieceSquares[BLACK])
+        # Draw of this type only happen when there are at most 4 pieces left
+        if total_alive_pieces > 4:
             return False
 
-        # check for 2 at most each side: avoid 3 - 1 case
-        elif total_alive_pieces <= 4 and num_of_black_captured <= 2 and num_of_white_captured <= 2:
-            white_alive_pieces = self.get_white_alive_pieces()
-            black_alive_pieces = self.get_black_alive_pieces()
-
-            alive_pieces = white_alive_pieces + black_alive_pieces
-            alive_pieces_tuple = tuple(alive_pieces)
-            if alive_pieces_tuple in KING_VS_KING:
-                return True
-            if alive_pieces_tuple in KING_BISHOP_VS_KING:
-                return True
-            if alive_pieces_tuple in KING_KNIGHT_VS_KING:
-                return True
-            if alive_pieces_tuple in KING_BISHOP_VS_KING_BISHOP:
-                current_alive_pieces_with_pos = self.get_alive_pieces_with_pos()
-                from ChessHelper import ChessHelper
-                bishop_piece_pos_list = [item for item in current_alive_pieces_with_pos if
-                                         ChessHelper.is_bishop_piece_pos(item)]
-                if len(bishop_piece_pos_list) != 2:
-                    raise TypeError(
-                        "This should contain exactly two Bishop piecepos")
-                first_bishop_pos = bishop_piece_pos_list[0][1]
-                second_bishop_pos = bishop_piece_pos_list[1][1]
-                both_black_square = ChessHelper.is_black_square(first_bishop_pos) and ChessHelper.is_black_square(
-                    second_bishop_pos)
-                both_white_square = ChessHelper.is_white_square(first_bishop_pos) and ChessHelper.is_white_square(
-                    second_bishop_pos)
-                return both_white_square or both_black_square
-                # Only draw if both bishop are both black or both white squared
+        alive_pieces_with_pos = [(PIECE_NAMES[self.squares[sq]], sq) for sq in self.getOccupiedSquares()]
+        alive_pieces_tuple = tuple(sorted(name for name, _ in alive_pieces_with_pos))
+        if alive_pieces_tuple in KING_VS_KING:
+            return True
+        if alive_pieces_tuple in KING_BISHOP_VS_KING:
+            return True
+        if alive_pieces_tuple in KING_KNIGHT_VS_KING:
+            return True
+        if alive_pieces_tuple in KING_BISHOP_VS_KING_BISHOP:
+            from ChessHelper import ChessHelper
+            bishop_pos_list = [(sq >> 3, sq & 7) for name, sq in alive_pieces_with_pos if
+                               ChessHelper.is_bishop_piece(name)]
+            if len(bishop_pos_list) != 2:
+                raise TypeError(
+                    "This should contain exactly two Bishop piecepos")
+            # Only draw if both bishop are both black or both white squared
+            both_black_square = ChessHelper.is_black_square(bishop_pos_list[0]) and ChessHelper.is_black_square(
+                bishop_pos_list[1])
+            both_white_square = ChessHelper.is_white_square(bishop_pos_list[0]) and ChessHelper.is_white_square(
+                bishop_pos_list[1])
+            return both_white_square or both_black_square
 
         return False
 
     def get_pos_value(self, pos: MoveTuple):
         row, col = pos
-        return self.board[row][col]
-
-    def capture_piece(self, pos: MoveTuple):
-        piece_value = self.get_pos_value(pos)
-        from ChessHelper import ChessHelper
-        if not ChessHelper.is_empty_cell(pos):
-            self.alive_pieces_dict.pop(piece_value)
-
-    def erase_piece_at_pos(self, pos: MoveTuple):
-        row, col = pos
-        board_value = self.get_pos_value(pos)
-        from ChessHelper import ChessHelper
-        if not ChessHelper.is_empty_cell(board_value):
-            if ChessHelper.is_white_piece(board_value):
-                self.whiteCapturedPieces.append(board_value)
-            else:
-                self.blackCapturedPieces.append(board_value)
-        self.board[row][col] = EMPTY_CELL
-        # self.alive_pieces_dict[]
+        return PIECE_NAMES[self.squares[row * 8 + col]]
 
     def makeMove(self, move: Move):
-        # Object destructuring: Need double-check if this is correct
-        startCol, startRow, endRow, endCol, pieceMoved = move.startCol, move.startRow, move.endRow, move.endCol, move.pieceMoved
-        self.erase_piece_at_pos((startRow, startCol))
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        squares = self.squares
+        startSq, endSq, pieceMoved = move.startSq, move.endSq, move.pieceMoved
+        captured = move.pieceCaptured
+        # everything the move cannot give back by itself, restored as is by undoMove
+        self.undoStack.append((self.castlingRights, self.enPassantSquare, captured, self.boardHash,
+                               self.halfmoveClock, self.pieceSquareScore, self.phase, self.pawnHash))
+        # the piece leaves its square and the captured piece (if any, EMPTY has no key) leaves the end square
+        boardHash = self.boardHash ^ ZOBRIST_PIECE_KEYS[pieceMoved][startSq] ^ ZOBRIST_PIECE_KEYS[squares[endSq]][endSq]
+        pieceSquareScore = self.pieceSquareScore - PIECE_SQUARE_SCORES[pieceMoved][startSq] - \
+            PIECE_SQUARE_SCORES[squares[endSq]][endSq]
+        side = pieceMoved & (WHITE | BLACK)
+        ownSquares = self.pieceSquares[side]
+        ownSquares.remove(startSq)
+        ownSquares.add(endSq)
+        squares[startSq] = EMPTY
+        if captured and not move.isEnPassantMove:
+            self.pieceSquares[side ^ (WHITE | BLACK)].remove(endSq)
+        squares[endSq] = pieceMoved
         self.moveLog.append(move)
         self.whiteToMove = not self.whiteToMove
+        if self.whiteToMove:
+            self.fullmoveNumber += 1
         # update King's location if moved
-        from ChessHelper import ChessHelper
-        if ChessHelper.is_white_king(pieceMoved):
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif ChessHelper.is_black_king(pieceMoved):
-            self.blackKingLocation = (move.endRow, move.endCol)
-        # Pawn promotion
-        elif ChessHelper.is_white_pawn(pieceMoved) and endRow == 0:
-            self.eR, self.eC, self.sR, self.sC = move.endRow, move.endCol, move.startRow, move.startCol
-            self.promotionDone = False
-        elif ChessHelper.is_black_pawn(pieceMoved) and endRow == 7:
-            self.eR, self.eC, self.sR, self.sC = move.endRow, move.endCol, move.startRow, move.startCol
-            self.promotionDone = False
+        if pieceMoved == WHITE_KING:
+            self.whiteKingSquare = endSq
+        elif pieceMoved == BLACK_KING:
+            self.blackKingSquare = endSq
+        # Pawn promotion: either the piece comes with the move, or the UI asks for it (pawnPromotion)
+        elif move.isPawnPromotion:
+            if move.promotionPiece:
+                squares[endSq] = side | move.promotionPiece
+                self.phase += PHASE_WEIGHTS[squares[endSq]]
+            else:
+                self.eR, self.eC, self.sR, self.sC = move.endRow, move.endCol, move.startRow, move.startCol
+                self.promotionDone = False
         # update en passant possible
-        if ChessHelper.is_pawn_piece(pieceMoved) and abs(startRow - endRow) == 2:
-            # print((move.startRow + move.endRow) // 2, move.startCol)
-            self.enPassantPossible = (
-                (startRow + endRow) // 2, startCol)
+        if pieceMoved & PIECE_TYPE_MASK == PAWN:
+            self.enPassantSquare = (startSq + endSq) >> 1 if abs(startSq - endSq) == 16 else -1
+            self.halfmoveClock = 0
         else:
-            self.enPassantPossible = ()
+            self.enPassantSquare = -1
+            self.halfmoveClock = 0 if captured else self.halfmoveClock + 1
         # En Passant move
         if move.isEnPassantMove:
-            self.erase_piece_at_pos((startRow, endCol))
-            # caslte move
+            capturedSq = move.startRow * 8 + move.endCol
+            boardHash ^= ZOBRIST_PIECE_KEYS[squares[capturedSq]][capturedSq]
+            pieceSquareScore -= PIECE_SQUARE_SCORES[squares[capturedSq]][capturedSq]
+            squares[capturedSq] = EMPTY
+            self.pieceSquares[side ^ (WHITE | BLACK)].remove(capturedSq)
+        # castle move
         if move.isCastleMove:
-            if move.endCol - move.startCol == 2:  # king side
-                self.board[move.endRow][move.endCol -
-                                        1] = self.board[move.endRow][move.endCol + 1]  # move rook
-                # self.board[move.endRow][move.endCol + 1] = '--'  # erase old rook
-                self.erase_piece_at_pos((endRow, endCol + 1))
+            if endSq - startSq == 2:  # king side
+                rookStartSq, rookEndSq = endSq + 1, endSq - 1
             else:  # queen side
-                self.board[move.endRow][move.endCol +
-                                        1] = self.board[move.endRow][move.endCol - 2]  # move rook
-                # self.board[move.endRow][move.endCol - 2] = '--'  # erase old rook
-                self.erase_piece_at_pos((endRow, endCol - 2))
-
-        self.enPassantPossibleLog.append(self.enPassantPossible)
-
-        # update castling rights when a rook/ a king move
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                                 self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
+                rookStartSq, rookEndSq = endSq - 2, endSq + 1
+            rook = squares[rookStartSq]
+            squares[rookEndSq] = rook  # move rook
+            squares[rookStartSq] = EMPTY  # erase old rook
+            ownSquares.remove(rookStartSq)
+            ownSquares.add(rookEndSq)
+            boardHash ^= ZOBRIST_PIECE_KEYS[rook][rookStartSq] ^ ZOBRIST_PIECE_KEYS[rook][rookEndSq]
+            pieceSquareScore += PIECE_SQUARE_SCORES[rook][rookEndSq] - PIECE_SQUARE_SCORES[rook][rookStartSq]
+        # the piece standing on the end square: the moved piece, or the promotion piece
+        self.boardHash = boardHash ^ ZOBRIST_PIECE_KEYS[squares[endSq]][endSq]
+        self.pieceSquareScore = pieceSquareScore + PIECE_SQUARE_SCORES[squares[endSq]][endSq]
+        if captured:
+            self.phase -= PHASE_WEIGHTS[captured]
+        # pawn structure key: a pawn leaving its square (promoted or not), a pawn arriving, a pawn captured
+        if pieceMoved & PIECE_TYPE_MASK == PAWN:
+            self.pawnHash ^= ZOBRIST_PIECE_KEYS[pieceMoved][startSq]
+            if squares[endSq] == pieceMoved:
+                self.pawnHash ^= ZOBRIST_PIECE_KEYS[pieceMoved][endSq]
+        if captured & PIECE_TYPE_MASK == PAWN:
+            self.pawnHash ^= ZOBRIST_PIECE_KEYS[captured][move.startRow * 8 + move.endCol if move.isEnPassantMove
+                                                          else endSq]
+        if self.debugZobrist:
+            self.checkZobristKey()
+
+        # update castling rights when a rook/ a king move, or a rook is captured on its original square
+        self.castlingRights &= CASTLE_RIGHTS_KEPT[startSq] & CASTLE_RIGHTS_KEPT[endSq]
 
         # Check for draw by insufficient material
         self.draw_by_insufficent_material = self.check_for_insufficient_material()
 
-        print(f'Moved: {move.pieceMoved} to ({move.endRow},{move.endCol})')
+        if ChessLogging.traceEnabled:
+            logger.debug(f'Moved: {PIECE_NAMES[move.pieceMoved]} to ({move.endRow},{move.endCol})')
 
     def undoMove(self):
         if len(self.moveLog) != 0:
             move = self.moveLog.pop()
+            self.castlingRights, self.enPassantSquare, captured, self.boardHash, self.halfmoveClock, \
+                self.pieceSquareScore, self.phase, self.pawnHash = self.undoStack.pop()
+            squares = self.squares
             pieceMoved = move.pieceMoved
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            startSq, endSq = move.startSq, move.endSq
+            squares[startSq] = pieceMoved
+            squares[endSq] = captured
+            side = pieceMoved & (WHITE | BLACK)
+            ownSquares = self.pieceSquares[side]
+            ownSquares.remove(endSq)
+            ownSquares.add(startSq)
+            if captured:
+                if move.isEnPassantMove:
+                    # leave landing square blank
+                    squares[endSq] = EMPTY
+                    capturedSq = move.startRow * 8 + move.endCol
+                    squares[capturedSq] = captured
+                else:
+                    capturedSq = endSq
+                self.pieceSquares[side ^ (WHITE | BLACK)].add(capturedSq)
+            if self.whiteToMove:
+                self.fullmoveNumber -= 1
             self.whiteToMove = not self.whiteToMove
             # update King's location if moved
-            from ChessHelper import ChessHelper
-            if ChessHelper.is_white_king(pieceMoved):
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif ChessHelper.is_black_king(pieceMoved):
-                self.blackKingLocation = (move.startRow, move.startCol)
-            # en passant
-            if move.isEnPassantMove:
-                # leave landing square blank
-                self.board[move.endRow][move.endCol] = '--'
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-            self.enPassantPossibleLog.pop()
-            self.enPassantPossible = self.enPassantPossibleLog[-1]
-            # undo castling rights
-            self.castleRightsLog.pop()  # get rid of the new satle rights from the move we undo
-            # set the current CR to the last one in list
-            self.currentCastlingRight = self.castleRightsLog[-1]
+            if pieceMoved == WHITE_KING:
+                self.whiteKingSquare = startSq
+            elif pieceMoved == BLACK_KING:
+                self.blackKingSquare = startSq
             # undo castle move
             if move.isCastleMove:
-                if move.endCol - move.startCol == 2:  # king side
-                    self.board[move.endRow][move.endCol +
-                                            1] = self.board[move.endRow][move.endCol - 1]
-                    self.board[move.endRow][move.endCol - 1] = '--'
+                if endSq - startSq == 2:  # king side
+                    rookStartSq, rookEndSq = endSq + 1, endSq - 1
                 else:  # queen side
-                    self.board[move.endRow][move.endCol -
-                                            2] = self.board[move.endRow][move.endCol + 1]
-                    self.board[move.endRow][move.endCol + 1] = '--'
+                    rookStartSq, rookEndSq = endSq - 2, endSq + 1
+                squares[rookStartSq] = squares[rookEndSq]
+                squares[rookEndSq] = EMPTY
+                ownSquares.remove(rookEndSq)
+                ownSquares.add(rookStartSq)
             self.checkmate = False
             self.stalemate = False
+            if self.debugZobrist:
+                self.checkZobristKey()
+
+    '''
+    Null move of the search: the side to move passes. Nothing but the side and the en passant square changes,
+    and it is not recorded in moveLog.
+    Return: the en passant square to give back to undoNullMove
+    '''
+
+    def makeNullMove(self):
+        enPassantSquare = self.enPassantSquare
+        self.enPassantSquare = -1
+        self.whiteToMove = not self.whiteToMove
+        return enPassantSquare
+
+    def undoNullMove(self, enPassantSquare):
+        self.whiteToMove = not self.whiteToMove
+        self.enPassantSquare = enPassantSquare
 
     def check_game_ended(self):
         return self.stalemate or self.checkmate
 
-    def updateCastleRights(self, move):
-        pieceMoved = move.pieceMoved
-        from ChessHelper import ChessHelper
-        if ChessHelper.is_white_king(pieceMoved):
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif ChessHelper.is_black_king(pieceMoved):
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        elif ChessHelper.is_white_rook(pieceMoved):
-            if move.startRow == 7:
-                if move.startCol == 0:  # left rook
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7:  # right rook
-                    self.currentCastlingRight.wks = False
-        elif ChessHelper.is_black_rook(pieceMoved):
-            if move.startRow == 0:
-                if move.startCol == 0:  # left rook
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7:  # right rook
-                    self.currentCastlingRight.bks = False
-        elif move.pieceMoved[0] == WHITE_PIECE_PREFIX and move.endRow == 0:
-            if move.endCol == 0:
-                self.currentCastlingRight.bqs = False
-            elif move.endCol == 7:
-                self.currentCastlingRight.bks = False
-        elif move.pieceMoved[0] == BLACK_PIECE_PREFIX and move.endRow == 7:
-            if move.endCol == 7:
-                self.currentCastlingRight.wqs = False
-            elif move.endCol == 0:
-                self.currentCastlingRight.wks = False
-
     '''
     All moves considering checks
     '''
 
-    def getValidMoves(self):
+    '''
+    kind: ALL_MOVES, or CAPTURE_MOVES / QUIET_MOVES for the stages of the search move picker.
+    Only ALL_MOVES sets the checkmate / stalemate flags: a stage being empty says nothing about the game.
+    '''
+
+    def getValidMoves(self, kind=ALL_MOVES):
         moves = []
-        tempEnPassantPossible = self.enPassantPossible
-        tempCastleRights = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                        self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)
         self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
-        if self.whiteToMove:
-            kingRow = self.whiteKingLocation[0]
-            kingCol = self.whiteKingLocation[1]
-        else:
-            kingRow = self.blackKingLocation[0]
-            kingCol = self.blackKingLocation[1]
+        kingSq = self.whiteKingSquare if self.whiteToMove else self.blackKingSquare
         if self.inCheck:
             if len(self.checks) == 1:  # Only 1 check, block check or move king
-                moves = self.getAllPossibleMoves()
-                # To block a check, must move a piece into one of the square between the enemy piece an king
-                check = self.checks[0]  # check information
-                checkRow = check[0]
-                checkCol = check[1]
-                # enemy piece causing the check
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = []  # squares the pieces can move to
-                # if knight, must capture knight or move king, other piece can block
-                from ChessHelper import ChessHelper
-                if ChessHelper.is_knight_piece(pieceChecking):
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (
-                            kingRow + check[2] * i,
-                            kingCol + check[3] * i)  # check[2], check[3] are the check directions
-                        validSquares.append(validSquare)
-                        # get to piece end checks
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol:
-                            break
-                # get rid of any moves that don't block check or move king
-                # go through backwards when removing a list as iterating
-                for i in range(len(moves) - 1, -1, -1):
-                    # move doesn't move king so it must block or capture
-                    if ChessHelper.is_king_piece(moves[i].pieceMoved):
-                        if not (moves[i].endRow,
-                                moves[i].endCol) in validSquares:  # move doesn't block check or capture piece
-                            moves.remove(moves[i])
+                moves = self.filterCheckEvasions(self.getAllPossibleMoves(kind), kingSq)
             else:  # double check, king has to move
-                self.getKnightMoves(kingRow, kingCol, moves)
+                self.getKingMoves(kingSq, moves, kind)
         else:  # not in check so all moves are fine
-            moves = self.getAllPossibleMoves()
-        if len(moves) == 0:
-            if self.inCheck:
-                self.checkmate = True
-            else:
-                self.stalemate = True
-        if self.whiteToMove:
-            self.getCastleMoves(
-                self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.getCastleMoves(
-                self.blackKingLocation[0], self.blackKingLocation[1], moves)
-        self.enPassantPossible = tempEnPassantPossible
-        self.currentCastlingRight = tempCastleRights
-        print(f"Valid Moves ares: {moves}")
+            moves = self.getAllPossibleMoves(kind)
+        if kind != CAPTURE_MOVES:
+            self.getCastleMoves(kingSq, moves)
+        if kind == ALL_MOVES:
+            if len(moves) == 0:
+                if self.inCheck:
+                    self.checkmate = True
+                else:
+                    self.stalemate = True
+        if ChessLogging.traceEnabled:
+            logger.debug(f"Valid Moves ares: {[move.getUciNotation() for move in moves]}")
 
         return moves
 
     '''
-    Determine if the current player is in check
+    Keep the moves answering the single check in self.checks: king moves, captures of the checker or blocks
     '''
 
-    # def inCheck(self):
-    #     if self.whiteToMove:
-    #         return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
-    #     else:
-    #         return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
-    #
+    def filterCheckEvasions(self, moves, kingSq):
+        # To block a check, must move a piece into one of the square between the enemy piece an king
+        checkSq, checkDirection = self.checks[0]  # check information
+        validSquares = []  # squares the pieces can move to
+        # if knight, must capture knight or move king, other piece can block
+        if checkDirection == KNIGHT_CHECK:
+            validSquares = [checkSq]
+        else:
+            for validSquare in RAYS[kingSq][checkDirection]:
+                validSquares.append(validSquare)
+                # get to piece end checks
+                if validSquare == checkSq:
+                    break
+        # get rid of any moves that don't block check or move king
+        # (en passant moves were already checked against the resulting position)
+        return [move for move in moves if move.pieceMoved & PIECE_TYPE_MASK == KING or
+                move.isEnPassantMove or move.endSq in validSquares]
+
     '''
-    determine if the enemy can attack the square r, c
+    Check a move coming from elsewhere (transposition table, killer move of a sibling node) against this position:
+    return the equal legal move generated here, None if the move is not legal.
+    Only the moves of the piece on move.startSq are generated.
     '''
 
-    def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
+    def findLegalMove(self, move: Move):
+        squares = self.squares
+        side = WHITE if self.whiteToMove else BLACK
+        startSq, pieceMoved = move.startSq, move.pieceMoved
+        if not pieceMoved & side or squares[startSq] != pieceMoved:
+            return None
+        if move.isEnPassantMove:
+            if move.endSq != self.enPassantSquare:
+                return None
+        elif squares[move.endSq] != move.pieceCaptured:
+            return None
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        kingSq = self.whiteKingSquare if self.whiteToMove else self.blackKingSquare
+        pieceMoves = []
+        if pieceMoved & PIECE_TYPE_MASK == KING:
+            self.getKingMoves(startSq, pieceMoves)
+            if move.isCastleMove:
+                self.getCastleMoves(startSq, pieceMoves)
+        elif len(self.checks) < 2:
+            self.moveFunctions[pieceMoved & PIECE_TYPE_MASK](startSq, pieceMoves)
+            if self.inCheck:
+                pieceMoves = self.filterCheckEvasions(pieceMoves, kingSq)
+        for pieceMove in pieceMoves:
+            if pieceMove == move:
+                return pieceMove
+        return None
+
+    '''
+    determine if the enemy can attack the square sq
+    '''
+
+    def squareUnderAttack(self, sq):
+        return self.isSquareAttacked(sq, BLACK if self.whiteToMove else WHITE)
+
+    '''
+    Is the king of the side to move attacked: the check test of the search, without the pins of checkForPinsAndChecks
+    '''
+
+    def isInCheck(self):
+        return self.squareUnderAttack(self.whiteKingSquare if self.whiteToMove else self.blackKingSquare)
+
+    '''
+    Does the side have a piece other than pawns and king: without one, passing can be its best option (zugzwang)
+    '''
+
+    def hasNonPawnMaterial(self, side):
+        squares = self.squares
+        for sq in self.pieceSquares[side]:
+            if squares[sq] & PIECE_TYPE_MASK not in (PAWN, KING):
                 return True
         return False
 
     '''
-    All moves without considering checks
+    Look outward from sq for a piece of the given side attacking it: knight jumps, pawn diagonals, king steps,
+    then the first piece met along each ray. Stops at the first attacker found.
+    '''
+
+    def isSquareAttacked(self, sq, side):
+        squares = self.squares
+        knight = side | KNIGHT
+        for fromSq in KNIGHT_TARGETS[sq]:
+            if squares[fromSq] == knight:
+                return True
+        pawn = side | PAWN
+        for fromSq in PAWN_ATTACKER_SQUARES[side][sq]:
+            if squares[fromSq] == pawn:
+                return True
+        king = side | KING
+        for fromSq in KING_TARGETS[sq]:
+            if squares[fromSq] == king:
+                return True
+        queen = side | QUEEN
+        rays = RAYS[sq]
+        for slider, directions in ((side | ROOK, ORTHOGONAL_DIRECTIONS), (side | BISHOP, DIAGONAL_DIRECTIONS)):
+            for d in directions:
+                for fromSq in rays[d]:
+                    piece = squares[fromSq]
+                    if piece:
+                        if piece == slider or piece == queen:
+                            return True
+                        break
+        return False
+
+    '''
+    Every piece of the given side attacking sq, as a 64-bit mask of their squares (bit i = square i)
+    '''
+
+    def squareAttackers(self, sq, side):
+        return self.attackersTo(sq, side, ALL_SQUARES)
+
+    '''
+    Same, counting only the pieces on the squares of the occupancy mask: a piece taken off the mask
+    neither attacks nor blocks, so the sliders behind it are seen (x-rays of the static exchange evaluation)
+    '''
+
+    def attackersTo(self, sq, side, occupancy):
+        squares = self.squares
+        attackers = 0
+        knight = side | KNIGHT
+        for fromSq in KNIGHT_TARGETS[sq]:
+            if squares[fromSq] == knight and occupancy >> fromSq & 1:
+                attackers |= 1 << fromSq
+        pawn = side | PAWN
+        for fromSq in PAWN_ATTACKER_SQUARES[side][sq]:
+            if squares[fromSq] == pawn and occupancy >> fromSq & 1:
+                attackers |= 1 << fromSq
+        king = side | KING
+        for fromSq in KING_TARGETS[sq]:
+            if squares[fromSq] == king and occupancy >> fromSq & 1:
+                attackers |= 1 << fromSq
+        queen = side | QUEEN
+        rays = RAYS[sq]
+        for slider, directions in ((side | ROOK, ORTHOGONAL_DIRECTIONS), (side | BISHOP, DIAGONAL_DIRECTIONS)):
+            for d in directions:
+                for fromSq in rays[d]:
+                    piece = squares[fromSq]
+                    if piece and occupancy >> fromSq & 1:
+                        if piece == slider or piece == queen:
+                            attackers |= 1 << fromSq
+                        break
+        return attackers
+
+    '''
+    64-bit mask of the occupied squares
+    '''
+
+    def getOccupancy(self):
+        occupancy = 0
+        for side in (WHITE, BLACK):
+            for sq in self.pieceSquares[side]:
+                occupancy |= 1 << sq
+        return occupancy
+
+    '''
+    Static exchange evaluation: material won by the side playing the capture move once the exchange on its end square
+    is over, without searching it. Both sides recapture with their least valuable attacker (sliders lined up behind
+    a capturing piece join in), and each one stops as soon as going on would lose more.
+    Pins are ignored. Values of ChessEvaluation.EXCHANGE_VALUES (pawn = 10), promotion included.
     '''
 
-    def getAllPossibleMoves(self):
+    def staticExchange(self, move: Move):
+        squares = self.squares
+        sq = move.endSq
+        occupancy = self.getOccupancy() & ~(1 << move.startSq)
+        if move.isEnPassantMove:
+            occupancy &= ~(1 << (move.startRow * 8 + move.endCol))
+        # gains[i]: material won by the side making the i-th capture if the exchange stopped right after it
+        gains = [EXCHANGE_VALUES[move.pieceCaptured & PIECE_TYPE_MASK]]
+        # value of the piece standing on sq, the next one to be captured
+        targetValue = EXCHANGE_VALUES[move.pieceMoved & PIECE_TYPE_MASK]
+        if move.promotionPiece:
+            gains[0] += EXCHANGE_VALUES[move.promotionPiece] - EXCHANGE_VALUES[PAWN]
+            targetValue = EXCHANGE_VALUES[move.promotionPiece]
+        side = BLACK if move.pieceMoved & WHITE else WHITE
+        while True:
+            attackers = self.attackersTo(sq, side, occupancy) & occupancy
+            if not attackers:
+                break
+            attackerSq, attackerValue = -1, EXCHANGE_VALUES[KING] + 1
+            while attackers:
+                bit = attackers & -attackers
+                attackers ^= bit
+                fromSq = bit.bit_length() - 1
+                value = EXCHANGE_VALUES[squares[fromSq] & PIECE_TYPE_MASK]
+                if value < attackerValue:
+                    attackerSq, attackerValue = fromSq, value
+            gains.append(targetValue - gains[-1])
+            targetValue = attackerValue
+            occupancy &= ~(1 << attackerSq)
+            side ^= WHITE | BLACK
+        # back to the first capture: each side takes the better of stopping and capturing
+        while len(gains) > 1:
+            gain = gains.pop()
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+    '''
+    All moves without considering checks.
+    kind: ALL_MOVES, CAPTURE_MOVES or QUIET_MOVES, passed down to the piece generators so that each stage
+    only generates its own moves
+    '''
+
+    def getAllPossibleMoves(self, kind=ALL_MOVES):
         moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                turn = self.board[r][c][0]
-                if (turn == WHITE_PIECE_PREFIX and self.whiteToMove) or (
-                        turn == BLACK_PIECE_PREFIX and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves)
+        squares = self.squares
+        moveFunctions = self.moveFunctions
+        for sq in self.pieceSquares[WHITE if self.whiteToMove else BLACK]:
+            moveFunctions[squares[sq] & PIECE_TYPE_MASK](sq, moves, kind)
         return moves
 
     '''
-    Get all the pawn moves for the pawn located at row, col and add these moves to the list
+    Get all the pawn moves for the pawn located at sq and add these moves to the list
     '''
 
-    def getPawnMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+    def getPawnMoves(self, sq, moves, kind=ALL_MOVES):
+        squares = self.squares
+        pinDirection = self.pins.get(sq)
+        piecePinned = pinDirection is not None
+        r, c = sq >> 3, sq & 7
         if self.whiteToMove:
-            if r > 0:
-                if self.board[r - 1][c] == '--':
-                    if not piecePinned or pinDirection == (-1, 0):
-                        moves.append(Move((r, c), (r - 1, c), self.board))
-                        if r == 6 and self.board[r - 2][c] == '--':
-                            moves.append(Move((r, c), (r - 2, c), self.board))
-                # captures
-                if c - 1 >= 0:  # capture left
-                    if self.board[r - 1][c - 1][0] == BLACK_PIECE_PREFIX:
-                        if not piecePinned or pinDirection == (-1, -1):
-                            moves.append(
-                                Move((r, c), (r - 1, c - 1), self.board))
-                    elif (r - 1, c - 1) == self.enPassantPossible:
-                        if not piecePinned or pinDirection == (-1, -1):
-                            moves.append(
-                                Move((r, c), (r - 1, c - 1), self.board, True))
-                if c + 1 <= 7:  # capture right
-                    if self.board[r - 1][c + 1][0] == BLACK_PIECE_PREFIX:
-                        if not piecePinned or pinDirection == (-1, 1):
-                            moves.append(
-                                Move((r, c), (r - 1, c + 1), self.board))
-                    elif (r - 1, c + 1) == self.enPassantPossible:
-                        if not piecePinned or pinDirection == (-1, 1):
-                            moves.append(
-                                Move((r, c), (r - 1, c + 1), self.board, True))
+            # (push, start row, capture left, capture right) as (square offset, direction) pairs
+            step, startRow, enemyColor = -8, 6, BLACK
+            pushDirection, leftDirection, rightDirection = 0, 4, 5
+            leftStep, rightStep = -9, -7
+            onBoard = r > 0
         else:
-            if r < 7:
-                if self.board[r + 1][c] == '--':
-                    if not piecePinned or pinDirection == (1, 0):
-                        moves.append(Move((r, c), (r + 1, c), self.board))
-                        if r == 1 and self.board[r + 2][c] == '--':
-                            moves.append(Move((r, c), (r + 2, c), self.board))
-                # captures
-                if c - 1 >= 0:  # capture left
-                    # print((r + 1, c - 1))
-                    if self.board[r + 1][c - 1][0] == WHITE_PIECE_PREFIX:
-                        if not piecePinned or pinDirection == (1, -1):
-                            moves.append(
-                                Move((r, c), (r + 1, c - 1), self.board))
-                    elif (r + 1, c - 1) == self.enPassantPossible:
-                        if not piecePinned or pinDirection == (1, -1):
-                            moves.append(
-                                Move((r, c), (r + 1, c - 1), self.board, True))
-                if c + 1 <= 7:  # capture right
-                    if self.board[r + 1][c + 1][0] == WHITE_PIECE_PREFIX:
-                        if not piecePinned or pinDirection == (1, 1):
-                            moves.append(
-                                Move((r, c), (r + 1, c + 1), self.board))
-                    elif (r + 1, c + 1) == self.enPassantPossible:
-                        if not piecePinned or pinDirection == (1, 1):
-                            moves.append(
-                                Move((r, c), (r + 1, c + 1), self.board, True))
-
-    '''
-    Get all the rook moves for the rook located at row, col and add these moves to the list
-    '''
-
-    def getRookMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][
-                        1] != 'Q':  # can't remove queen from pin on rook moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        enemyColor = BLACK_PIECE_PREFIX if self.whiteToMove else WHITE_PIECE_PREFIX
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == '--':  # empty space valid
-                            moves.append(
-                                Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:  # enemy piece valid
-                            moves.append(
-                                Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # ally piece invalid
-                            break
-                else:  # off board
-                    break
+            step, startRow, enemyColor = 8, 1, WHITE
+            pushDirection, leftDirection, rightDirection = 2, 6, 7
+            leftStep, rightStep = 7, 9
+            onBoard = r < 7
+        if not onBoard:
+            return
+        # a push is a quiet move unless it promotes (the double push never does)
+        promotes = sq + step < 8 or sq + step >= 56
+        if squares[sq + step] == EMPTY and kind != (QUIET_MOVES if promotes else CAPTURE_MOVES):
+            if not piecePinned or pinDirection == pushDirection or pinDirection == OPPOSITE_DIRECTIONS[pushDirection]:
+                self.addPawnMove(sq, sq + step, moves)
+                if r == startRow and squares[sq + 2 * step] == EMPTY:
+                    moves.append(getMove(sq, sq + 2 * step, squares))
+        if kind == QUIET_MOVES:
+            return
+        # captures
+        for canCapture, captureStep, captureDirection in ((c - 1 >= 0, leftStep, leftDirection),
+                                                          (c + 1 <= 7, rightStep, rightDirection)):
+            if not canCapture:
+                continue
+            endSq = sq + captureStep
+            if squares[endSq] & enemyColor:
+                if not piecePinned or pinDirection == captureDirection or \
+                        pinDirection == OPPOSITE_DIRECTIONS[captureDirection]:
+                    self.addPawnMove(sq, endSq, moves)
+            elif endSq == self.enPassantSquare and self.isLegalEnPassant(sq, endSq):
+                moves.append(getMove(sq, endSq, squares, True))
+
+    def addPawnMove(self, startSq, endSq, moves):
+        squares = self.squares
+        if endSq < 8 or endSq >= 56:
+            for piece in PROMOTION_PIECES:
+                moves.append(getMove(startSq, endSq, squares, promotionPiece=piece))
+        else:
+            moves.append(getMove(startSq, endSq, squares))
 
     '''
-    Get all the knight moves for the knight located at row, col and add these moves to the list
+    En passant removes two pawns from the same row, which pins cannot see (e.g. king and rook on that row):
+    replay it on the board and look for a check
     '''
 
-    def getKnightMoves(self, r, c, moves):
-        piecePinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                       (1, -2), (1, 2), (2, -1), (2, 1))
-        allyColor = WHITE_PIECE_PREFIX if self.whiteToMove else BLACK_PIECE_PREFIX
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:  # not an ally piece
-                        moves.append(
-                            Move((r, c), (endRow, endCol), self.board))
-
-    '''
-    Get all the bishop moves for the bishop located at row, col and add these moves to the list
-    '''
-
-    def getBishopMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemyColor = BLACK_PIECE_PREFIX if self.whiteToMove else WHITE_PIECE_PREFIX
+    def isLegalEnPassant(self, startSq, endSq):
+        squares = self.squares
+        capturedSq = (startSq & ~7) | (endSq & 7)
+        pawn, captured = squares[startSq], squares[capturedSq]
+        squares[startSq], squares[capturedSq], squares[endSq] = EMPTY, EMPTY, pawn
+        inCheck = self.checkForPinsAndChecks()[0]
+        squares[startSq], squares[capturedSq], squares[endSq] = pawn, captured, EMPTY
+        return not inCheck
+
+    '''
+    Walk the rays of a rook/bishop/queen located at sq in the given directions and add these moves to the list
+    '''
+
+    def getSlidingMoves(self, sq, moves, directions, kind=ALL_MOVES):
+        squares = self.squares
+        quiets, captures = kind != CAPTURE_MOVES, kind != QUIET_MOVES
+        pinDirection = self.pins.get(sq)
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        rays = RAYS[sq]
         for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == '--':  # empty space valid
-                            moves.append(
-                                Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:  # enemy piece valid
-                            moves.append(
-                                Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # ally piece valid
-                            break
-                else:
+            # a pinned piece can only slide along the pin line
+            if pinDirection is not None and d != pinDirection and d != OPPOSITE_DIRECTIONS[pinDirection]:
+                continue
+            for endSq in rays[d]:
+                endPiece = squares[endSq]
+                if endPiece == EMPTY:  # empty space valid
+                    if quiets:
+                        moves.append(getMove(sq, endSq, squares))
+                elif endPiece & enemyColor:  # enemy piece valid
+                    if captures:
+                        moves.append(getMove(sq, endSq, squares))
                     break
+                else:  # ally piece invalid
+                    break
+
+    '''
+    Get all the rook moves for the rook located at sq and add these moves to the list
+    '''
+
+    def getRookMoves(self, sq, moves, kind=ALL_MOVES):
+        self.getSlidingMoves(sq, moves, ORTHOGONAL_DIRECTIONS, kind)
 
     '''
-    Get all the queen moves for the queen located at row, col and add these moves to the list
+    Get all the knight moves for the knight located at sq and add these moves to the list
     '''
 
-    def getQueenMoves(self, r, c, moves):
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+    def getKnightMoves(self, sq, moves, kind=ALL_MOVES):
+        if sq in self.pins:
+            return
+        squares = self.squares
+        targets = self.getTargetPieces(kind)
+        for endSq in KNIGHT_TARGETS[sq]:
+            if squares[endSq] in targets:
+                moves.append(getMove(sq, endSq, squares))
+
+    '''
+    Pieces a knight / king move of the given kind can land on: EMPTY for the quiet moves, enemy pieces for captures
+    '''
+
+    def getTargetPieces(self, kind):
+        enemyPieces = BLACK_PIECES if self.whiteToMove else WHITE_PIECES
+        if kind == CAPTURE_MOVES:
+            return enemyPieces
+        if kind == QUIET_MOVES:
+            return EMPTY_TARGETS
+        return enemyPieces | EMPTY_TARGETS
+
+    '''
+    Get all the bishop moves for the bishop located at sq and add these moves to the list
+    '''
+
+    def getBishopMoves(self, sq, moves, kind=ALL_MOVES):
+        self.getSlidingMoves(sq, moves, DIAGONAL_DIRECTIONS, kind)
+
+    '''
+    Get all the queen moves for the queen located at sq and add these moves to the list
+    '''
+
+    def getQueenMoves(self, sq, moves, kind=ALL_MOVES):
+        self.getRookMoves(sq, moves, kind)
+        self.getBishopMoves(sq, moves, kind)
 
     '''
     Calculate the heuristics values for alpha beta pruning
     '''
 
     # TODO: This function should check if their is one wining side or a draw game
-    # ! Problem: We dont have data structure to keep tracks of pieces on the board :((
     def getScoreBoardValue(self):
         if self.check_game_ended():
             if self.checkmate:
@@ -676,203 +1124,147 @@ class GameState:
             return 0
 
     '''
-    Get all the king moves for the king located at row, col and add these moves to the list
-    '''
-
-    def getKingMoves(self, r, c, moves):
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        allyColor = WHITE_PIECE_PREFIX if self.whiteToMove else BLACK_PIECE_PREFIX
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:  # Not an ally piece
-                    # place king in end square and check for checks
-                    if allyColor == WHITE_PIECE_PREFIX:
-                        row, col = self.whiteKingLocation[0], self.whiteKingLocation[1]
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        row, col = self.blackKingLocation[0], self.blackKingLocation[1]
-                        self.blackKingLocation = (endRow, endCol)
-                    # self.board[row][col] = '--'
-                    inChecks, pins, checks = self.checkForPinsAndChecks()
-                    from ChessHelper import ChessHelper
-                    if allyColor == WHITE_PIECE_PREFIX:
-                        ChessHelper.is_white_king(
-                            self.get_pos_value((row, col)))
-                    else:
-                        ChessHelper.is_black_king(
-                            self.get_pos_value((row, col)))
-                    if not inChecks:
-                        moves.append(
-                            Move((r, c), (endRow, endCol), self.board))
-                    # place king back on original location
-                    if allyColor == WHITE_PIECE_PREFIX:
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
-        # self.getCastleMoves(r, c, moves, allyColor)
+    Get all the king moves for the king located at sq and add these moves to the list
+    '''
+
+    def getKingMoves(self, sq, moves, kind=ALL_MOVES):
+        squares = self.squares
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        targets = self.getTargetPieces(kind)
+        king = squares[sq]
+        safeSquares = []
+        # lift the king so that it does not block the rays going through its own square
+        squares[sq] = EMPTY
+        for endSq in KING_TARGETS[sq]:
+            if squares[endSq] in targets and not self.isSquareAttacked(endSq, enemyColor):
+                safeSquares.append(endSq)
+        squares[sq] = king
+        for endSq in safeSquares:
+            moves.append(getMove(sq, endSq, squares))
 
     def pawnPromotion(self, char):
         piece_promoted_to = WHITE_PIECE_PREFIX + \
             char if self.whiteToMove else BLACK_PIECE_PREFIX + char
 
-        self.board[self.eR][self.eC] = piece_promoted_to + self.promotion_seed
-        self.promotion_seed = self.promotion_seed + 1
-
-        self.board[self.sR][self.sC] = '--'
+        endSq = self.eR * 8 + self.eC
+        promoted = PIECE_CODES[piece_promoted_to]
+        self.boardHash ^= ZOBRIST_PIECE_KEYS[self.squares[endSq]][endSq] ^ ZOBRIST_PIECE_KEYS[promoted][endSq]
+        self.pawnHash ^= ZOBRIST_PIECE_KEYS[self.squares[endSq]][endSq]
+        self.pieceSquareScore += PIECE_SQUARE_SCORES[promoted][endSq] - PIECE_SQUARE_SCORES[self.squares[endSq]][endSq]
+        self.phase += PHASE_WEIGHTS[promoted]
+        self.squares[endSq] = promoted
+        self.squares[self.sR * 8 + self.sC] = EMPTY
         self.promotionDone = True
+        if self.debugZobrist:
+            self.checkZobristKey()
         self.whiteToMove = not self.whiteToMove
 
     '''
-    Generate all valid castle moves for the king at (r, c) and add them to the list of moves
+    Generate all valid castle moves for the king at sq and add them to the list of moves
     '''
 
-    def getCastleMoves(self, r, c, moves):
+    def getCastleMoves(self, sq, moves):
         # if is check, can't castling
-        if self.squareUnderAttack(r, c):
+        if self.squareUnderAttack(sq):
             return
-        if (self.whiteToMove and self.currentCastlingRight.wks) or (
-                not self.whiteToMove and self.currentCastlingRight.bks):
-            self.getKingSideCastleMoves(r, c, moves)
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (
-                not self.whiteToMove and self.currentCastlingRight.bqs):
-            self.getQueenSideCastleMoves(r, c, moves)
-
-    def getKingSideCastleMoves(self, r, c, moves):
-        if self.board[r][c + 1] == '--' and self.board[r][c + 2] == '--':
-            if not self.squareUnderAttack(r, c + 1) and not self.squareUnderAttack(r, c + 2):
-                moves.append(
-                    Move((r, c), (r, c + 2), self.board, isCastleMove=True))
-
-    def getQueenSideCastleMoves(self, r, c, moves):
-        if self.board[r][c - 1] == '--' and self.board[r][c - 2] == '--' and self.board[r][c - 3] == '--':
-            if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(r, c - 2):
-                moves.append(
-                    Move((r, c), (r, c - 2), self.board, isCastleMove=True))
+        if self.castlingRights & (CASTLE_WKS if self.whiteToMove else CASTLE_BKS):
+            self.getKingSideCastleMoves(sq, moves)
+        if self.castlingRights & (CASTLE_WQS if self.whiteToMove else CASTLE_BQS):
+            self.getQueenSideCastleMoves(sq, moves)
+
+    def getKingSideCastleMoves(self, sq, moves):
+        squares = self.squares
+        if squares[sq + 1] == EMPTY and squares[sq + 2] == EMPTY:
+            if not self.squareUnderAttack(sq + 1) and not self.squareUnderAttack(sq + 2):
+                moves.append(getMove(sq, sq + 2, squares, isCastleMove=True))
+
+    def getQueenSideCastleMoves(self, sq, moves):
+        squares = self.squares
+        if squares[sq - 1] == EMPTY and squares[sq - 2] == EMPTY and squares[sq - 3] == EMPTY:
+            if not self.squareUnderAttack(sq - 1) and not self.squareUnderAttack(sq - 2):
+                moves.append(getMove(sq, sq - 2, squares, isCastleMove=True))
+
+    '''
+    Look outward from the king of the side to move.
+    Return: inCheck, pins as {pinned square: direction from the king}, checks as [(checker square, direction)]
+    '''
 
     def checkForPinsAndChecks(self):
-        pins = []  # Squares where the allied pinned piece is and direction pinned from
+        squares = self.squares
+        pins = {}  # Squares where the allied pinned piece is and direction pinned from
         checks = []  # Squares where enemy is applying a check
         inCheck = False
         if self.whiteToMove:
-            enemyColor = BLACK_PIECE_PREFIX
-            allyColor = WHITE_PIECE_PREFIX
-            startRow = self.whiteKingLocation[0]
-            startCol = self.whiteKingLocation[1]
+            enemyColor = BLACK
+            allyColor = WHITE
+            kingSq = self.whiteKingSquare
         else:
-            enemyColor = WHITE_PIECE_PREFIX
-            allyColor = BLACK_PIECE_PREFIX
-            startRow = self.blackKingLocation[0]
-            startCol = self.blackKingLocation[1]
+            enemyColor = WHITE
+            allyColor = BLACK
+            kingSq = self.blackKingSquare
         # Check outward from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1),
-                      (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            dir = directions[j]
-            possiblePin = ()  # reset possible pins
-            for i in range(1, 8):
-                endRow = startRow + dir[0] * i
-                endCol = startCol + dir[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor:
-                        if possiblePin == ():  # 1st allied piece could be pinned
-                            possiblePin = (endRow, endCol, dir[0], dir[1])
-                        else:  # 2nd allied piece, so no pin or check possible in this direction
+        rays = RAYS[kingSq]
+        for j in range(8):
+            possiblePin = -1  # reset possible pins
+            for i, endSq in enumerate(rays[j], 1):
+                endPiece = squares[endSq]
+                if endPiece & allyColor:
+                    if possiblePin == -1:  # 1st allied piece could be pinned
+                        possiblePin = endSq
+                    else:  # 2nd allied piece, so no pin or check possible in this direction
+                        break
+                elif endPiece & enemyColor:
+                    type = endPiece & PIECE_TYPE_MASK
+                    # 5 possibilities in this conditional
+                    # 1. orthogonally away from king and piece is a rook
+                    # 2. diagonally away from king and piece is a bishop
+                    # 3. 1 square away diagonally from king and piece is a pawn
+                    # 4. any direction and piece is a queen
+                    # 5. any direction 1 square away and piece is a king (prevent king to move to a square controlled by another king)
+                    if (0 <= j <= 3 and type == ROOK) or \
+                            (4 <= j <= 7 and type == BISHOP) or \
+                            (i == 1 and type == PAWN and (
+                                (enemyColor == WHITE and 6 <= j <= 7) or (
+                                    enemyColor == BLACK and 4 <= j <= 5))) or \
+                            (type == QUEEN) or (i == 1 and type == KING):
+                        if possiblePin == -1:  # no piece blocking, so check
+                            inCheck = True
+                            checks.append((endSq, j))
                             break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        # 5 possibilities in this conditional
-                        # 1. orthogonally away from king and piece is a rook
-                        # 2. diagonally away from king and piece is a bishop
-                        # 3. 1 square away diagonally from king and piece is a pawn
-                        # 4. any direction and piece is a queen
-                        # 5. any direction 1 square away and piece is a king (prevent king to move to a square controlled by another king)
-                        if (0 <= j <= 3 and type == ROOK_PIECE) or \
-                                (4 <= j <= 7 and type == BISHOP_PIECE) or \
-                                (i == 1 and type == PAWN_PIECE and (
-                                    (enemyColor == WHITE_PIECE_PREFIX and 6 <= j <= 7) or (
-                                        enemyColor == BLACK_PIECE_PREFIX and 4 <= j <= 5))) or \
-                                (type == QUEEN_PIECE) or (i == 1 and type == KING_PIECE):
-                            if possiblePin == ():  # no piece blocking, so check
-                                inCheck = True
-                                checks.append((endRow, endCol, dir[0], dir[1]))
-                                break
-                            else:  # piece blocking so pin
-                                pins.append(possiblePin)
-                                break
-                        else:  # Enemy piece not applying check
+                        else:  # piece blocking so pin
+                            pins[possiblePin] = j
                             break
-                else:
-                    break
+                    else:  # Enemy piece not applying check
+                        break
         # Check for knight checks
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                       (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                # enemy knight attacking king
-                if endPiece[0] == enemyColor and endPiece[1] == KNIGHT_PIECE:
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+        enemyKnight = enemyColor | KNIGHT
+        for endSq in KNIGHT_TARGETS[kingSq]:
+            # enemy knight attacking king
+            if squares[endSq] == enemyKnight:
+                inCheck = True
+                checks.append((endSq, KNIGHT_CHECK))
         return inCheck, pins, checks
 
 
-class CastleRights:
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
-
-
-class Move:
-    # maps keys to values:
-    # key : value
-    ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4,
-                   "5": 3, "6": 2, "7": 1, "8": 0}
-    rowsToRanks = {v: k for k, v in ranksToRows.items()}
-    filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3,
-                   "e": 4, "f": 5, "g": 6, "h": 7}
-    colsToFiles = {v: k for k, v in filesToCols.items()}
-    UNICODE_PIECES = {
-        'bR': '♜', 'bN': '♞', 'bB': '♝', 'bQ': '♛',
-        'bK': '♚', 'bp': '♟', 'wR': '♖', 'wN': '♘',
-        'wB': '♗', 'wQ': '♕', 'wK': '♔', 'wp': '♙',
-        '--': ''
-    }
+# * Board backends selectable when creating a game
+MAILBOX_ENGINE = "MAILBOX"
+BITBOARD_ENGINE = "BITBOARD"
+AVAILABLE_ENGINES = [MAILBOX_ENGINE, BITBOARD_ENGINE]
 
-    def __init__(self, startSq, endSq, board, isEnPassantMove=False, isCastleMove=False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        # en passant
-        self.isEnPassantMove = isEnPassantMove
-        if self.isEnPassantMove:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
-        self.modeID = self.startRow * 1000 + self.startCol * \
-            100 + self.endRow * 10 + self.endCol
-        self.isCastleMove = isCastleMove
-
-    '''Override'''
 
-    def __eq__(self, other):
-        if isinstance(other, Move):
-            return self.modeID == other.modeID
-        return False
+'''
+Game state of the given backend, at the start position or at the position of a FEN string
+'''
 
-    def getChessNotation(self):
-        from ChessHelper import ChessHelper
-        chess_piece_key = ChessHelper.get_piece_side_and_type(self.pieceMoved)
-        return self.UNICODE_PIECES[chess_piece_key] + self.getRankFile(self.endRow, self.endCol)
 
-    def getRankFile(self, r, c):
-        return self.colsToFiles[c] + self.rowsToRanks[r]
+def createGameState(engine=MAILBOX_ENGINE, fen=None) -> GameState:
+    if engine == MAILBOX_ENGINE:
+        gameState = GameState()
+    elif engine == BITBOARD_ENGINE:
+        from ChessBitboard import BitboardGameState
+        gameState = BitboardGameState()
+    else:
+        raise RuntimeError(f"Unknown engine: {engine}, expected one of {AVAILABLE_ENGINES}")
+    if fen is not None:
+        gameState.setFen(fen)
+    return gameState
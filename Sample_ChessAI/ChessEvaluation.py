@@ -0,0 +1,242 @@
+from ChessTypes import PIECE_NAMES, EMPTY_CELL, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_TYPE_MASK, WHITE, \
+    BLACK
+
+"""
+    Static evaluation: material + piece-square tables, blended between a midgame and an endgame score
+    by the amount of non-pawn material left (tapered evaluation).
+
+    The tables below are written from white's point of view, row 0 being rank 8 like GameState.squares;
+    a black piece reads the square mirrored across the middle of the board and counts negative.
+    Values are in units of a tenth of a pawn (pawn = 10), scaled by SCALE to stay integers.
+
+    The position score is never computed by scanning the board during the search:
+    GameState keeps the sum of PIECE_SQUARE_SCORES[piece][sq] of every piece (pieceSquareScore) and the game phase,
+    updated by makeMove / undoMove like the Zobrist hash, so evaluate(gs) only blends two numbers
+    (plus the pawn structure, see below).
+    Midgame and endgame sums share one integer: packed = eg * 2^16 + mg (see packScore / unpackScore).
+
+    Pawn structure (doubled, isolated and passed pawns) only depends on where the pawns are: evaluatePawnStructure
+    scans the pawns, and the search keeps its packed score in a pawn hash table keyed by GameState.pawnHash.
+"""
+
+SCALE = 10
+
+# * Scores of the game results, shared by the engine, the search and ChessAI
+# checkmate at the root; a mate found n plies away scores MATE_SCORE - n
+MATE_SCORE = 10000
+DRAW_SCORE = 0
+
+# index: piece type (EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+MATERIAL_MIDGAME = (0, 10, 30, 30, 50, 90, 0)
+MATERIAL_ENDGAME = (0, 12, 28, 30, 52, 92, 0)
+# static exchange evaluation (GameState.staticExchange): the king is never traded, it outweighs everything
+EXCHANGE_VALUES = MATERIAL_MIDGAME[:KING] + (1000,)
+# game phase: 24 with every minor and major piece on the board, 0 in a pawn (or bare king) ending
+PHASE_WEIGHTS_BY_TYPE = (0, 0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+
+PAWN_MIDGAME = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [5, 5, 5, 5, 5, 5, 5, 5],
+    [1, 1, 2, 3, 3, 2, 1, 1],
+    [0.5, 0.5, 1, 2.5, 2.5, 1, 0.5, 0.5],
+    [0, 0, 0, 2, 2, 0, 0, 0],
+    [0.5, -0.5, -1, 0, 0, -1, -0.5, 0.5],
+    [0.5, 1, 1, -2, -2, 1, 1, 0.5],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+# passed pawns decide endings: the closer to promotion the better, whatever the file
+PAWN_ENDGAME = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [8, 8, 8, 8, 8, 8, 8, 8],
+    [5, 5, 5, 5, 5, 5, 5, 5],
+    [3, 3, 3, 3, 3, 3, 3, 3],
+    [1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5],
+    [0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+KNIGHT_TABLE = [
+    [-5, -4, -3, -3, -3, -3, -4, -5],
+    [-4, -2, 0, 0, 0, 0, -2, -4],
+    [-3, 0, 1, 1.5, 1.5, 1, 0, -3],
+    [-3, 0.5, 1.5, 2, 2, 1.5, 0.5, -3],
+    [-3, 0, 1.5, 2, 2, 1.5, 0, -3],
+    [-3, 0.5, 1, 1.5, 1.5, 1, 0.5, -3],
+    [-4, -2, 0, 0.5, 0.5, 0, -2, -4],
+    [-5, -4, -3, -3, -3, -3, -4, -5]
+]
+
+BISHOP_TABLE = [
+    [-2, -1, -1, -1, -1, -1, -1, -2],
+    [-1, 0, 0, 0, 0, 0, 0, -1],
+    [-1, 0, 0.5, 1, 1, 0.5, 0, -1],
+    [-1, 0.5, 0.5, 1, 1, 0.5, 0.5, -1],
+    [-1, 0, 1, 1, 1, 1, 0, -1],
+    [-1, 1, 1, 1, 1, 1, 1, -1],
+    [-1, 0.5, 0, 0, 0, 0, 0.5, -1],
+    [-2, -1, -1, -1, -1, -1, -1, -2]
+]
+
+ROOK_TABLE = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [0.5, 1, 1, 1, 1, 1, 1, 0.5],
+    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+    [-0.5, 0, 0, 0, 0, 0, 0, -0.5],
+    [0, 0, 0, 0.5, 0.5, 0, 0, 0]
+]
+
+QUEEN_TABLE = [
+    [-2, -1, -1, -0.5, -0.5, -1, -1, -2],
+    [-1, 0, 0, 0, 0, 0, 0, -1],
+    [-1, 0, 0.5, 0.5, 0.5, 0.5, 0, -1],
+    [-0.5, 0, 0.5, 0.5, 0.5, 0.5, 0, -0.5],
+    [0, 0, 0.5, 0.5, 0.5, 0.5, 0, -0.5],
+    [-1, 0.5, 0.5, 0.5, 0.5, 0.5, 0, -1],
+    [-1, 0, 0.5, 0, 0, 0, 0, -1],
+    [-2, -1, -1, -0.5, -0.5, -1, -1, -2]
+]
+
+# the king hides behind its pawns while queens are around...
+KING_MIDGAME = [
+    [-3, -4, -4, -5, -5, -4, -4, -3],
+    [-3, -4, -4, -5, -5, -4, -4, -3],
+    [-3, -4, -4, -5, -5, -4, -4, -3],
+    [-3, -4, -4, -5, -5, -4, -4, -3],
+    [-2, -3, -3, -4, -4, -3, -3, -2],
+    [-1, -2, -2, -2, -2, -2, -2, -1],
+    [2, 2, 0, 0, 0, 0, 2, 2],
+    [2, 3, 1, 0, 0, 1, 3, 2]
+]
+
+# ...and walks to the center once they are gone
+KING_ENDGAME = [
+    [-5, -4, -3, -2, -2, -3, -4, -5],
+    [-3, -2, -1, 0, 0, -1, -2, -3],
+    [-3, -1, 2, 3, 3, 2, -1, -3],
+    [-3, -1, 3, 4, 4, 3, -1, -3],
+    [-3, -1, 3, 4, 4, 3, -1, -3],
+    [-3, -1, 2, 3, 3, 2, -1, -3],
+    [-3, -3, 0, 0, 0, 0, -3, -3],
+    [-5, -3, -3, -3, -3, -3, -3, -5]
+]
+
+# pawn structure, (midgame, endgame) per pawn
+DOUBLED_PAWN_PENALTY = (1, 2)
+ISOLATED_PAWN_PENALTY = (1, 1.5)
+# passed pawn bonus by rows advanced from the starting row (0 to 5, 6 being promotion)
+PASSED_PAWN_MIDGAME = (0.5, 0.5, 1, 2, 3.5, 5)
+PASSED_PAWN_ENDGAME = (1, 1.5, 3, 5, 8, 12)
+
+# piece type: (midgame table, endgame table)
+PIECE_SQUARE_TABLES = {
+    PAWN: (PAWN_MIDGAME, PAWN_ENDGAME),
+    KNIGHT: (KNIGHT_TABLE, KNIGHT_TABLE),
+    BISHOP: (BISHOP_TABLE, BISHOP_TABLE),
+    ROOK: (ROOK_TABLE, ROOK_TABLE),
+    QUEEN: (QUEEN_TABLE, QUEEN_TABLE),
+    KING: (KING_MIDGAME, KING_ENDGAME),
+}
+
+
+def packScore(midgame, endgame):
+    return (endgame << 16) + midgame
+
+
+def unpackScore(packed):
+    endgame = (packed + 0x8000) >> 16
+    return packed - (endgame << 16), endgame
+
+
+def _piece_square_scores(piece):
+    if PIECE_NAMES[piece] == EMPTY_CELL:
+        return (0,) * 64
+    pieceType = piece & PIECE_TYPE_MASK
+    midgameTable, endgameTable = PIECE_SQUARE_TABLES[pieceType]
+    scores = []
+    for sq in range(64):
+        # black reads the white table upside down: row r of black is row 7 - r of white
+        row, col = (sq >> 3, sq & 7) if piece & WHITE else (7 - (sq >> 3), sq & 7)
+        midgame = round((MATERIAL_MIDGAME[pieceType] + midgameTable[row][col]) * SCALE)
+        endgame = round((MATERIAL_ENDGAME[pieceType] + endgameTable[row][col]) * SCALE)
+        sign = 1 if piece & WHITE else -1
+        scores.append(packScore(sign * midgame, sign * endgame))
+    return tuple(scores)
+
+
+# PIECE_SQUARE_SCORES[piece code][sq]: packed white-relative midgame / endgame value of that piece on that square
+PIECE_SQUARE_SCORES = tuple(_piece_square_scores(piece) for piece in range(len(PIECE_NAMES)))
+# scaled pawn structure terms of evaluatePawnStructure
+DOUBLED_PAWN_SCORES = tuple(round(penalty * SCALE) for penalty in DOUBLED_PAWN_PENALTY)
+ISOLATED_PAWN_SCORES = tuple(round(penalty * SCALE) for penalty in ISOLATED_PAWN_PENALTY)
+PASSED_PAWN_SCORES = tuple((round(midgame * SCALE), round(endgame * SCALE))
+                           for midgame, endgame in zip(PASSED_PAWN_MIDGAME, PASSED_PAWN_ENDGAME))
+# PHASE_WEIGHTS[piece code]
+PHASE_WEIGHTS = tuple(PHASE_WEIGHTS_BY_TYPE[piece & PIECE_TYPE_MASK] if PIECE_NAMES[piece] != EMPTY_CELL else 0
+                      for piece in range(len(PIECE_NAMES)))
+
+'''
+From scratch, for a new position: (packed piece-square score, phase)
+'''
+
+
+def computePieceSquareScore(squares):
+    packed = 0
+    phase = 0
+    for sq, piece in enumerate(squares):
+        if piece:
+            packed += PIECE_SQUARE_SCORES[piece][sq]
+            phase += PHASE_WEIGHTS[piece]
+    return packed, phase
+
+
+'''
+Packed white-relative score of the pawn structure: doubled and isolated pawns lose, passed pawns
+(no enemy pawn ahead on their file or the next ones) gain by how far they went
+'''
+
+
+def evaluatePawnStructure(gs):
+    squares = gs.squares
+    pawns = {side: [sq for sq in gs.pieceSquares[side] if squares[sq] == side | PAWN] for side in (WHITE, BLACK)}
+    midgame = endgame = 0
+    for side, enemy, sign in ((WHITE, BLACK, 1), (BLACK, WHITE, -1)):
+        files = [0] * 10  # files[col + 1]: pawns of the side on that file, with an empty file on both edges
+        for sq in pawns[side]:
+            files[(sq & 7) + 1] += 1
+        for sq in pawns[side]:
+            row, col = sq >> 3, sq & 7
+            if files[col + 1] > 1:
+                midgame -= sign * DOUBLED_PAWN_SCORES[0]
+                endgame -= sign * DOUBLED_PAWN_SCORES[1]
+            if not files[col] and not files[col + 2]:
+                midgame -= sign * ISOLATED_PAWN_SCORES[0]
+                endgame -= sign * ISOLATED_PAWN_SCORES[1]
+            # white pawns go up the board (row 6 to row 0), black ones down
+            if all(abs((enemySq & 7) - col) > 1 or (enemySq >> 3 >= row if side == WHITE else enemySq >> 3 <= row)
+                   for enemySq in pawns[enemy]):
+                advanced = 6 - row if side == WHITE else row - 1
+                midgame += sign * PASSED_PAWN_SCORES[advanced][0]
+                endgame += sign * PASSED_PAWN_SCORES[advanced][1]
+    return packScore(midgame, endgame)
+
+
+'''
+White-relative score of the position, from the running sums of the game state (no board scan)
+pawnStructure: packed evaluatePawnStructure score of the position when it is already known (pawn hash table)
+'''
+
+
+def evaluate(gs, pawnStructure=None):
+    if pawnStructure is None:
+        pawnStructure = evaluatePawnStructure(gs)
+    midgame, endgame = unpackScore(gs.pieceSquareScore + pawnStructure)
+    phase = min(gs.phase, MAX_PHASE)
+    score = midgame * phase + endgame * (MAX_PHASE - phase)
+    # round toward zero, so that a position and its colour-flipped mirror get opposite scores
+    return score // (MAX_PHASE * SCALE) if score >= 0 else -(-score // (MAX_PHASE * SCALE))
@@ -1,7 +1,6 @@
 from ChessEngine import GameState
 from ChessTypes import EMPTY_CELL, WHITE_PIECE_PREFIX, MoveTuple, BLACK_PIECE_PREFIX, PiecePosTuple, \
     KNIGHT_PIECE, QUEEN_PIECE, PAWN_PIECE, KING_PIECE, BISHOP_PIECE, ROOK_PIECE
-import io
 
 
 def is_even(x: int):
@@ -118,28 +117,24 @@ class ChessHelper():
     def board_engine_to_board_middle(cls, board):
         return [[piece.lower()[:2] if piece != "--" else "em" for piece in row] for row in board]
 
+    # Piece placement of a 2D board of 'wp' like names, followed by the start position fields:
+    # a board alone has no side to move, castling or en passant, use GameState.getFen for a game in progress
     @classmethod
     def board_to_fen(cls, board):
-        # Use StringIO to build string more efficiently than concatenating
-        inter_board = cls.board_engine_to_board_middle(board)
-        with io.StringIO() as s:
-            for row in inter_board:
-                empty = 0
-                for cell in row:
-                    c = cell[0]
-                    if c in ('w', 'b'):
-                        if empty > 0:
-                            s.write(str(empty))
-                            empty = 0
-                        s.write(cell[1].upper() if c ==
-                                'w' else cell[1].lower())
-                    else:
-                        empty += 1
+        fen_rows = []
+        for row in board:
+            fen_row = ''
+            empty = 0
+            for cell in row:
+                if cls.is_empty_cell(cell):
+                    empty += 1
+                    continue
                 if empty > 0:
-                    s.write(str(empty))
-                s.write('/')
-            # Move one position back to overwrite last '/'
-            s.seek(s.tell() - 1)
-            # If you do not have the additional information choose what to put
-            s.write(' w KQkq - 0 1')
-            return s.getvalue()
+                    fen_row += str(empty)
+                    empty = 0
+                piece_type = cls.get_piece_type(cell).upper()
+                fen_row += piece_type if cls.is_white_piece(cell) else piece_type.lower()
+            if empty > 0:
+                fen_row += str(empty)
+            fen_rows.append(fen_row)
+        return '/'.join(fen_rows) + ' w KQkq - 0 1'
@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import sys
+import time
+
+"""
+    Logging and tracing of the chess modules.
+
+    + Loggers: one per module under the "chess" namespace (getLogger("ChessEngine") -> "chess.ChessEngine").
+      Level from the CHESS_LOG_LEVEL environment variable (DEBUG, INFO, ...), WARNING by default.
+    + Trace points: the per move / per node messages of the hot paths (makeMove, getValidMoves, search) are written
+          if ChessLogging.traceEnabled:
+              logger.debug(...)
+      so that when tracing is off (the default) they cost one attribute lookup: no formatting, no logging call.
+      Turned on with CHESS_TRACE=1 or enableTracing().
+    + Event trace: opt-in JSON lines file of the game events (moves played, search iterations, game over...)
+      for debugging games afterwards. Turned on with CHESS_TRACE_FILE=<path> or enableEventTrace(path).
+"""
+
+LOGGER_NAMESPACE = "chess"
+LOG_LEVEL_ENV = "CHESS_LOG_LEVEL"
+TRACE_ENV = "CHESS_TRACE"
+TRACE_FILE_ENV = "CHESS_TRACE_FILE"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+traceEnabled = os.environ.get(TRACE_ENV, "") not in ("", "0")
+eventTraceFile = None
+
+
+def getLogger(moduleName):
+    return logging.getLogger(f"{LOGGER_NAMESPACE}.{moduleName}")
+
+
+'''
+Send the records of the chess loggers to stderr, at the given level or the one of CHESS_LOG_LEVEL
+'''
+
+
+def configureLogging(level=None):
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV, "DEBUG" if traceEnabled else "WARNING")
+    rootLogger = logging.getLogger(LOGGER_NAMESPACE)
+    rootLogger.setLevel(level.upper() if isinstance(level, str) else level)
+    if not rootLogger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        rootLogger.addHandler(handler)
+    tracePath = os.environ.get(TRACE_FILE_ENV)
+    if tracePath and eventTraceFile is None:
+        enableEventTrace(tracePath)
+
+
+def enableTracing(enabled=True):
+    global traceEnabled
+    traceEnabled = enabled
+    if enabled:
+        logging.getLogger(LOGGER_NAMESPACE).setLevel(logging.DEBUG)
+
+
+def enableEventTrace(path):
+    global eventTraceFile
+    disableEventTrace()
+    eventTraceFile = open(path, 'a', buffering=1)
+
+
+def disableEventTrace():
+    global eventTraceFile
+    if eventTraceFile is not None:
+        eventTraceFile.close()
+        eventTraceFile = None
+
+
+def isEventTraceEnabled():
+    return eventTraceFile is not None
+
+
+'''
+Append one event to the JSON lines trace: {"time": ..., "event": event, **fields}. No-op when the trace is off.
+'''
+
+
+def traceEvent(event, **fields):
+    if eventTraceFile is None:
+        return
+    record = {"time": round(time.time(), 6), "event": event}
+    record.update(fields)
+    eventTraceFile.write(json.dumps(record, default=str) + "\n")
@@ -3,6 +3,7 @@ import numpy as np
 import enum
 import os
 from ChessTypes import *
+import ChessLogging
 import chess.pgn
 import chess
 import pickle
@@ -28,6 +29,8 @@ from sklearn import feature_extraction, model_selection, naive_bayes, metrics, s
 """
 
 
+logger = ChessLogging.getLogger("ChessML")
+
 piecesScore = {
     "K": 900, "Q": 90, "R": 50,
     "B": 30, "N": 30, "p": 10
@@ -163,7 +166,8 @@ outcome = ["outcome"]
 
 class ChessMLVisitor(chess.pgn.BaseVisitor):
     def visit_move(self, board, move):
-        print(board.san(move))
+        if ChessLogging.traceEnabled:
+            logger.debug(board.san(move))
 
     def result(self):
         return None
@@ -211,10 +215,10 @@ class ChessMachineLearning():
 
         start_square = self.row_col_to_chess_square(startRow, startCol)
         end_square = self.row_col_to_chess_square(endRow, endCol)
-        print(
-            f"\nConverted Start: ({startRow}, {startCol}) --> {start_square}")
-        print(f"Converted End :({endRow}, {endCol}) --> {end_square}\n")
-        return chess.Move(from_square=start_square, to_square=end_square)
+        if ChessLogging.traceEnabled:
+            logger.debug(f"Converted Start: ({startRow}, {startCol}) --> {start_square}, "
+                         f"End: ({endRow}, {endCol}) --> {end_square}")
+        return chess.Move(from_square=start_square, to_square=end_square, promotion=move.promotionPiece or None)
 
     def transform_game_moves_to_pgn_moves(self, moves):
         return [self.move_from_engine_to_pgn_move(move) for move in moves]
@@ -308,21 +312,22 @@ class ChessMachineLearning():
 
         # Calculate the probability of white wining
         if not self.model:
-            print("Error: Model not loaded")
+            logger.error("Model not loaded")
             return
         moves_transformed = self.transform_game_moves_to_pgn_moves(move_list)
         X_data = []
         board = chess.Board(fen=board_fen)
         for move in moves_transformed:
             board.push(move)
-            print(f"Board\n {board}")
-            print(f"Executing Move {move}")
+            if ChessLogging.traceEnabled:
+                logger.debug(f"Executing Move {move}, board\n{board}")
             board.pop()
             X_data.append(self.new_row_from_board(board))
 
         X_data_frame_input = pd.DataFrame(X_data)
         # X_data_frame_input = X_data_frame_input.drop("outcome")
-        print(f"Data input to model: {X_data_frame_input.head()}")
+        if ChessLogging.traceEnabled:
+            logger.debug(f"Data input to model: {X_data_frame_input.head()}")
         # move_result_prob = self.model.predict_proba(X_data_frame_input)
         # * TESTING CODE
         class_proba = self.model.predict_proba(X_data_frame_input)
@@ -337,7 +342,7 @@ class ChessMachineLearning():
             with open(MODEL_NAME, 'rb') as f:
                 self.model = pickle.load(f)
         except EOFError:
-            print("ERROR loading model")
+            logger.error("ERROR loading model")
 
     def update_model(self, csv_data_file=DATA_IN_CSV):
         from sklearn.model_selection import train_test_split
@@ -2,6 +2,7 @@ import os
 import pygame as p
 import ChessEngine
 import ChessAI
+import ChessLogging
 import time
 import sys
 from ChessTypes import *
@@ -28,6 +29,9 @@ SQ_SIZE = (HEIGHT - 2 * BORDER - 2 * TIME) // DIMENSION
 MAX_FPS = 15
 IMAGES = {}
 PLAYER_TIME_GRANTED = 1800
+logger = ChessLogging.getLogger("ChessMain")
+# seconds added to the clock of a player after each move (0: sudden death)
+PLAYER_TIME_INCREMENT = 0
 
 
 COLORGAME = False
@@ -49,7 +53,7 @@ FISRTMOVE = True
 #             ['bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp']]
 
 
-def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
+def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE, engine=ChessEngine.MAILBOX_ENGINE):
     p.init()
     screen = p.display.set_mode((WIDTH, HEIGHT))
     p.display.set_caption("Auto Chess", "None")
@@ -123,7 +127,7 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
 
     loadImages()  # Load images of pieces, board
     clock = p.time.Clock()
-    gameState = ChessEngine.GameState()
+    gameState = ChessEngine.createGameState(engine)
 
     # if player_option == OUR_AI_WHITE:
     #     # FIRSTMOVE = False
@@ -144,6 +148,9 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
     playerClicks = []
     p1Time = p2Time = PLAYER_TIME_GRANTED
     motlan = True
+    if isPlaying:
+        ChessLogging.traceEvent("game_start", auto_mode=auto_mode, mode=mode, player_option=player_option,
+                                engine=engine, playerOne=playerOne, playerTwo=playerTwo)
 
     while isPlaying:
         time.sleep(0.2)
@@ -170,7 +177,7 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
                             isPlaying = False
                         # Start a new 1 player game
                         if 150 <= location[1] < 200:
-                            gameState = ChessEngine.GameState()
+                            gameState = ChessEngine.createGameState(engine)
 
                             # global COLORGAME
                             COLORGAME = not COLORGAME
@@ -189,7 +196,7 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
                                           gameState.getValidMoves(), sqSelected)
                         # Start a new 2 player game
                         if 230 <= location[1] < 280:
-                            gameState = ChessEngine.GameState()
+                            gameState = ChessEngine.createGameState(engine)
 
                             # global COLORGAME
                             COLORGAME = not COLORGAME
@@ -208,7 +215,7 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
                                           gameState.getValidMoves(), sqSelected)
                         # Start a new none player game
                         if 330 <= location[1] < 380:
-                            gameState = ChessEngine.GameState()
+                            gameState = ChessEngine.createGameState(engine)
 
                             # gameState.whiteToMove = bool(random.getrandbits(1))
                             # global COLORGAME
@@ -246,7 +253,7 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
                             gameOver = False
                         # New Game
                         if 516 <= location[1] < 569:
-                            gameState = ChessEngine.GameState()
+                            gameState = ChessEngine.createGameState(engine)
                             validMoves = gameState.getValidMoves()  # Get all the valid move
                             moveMade = False  # Moving a piece
                             gameOver = False
@@ -267,18 +274,25 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
                             sqSelected = (row, col)
                             playerClicks.append(sqSelected)
                         if len(playerClicks) == 2:
+                            (startRow, startCol), (endRow, endCol) = playerClicks
                             move = ChessEngine.Move(
-                                playerClicks[0], playerClicks[1], gameState.board)
+                                startRow * 8 + startCol, endRow * 8 + endCol, gameState.squares)
                             for i in range(len(validMoves)):
                                 # If move is a valid move, make the move
-                                if move == validMoves[i]:
+                                # (a promotion comes in 4 valid moves, the piece is picked in the promotion menu)
+                                if move == validMoves[i] or \
+                                        (move.isPawnPromotion and move.modeID == validMoves[i].modeID):
                                     # print(str(move.pieceMoved)+str((move.startRow, move.startCol))+str((move.endRow, move.endCol
-                                    gameState.makeMove(validMoves[i])
+                                    gameState.makeMove(move if move.isPawnPromotion else validMoves[i])
                                     moveMade = True
+                                    p1Time, p2Time = addTimeIncrement(p1Time, p2Time, move)
+                                    ChessLogging.traceEvent("move", player="human", move=move.getUciNotation(),
+                                                            whiteMoved=not gameState.whiteToMove)
                                     # reset the sqSel, playerClicks
                                     sqSelected = ()
                                     playerClicks = []
                                     start_time = time.time()
+                                    break
                                 # move not in valid moves
                                 if not moveMade:
                                     playerClicks = [sqSelected]
@@ -304,13 +318,24 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
             elif mode == HARD_MODE:
                 depth = 3
 
-            print(
+            # the depth of the mode caps the iterative deepening (strength of the AI): with a 30 minutes clock these
+            # shallow searches end well within the time limit, which only stops them early when the clock runs low
+            remainingTime = p1Time if gameState.whiteToMove else p2Time
+            timeLimit = ChessAI.allocateMoveTime(remainingTime, PLAYER_TIME_INCREMENT)
+
+            logger.info(
                 f"RUNNING GAME WITH:AUTO_MODE = {auto_mode}  | MODE = {mode}  | STRATEGY = {strategy}")
-            # Opponent AI
-            strategy_to_use = ChessAI.MIN_MAX_WITHOUT_PRUNING
+            # live depth / score / pv / nodes of the alpha-beta search, called by Searcher.search after every iteration
+            def showSearchInfo(result):
+                drawSearchInfo(screen, result)
+                p.display.flip()
+                p.event.pump()
+
+            # Opponent AI: alpha-beta search (ChessSearch.Searcher) bounded by the clock
+            strategy_to_use = ChessAI.MIN_MAX_WITH_BETA_PRUNING
             if AIEasyTurn:
-                move = ChessAI.move_with_strategy(gs=gameState, depth=0, strategy=strategy_to_use,
-                                                  validMoves=validMoves)
+                move = ChessAI.move_with_strategy(gameState, depth, strategy=strategy_to_use, validMoves=validMoves,
+                                                  time_limit=timeLimit, on_iteration=showSearchInfo)
                 # time.sleep(0.5)
             # Our AI Agent
             elif not AIEasyTurn:
@@ -332,6 +357,9 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
                 move = ChessAI.findRandomMove(validMoves)
             gameState.makeMove(move)
             moveMade = True
+            p1Time, p2Time = addTimeIncrement(p1Time, p2Time, move)
+            ChessLogging.traceEvent("move", player="AI", move=move.getUciNotation(),
+                                    whiteMoved=not gameState.whiteToMove, p1Time=p1Time, p2Time=p2Time)
 
         if moveMade:
             validMoves = gameState.getValidMoves()
@@ -365,6 +393,9 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
                             gameState.pawnPromotion(ROOK_PIECE)
                             motlan = True
 
+        if (gameState.checkmate or gameState.stalemate) and not gameOver:
+            ChessLogging.traceEvent("game_over", checkmate=gameState.checkmate, stalemate=gameState.stalemate,
+                                    whiteToMove=gameState.whiteToMove, moves=len(gameState.moveLog))
         if gameState.checkmate:
             gameOver = True
             gameOverText(screen, gameState.whiteToMove)
@@ -390,6 +421,17 @@ def main(auto_mode=SCREEN_MODE, mode=EASY_MODE, player_option=OUR_AI_WHITE):
         p.display.flip()
 
 
+'''
+Clocks (p1Time, p2Time) once the move is made: the player who made it gets PLAYER_TIME_INCREMENT
+'''
+
+
+def addTimeIncrement(p1Time, p2Time, move):
+    if move.pieceMoved & WHITE:
+        return p1Time + PLAYER_TIME_INCREMENT, p2Time
+    return p1Time, p2Time + PLAYER_TIME_INCREMENT
+
+
 '''
 Initialize a global dictionary of images. This will be called exactly once in the main
 '''
@@ -430,7 +472,7 @@ def drawGameState(screen, gameState, validMoves, sqSelected):
     # Background piece selected
     highlightPiece(screen, gameState, sqSelected)
     # Pieces
-    drawPieces(screen, gameState.board)
+    drawPieces(screen, gameState.squares)
     # Possible moves
     highlightMoves(screen, gameState, validMoves, sqSelected)
     # Move log
@@ -447,7 +489,7 @@ def highlightPiece(screen, gameState, sqSelected):
     if sqSelected != ():
         r, c = sqSelected
         if r >= 0 and c >= 0:
-            if gameState.board[r][c][0] == (WHITE_PIECE_PREFIX if gameState.whiteToMove else BLACK_PIECE_PREFIX):
+            if gameState.squares[r * 8 + c] & (WHITE if gameState.whiteToMove else BLACK):
                 s = p.Surface((SQ_SIZE, SQ_SIZE))
                 s.set_alpha(100)
                 s.fill(p.Color('#004CFF'))
@@ -455,14 +497,13 @@ def highlightPiece(screen, gameState, sqSelected):
                                 r * SQ_SIZE + BORDER + TIME))
 
 
-def drawPieces(screen, board):
-    from ChessHelper import ChessHelper
+# squares: GameState.squares, read directly instead of building the 2D gameState.board at every frame
+def drawPieces(screen, squares):
     for r in range(DIMENSION):
         for c in range(DIMENSION):
-            piece = board[r][c]
-            if piece != '--':  # Not empty
-                piece_to_draw = ChessHelper.get_piece_side_and_type(piece)
-                screen.blit(IMAGES[piece_to_draw],
+            piece = squares[r * 8 + c]
+            if piece != EMPTY:
+                screen.blit(IMAGES[PIECE_NAMES[piece]],
                             p.Rect(c * SQ_SIZE + BORDER + MENU, r * SQ_SIZE + BORDER + TIME, SQ_SIZE, SQ_SIZE))
 
 
@@ -470,7 +511,7 @@ def highlightMoves(screen, gameState, validMoves, sqSelected):
     if sqSelected != ():
         r, c = sqSelected
         if r >= 0 and c >= 0:
-            if gameState.board[r][c][0] == (WHITE_PIECE_PREFIX if gameState.whiteToMove else BLACK_PIECE_PREFIX):
+            if gameState.squares[r * 8 + c] & (WHITE if gameState.whiteToMove else BLACK):
                 for move in validMoves:
                     if move.startRow == r and move.startCol == c:
                         p.draw.circle(screen, p.Color('#004CFF'), (
@@ -576,7 +617,31 @@ def drawMoveLog(screen, gs):
             break
 
 
+'''
+Search info of the AI under the move log: depth, score, nodes per second, first moves of the principal variation
+'''
+
+
+def drawSearchInfo(screen, result):
+    font_path = os.path.join(os.curdir, "Font", "seguisym.ttf")
+    font = p.font.Font(font_path, 14)
+    infoRect = p.Rect(MENU + BOARD + BORDER * 2 + 20, HEIGHT - TIME, MOVE_LOG - 20, TIME)
+    p.draw.rect(screen, p.Color('#121212'), infoRect)
+    stats = result.stats
+    lines = [
+        f"depth {result.depth}  score {result.score}  {result.nodes} nodes  {result.nodesPerSecond or 0} n/s  "
+        f"tt {stats.ttHitRate:.0%}  1st cut {stats.firstMoveCutoffRate:.0%}",
+        "pv " + " ".join(move.getUciNotation() for move in result.pv[:8]),
+    ]
+    textY = 2
+    for line in lines:
+        textObj = font.render(line, True, p.Color('white'))
+        screen.blit(textObj, infoRect.move(5, textY))
+        textY += textObj.get_height()
+
+
 if __name__ == "__main__":
+    ChessLogging.configureLogging()
     available_auto_modes = [SCREEN_MODE, TERMINAL_MODE]
     available_hard_ness_modes = [EASY_MODE, MEDIUM_MODE, HARD_MODE]
     available_option = [OUR_AI_BLACK, OUR_AI_WHITE]
@@ -592,7 +657,11 @@ if __name__ == "__main__":
             sys.exit(f"Not found auto mode: {available_hard_ness_modes}")
         if OPTION not in available_option:
             sys.exit(f"Not found auto mode: {available_option}")
-        print(f"START GAME WITH ARGS: {sys.argv}")
-        main(auto_mode=AUTO_MODE, mode=HARDNESS, player_option=OPTION)
+        # Optional board backend: MAILBOX (default) || BITBOARD
+        ENGINE = sys.argv[4] if len(sys.argv) >= 5 else ChessEngine.MAILBOX_ENGINE
+        if ENGINE not in ChessEngine.AVAILABLE_ENGINES:
+            sys.exit(f"Not found engine: {ChessEngine.AVAILABLE_ENGINES}")
+        logger.info(f"START GAME WITH ARGS: {sys.argv}")
+        main(auto_mode=AUTO_MODE, mode=HARDNESS, player_option=OPTION, engine=ENGINE)
     else:
         main(auto_mode=SCREEN_MODE)
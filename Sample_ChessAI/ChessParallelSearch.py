@@ -0,0 +1,261 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import time
+
+import ChessEngine
+import ChessLogging
+from ChessBitboard import BitboardGameState
+from ChessSearch import Searcher, SearchResult, SearchStats, MAX_PLAYER_WORST, MIN_PLAYER_WORST, MATE_SCORE, \
+    DRAW_SCORE, NEXT_ITERATION_TIME_SHARE
+from ChessTranspositionTable import TranspositionTable, SharedTranspositionTable, DEFAULT_SIZE_MB
+
+"""
+    Parallel root search: the moves of the root position are split between a pool of worker processes
+    (Python threads would share one interpreter lock), each one searching with its own GameState and its own
+    ChessSearch.Searcher (killers, history), set up like the Searcher of the master.
+    The workers share one transposition table in shared memory (SharedTranspositionTable), so that the cutoffs and
+    best moves found by one of them are seen by all the others; sharedTable=False gives each one a private table.
+
+    Every iteration of the iterative deepening:
+        + the first root move (best of the previous iteration) is searched alone with a full window,
+          which gives the bound the other moves have to beat
+        + the other moves are handed out one at a time to the free workers, each with a null window on the best
+          score known when it is sent (principal variation search), so the bound keeps closing while the workers run
+        + a move failing high on its null window is searched again with the window open on the other side,
+          which gives its exact score
+    The root is sent as a FEN and the moves as UCI strings, so that nothing but plain strings crosses processes.
+
+    Usage:
+        result = findBestMoveParallel(gameState, depth=4, workers=8)
+        ChessAI.move_with_strategy(gameState, 4, strategy=ChessAI.PARALLEL_ALPHA_BETA, workers=8)
+"""
+
+logger = ChessLogging.getLogger("ChessParallelSearch")
+
+pool = None
+poolWorkers = 0
+# transposition table of the workers of the pool, None when each one has its own
+sharedTable = None
+# Searcher of the worker process
+workerSearcher = None
+# Search id the worker process last saw: a new id resets its killers / history / node count (Searcher.newSearch)
+workerSearchId = None
+# Root position of the worker, kept between the tasks of the same search: (fen, engine, GameState)
+workerRoot = None
+
+
+def defaultWorkerCount():
+    return os.cpu_count() or 1
+
+
+def getPool(workers, shared=True, sizeMB=DEFAULT_SIZE_MB):
+    global pool, poolWorkers, sharedTable
+    if pool is None or poolWorkers != workers or (sharedTable is not None) != shared:
+        shutdownPool()
+        if shared:
+            sharedTable = SharedTranspositionTable(sizeMB)
+        pool = multiprocessing.Pool(workers, initWorker, (sharedTable, sizeMB))
+        poolWorkers = workers
+    return pool
+
+
+def shutdownPool():
+    global pool, poolWorkers, sharedTable
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+        pool = None
+        poolWorkers = 0
+    if sharedTable is not None:
+        sharedTable.close()
+        sharedTable = None
+
+
+def initWorker(table, sizeMB):
+    global workerSearcher
+    if table is None:
+        table = TranspositionTable(sizeMB)
+    else:
+        # a forked worker gets a copy of the owner's object: only the master ages the table
+        table.owner = False
+    workerSearcher = Searcher(table)
+
+
+atexit.register(shutdownPool)
+
+'''
+Worker side: search one root move below the root position of the FEN.
+deadline is a time.time() timestamp (the performance counter is not shared between processes), None for no limit.
+settings: Searcher.getSettings() of the master's Searcher
+Return: (uci move, white-relative score, SearchStats of the move, aborted)
+'''
+
+
+def searchRootMove(task):
+    global workerSearchId, workerRoot
+    searchId, fen, engine, uciMove, depth, alpha, beta, deadline, settings = task
+    searcher = workerSearcher
+    if searchId != workerSearchId:
+        workerSearchId = searchId
+        searcher.newSearch()
+        searcher.configure(**settings)
+    if workerRoot is None or workerRoot[0] != fen or workerRoot[1] != engine:
+        workerRoot = (fen, engine, ChessEngine.createGameState(engine, fen))
+    gameState = workerRoot[2]
+    move = next(move for move in gameState.getValidMoves() if move.getUciNotation() == uciMove)
+    searcher.aborted = False
+    searcher.stats = SearchStats()
+    searcher.rootDepth = depth
+    searcher.deadline = None if deadline is None else time.perf_counter() + deadline - time.time()
+    gameState.makeMove(move)
+    # the window and the score are white-relative, the negamax search scores for the side to move
+    if gameState.whiteToMove:
+        score = searcher.negamax(gameState, depth - 1, alpha, beta, 1)
+    else:
+        score = -searcher.negamax(gameState, depth - 1, -beta, -alpha, 1)
+    gameState.undoMove()
+    aborted = searcher.aborted
+    searcher.deadline = None
+    searcher.aborted = False
+    return uciMove, score, searcher.stats, aborted
+
+
+'''
+Master side: one iteration at the given depth over the root moves, best first.
+The counters of the workers are added to stats.
+The moves after the first one get a null window on the best score (scout), the ones failing high are searched again.
+Return: (scores as {uci move: score} with the scores of the moves not beating the bound being upper / lower bounds,
+         best uci move, its score), best move None if the iteration ran out of time
+'''
+
+
+def searchRootMoves(workerPool, searchId, fen, engine, rootMoves, depth, whiteToMove, deadline, settings, stats):
+    results = queue.Queue()
+
+    # scout: null window on the bound, only telling whether the move beats it
+    def send(uciMove, bound, scout=False):
+        if whiteToMove:  # the max player needs a move scoring above the bound
+            alpha, beta = bound, bound + 1 if scout else MIN_PLAYER_WORST
+        else:
+            alpha, beta = bound - 1 if scout else MAX_PLAYER_WORST, bound
+        workerPool.apply_async(searchRootMove, ((searchId, fen, engine, uciMove, depth, alpha, beta, deadline,
+                                                 settings),),
+                               callback=lambda result: results.put(result + (scout,)), error_callback=results.put)
+
+    def receive():
+        result = results.get()
+        if isinstance(result, BaseException):
+            raise RuntimeError(f"Parallel search worker failed: {result!r}") from result
+        return result
+
+    def beats(score, bound):
+        return score > bound if whiteToMove else score < bound
+
+    worst = MAX_PLAYER_WORST if whiteToMove else MIN_PLAYER_WORST
+    send(rootMoves[0], worst)
+    bestMove, bestScore, moveStats, aborted, _ = receive()
+    stats.merge(moveStats)
+    if aborted:
+        return {}, None, None
+    scores = {bestMove: bestScore}
+    pending = list(reversed(rootMoves[1:]))
+    running = 0
+    timedOut = False
+    while pending or running:
+        while pending and running < poolWorkers and not timedOut:
+            send(pending.pop(), bestScore, scout=True)
+            running += 1
+        if running == 0:
+            break
+        uciMove, score, moveStats, aborted, scout = receive()
+        running -= 1
+        stats.merge(moveStats)
+        if aborted:
+            timedOut = True
+            continue
+        scores[uciMove] = score
+        if scout:
+            if beats(score, bestScore):
+                # failed high: the score is only a bound, search the move again with the window open
+                stats.pvsReSearches += 1
+                send(uciMove, bestScore)
+                running += 1
+        elif beats(score, bestScore):
+            bestMove, bestScore = uciMove, score
+    if timedOut:
+        return scores, None, None
+    return scores, bestMove, bestScore
+
+
+'''
+Iterative deepening over parallel root iterations, until maxDepth or until the time limit (seconds) is spent.
+shared: the workers share one transposition table, or each one keeps its own
+searcher: Searcher whose settings (Searcher.getSettings, table size) the workers copy
+onIteration: optional callback called with the SearchResult so far after every completed iteration
+Return: SearchResult of the last completed iteration with the counters of all the workers,
+        its pv read from the shared table if there is one
+'''
+
+
+def findBestMoveParallel(gs, maxDepth, workers=None, timeLimit=None, engine=None, shared=True, searcher=None,
+                         onIteration=None):
+    startTime = time.perf_counter()
+    workers = workers or defaultWorkerCount()
+    if searcher is None:
+        searcher = Searcher()
+    if engine is None:
+        engine = ChessEngine.BITBOARD_ENGINE if isinstance(gs, BitboardGameState) else ChessEngine.MAILBOX_ENGINE
+    validMoves = gs.getValidMoves()
+    if not validMoves:
+        # checkmated or stalemate
+        score = (-MATE_SCORE if gs.whiteToMove else MATE_SCORE) if gs.inCheck else DRAW_SCORE
+        return SearchResult(score=score)
+    movesByUci = {move.getUciNotation(): move for move in validMoves}
+    rootMoves = [move.getUciNotation() for move in searcher.orderMoves(validMoves, None, 0, gs)]
+    workerPool = getPool(workers, shared, searcher.transpositionTable.sizeMB)
+    if sharedTable is not None:
+        sharedTable.newSearch()
+    fen = gs.getFen()
+    deadline = None
+    searchId = (os.getpid(), time.time())
+    settings = searcher.getSettings()
+    stats = SearchStats()
+    result = SearchResult(bestMove=movesByUci[rootMoves[0]], stats=stats)
+    # reads the pv of every iteration from the shared table
+    pvSearcher = Searcher(sharedTable) if sharedTable is not None else None
+    for depth in range(1, maxDepth + 1):
+        iterationStart, iterationNodes = time.perf_counter(), stats.nodes
+        scores, bestMove, bestScore = searchRootMoves(
+            workerPool, searchId, fen, engine, rootMoves, depth, gs.whiteToMove, deadline, settings, stats)
+        if bestMove is None:
+            break
+        now = time.perf_counter()
+        nodes = stats.nodes - iterationNodes
+        result.bestMove, result.score, result.depth = movesByUci[bestMove], bestScore, depth
+        if pvSearcher is not None:
+            result.pv = pvSearcher.principalVariation(gs, result.bestMove, depth)
+        else:
+            result.pv = [result.bestMove]
+        result.nodes = stats.nodes
+        result.elapsed = now - startTime
+        stats.iterations.append({"depth": depth, "score": bestScore, "bestMove": bestMove, "nodes": nodes,
+                                 "seconds": round(now - iterationStart, 4)})
+        # next iteration: best move first, then by score of this one
+        rootMoves.sort(key=lambda uciMove: scores.get(uciMove, 0), reverse=gs.whiteToMove)
+        rootMoves.remove(bestMove)
+        rootMoves.insert(0, bestMove)
+        logger.info(f"Depth {depth}: best move {bestMove}, score {bestScore}, {nodes} nodes, "
+                    f"{workers} workers, {result.elapsed:.2f}s")
+        ChessLogging.traceEvent("search_iteration", depth=depth, bestMove=bestMove, score=bestScore, nodes=nodes,
+                                seconds=round(result.elapsed, 4), workers=workers)
+        if onIteration is not None:
+            onIteration(result)
+        if timeLimit is not None:
+            if result.elapsed >= timeLimit * NEXT_ITERATION_TIME_SHARE:
+                break
+            deadline = time.time() + timeLimit - result.elapsed
+    result.nodes = stats.nodes
+    result.elapsed = time.perf_counter() - startTime
+    return result
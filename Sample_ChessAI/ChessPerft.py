@@ -0,0 +1,170 @@
+import argparse
+import json
+import sys
+import time
+
+import ChessEngine
+
+"""
+    Perft: count the leaf nodes of the legal move tree from a position to a given depth.
+    The counts are compared with the published ones, so any generator bug (pins, en passant, castling,
+    promotions) shows up as a wrong number, and the timing gives the throughput of
+    GameState.getValidMoves / makeMove / undoMove.
+
+    Usage:
+        python ChessPerft.py                      # whole suite, depth 3, mailbox engine
+        python ChessPerft.py -d 4 -e BITBOARD -o perft.json
+        python ChessPerft.py -p kiwipete -d 2 --divide
+"""
+
+# * name: (FEN, expected node counts for depth 1, 2, 3, ...)
+# * Positions and counts from https://www.chessprogramming.org/Perft_Results
+PERFT_SUITE = {
+    "start": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              [20, 400, 8902, 197281, 4865609]),
+    # castling, pins, en passant and promotions everywhere
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4085603]),
+    # en passant discovering a check along the rank
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  [14, 191, 2812, 43238, 674624]),
+    # promotions with capture, castling rights lost by captured rooks
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  [6, 264, 9467, 422333]),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  [44, 1486, 62379, 2103487]),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  [46, 2079, 89890, 3894594]),
+}
+
+DEFAULT_DEPTH = 3
+
+'''
+Setup a game state of the given engine from a FEN string
+'''
+
+
+def loadPosition(fen, engine=ChessEngine.MAILBOX_ENGINE):
+    return ChessEngine.createGameState(engine, fen)
+
+
+def perft(gameState, depth):
+    if depth == 0:
+        return 1
+    moves = gameState.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gameState.makeMove(move)
+        nodes += perft(gameState, depth - 1)
+        gameState.undoMove()
+    return nodes
+
+
+'''
+Perft split by root move: the first place to look when a count is off
+Return: {uci move: node count}
+'''
+
+
+def divide(gameState, depth):
+    result = {}
+    for move in gameState.getValidMoves():
+        gameState.makeMove(move)
+        result[move.getUciNotation()] = perft(gameState, depth - 1)
+        gameState.undoMove()
+    return result
+
+
+def runPosition(name, fen, depth, engine=ChessEngine.MAILBOX_ENGINE, expected=None, checkHash=False):
+    gameState = loadPosition(fen, engine)
+    gameState.debugZobrist = checkHash
+    results = []
+    for d in range(1, depth + 1):
+        start = time.perf_counter()
+        nodes = perft(gameState, d)
+        elapsed = time.perf_counter() - start
+        expectedNodes = expected[d - 1] if expected and d <= len(expected) else None
+        results.append({
+            "depth": d,
+            "nodes": nodes,
+            "expected": expectedNodes,
+            "passed": expectedNodes is None or nodes == expectedNodes,
+            "seconds": round(elapsed, 4),
+            "nodesPerSecond": round(nodes / elapsed) if elapsed > 0 else None,
+        })
+    return {"name": name, "fen": fen, "results": results}
+
+
+def runSuite(depth=DEFAULT_DEPTH, engine=ChessEngine.MAILBOX_ENGINE, names=None, checkHash=False):
+    positions = []
+    for name, (fen, expected) in PERFT_SUITE.items():
+        if names and name not in names:
+            continue
+        positions.append(runPosition(name, fen, depth, engine, expected, checkHash))
+    nodes = sum(result["nodes"] for position in positions for result in position["results"])
+    seconds = sum(result["seconds"] for position in positions for result in position["results"])
+    return {
+        "engine": engine,
+        "depth": depth,
+        "passed": all(result["passed"] for position in positions for result in position["results"]),
+        "nodes": nodes,
+        "seconds": round(seconds, 4),
+        "nodesPerSecond": round(nodes / seconds) if seconds > 0 else None,
+        "positions": positions,
+    }
+
+
+def printReport(report):
+    print(f"Engine: {report['engine']}  depth: {report['depth']}")
+    for position in report["positions"]:
+        for result in position["results"]:
+            status = "ok" if result["passed"] else f"FAILED (expected {result['expected']})"
+            print(f"{position['name']:<10} depth {result['depth']}: {result['nodes']:>10} nodes "
+                  f"{result['seconds']:>9.3f}s {result['nodesPerSecond'] or 0:>9} nodes/s  {status}")
+    print(f"Total: {report['nodes']} nodes in {report['seconds']:.3f}s, {report['nodesPerSecond']} nodes/s")
+    print("PASSED" if report["passed"] else "FAILED")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft suite of the chess move generators")
+    parser.add_argument("-d", "--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("-e", "--engine", default=ChessEngine.MAILBOX_ENGINE, choices=ChessEngine.AVAILABLE_ENGINES)
+    parser.add_argument("-p", "--position", action="append", choices=list(PERFT_SUITE),
+                        help="suite position to run (repeatable), all of them by default")
+    parser.add_argument("--fen", help="run a custom position instead of the suite")
+    parser.add_argument("--divide", action="store_true", help="print the node count of every root move")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--check-hash", action="store_true",
+                        help="verify the incremental Zobrist hash after every move (slow)")
+    args = parser.parse_args()
+
+    if args.divide:
+        fen = args.fen or PERFT_SUITE[args.position[0] if args.position else "start"][0]
+        gameState = loadPosition(fen, args.engine)
+        counts = divide(gameState, args.depth)
+        for move, nodes in sorted(counts.items()):
+            print(f"{move}: {nodes}")
+        print(f"Moves: {len(counts)}  nodes: {sum(counts.values())}")
+        return
+
+    if args.fen:
+        position = runPosition("custom", args.fen, args.depth, args.engine, checkHash=args.check_hash)
+        nodes = sum(result["nodes"] for result in position["results"])
+        seconds = sum(result["seconds"] for result in position["results"])
+        report = {"engine": args.engine, "depth": args.depth, "passed": True, "nodes": nodes,
+                  "seconds": round(seconds, 4), "nodesPerSecond": round(nodes / seconds) if seconds > 0 else None,
+                  "positions": [position]}
+    else:
+        report = runSuite(args.depth, args.engine, args.position, args.check_hash)
+    printReport(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if not report["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
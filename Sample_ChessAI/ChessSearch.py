@@ -0,0 +1,894 @@
+import logging
+import time
+
+import ChessLogging
+from ChessEngine import GameState, CAPTURE_MOVES, QUIET_MOVES
+from ChessEvaluation import evaluate, evaluatePawnStructure, MATERIAL_MIDGAME, EXCHANGE_VALUES, MATE_SCORE, DRAW_SCORE
+from ChessTypes import PIECE_NAMES, PIECE_TYPE_MASK, EMPTY, PAWN, QUEEN, WHITE, BLACK
+from ChessTranspositionTable import TranspositionTable, ScoreTable, EXACT, LOWER_BOUND, UPPER_BOUND, \
+    ENTRY_DEPTH, ENTRY_BOUND, ENTRY_SCORE, ENTRY_MOVE, EVALUATION_CACHE_SIZE_MB, PAWN_TABLE_SIZE_MB
+
+"""
+    Alpha-beta search of ChessAI, as a Searcher object holding everything one search needs:
+    transposition table, killer moves, history scores, node counter, deadline and settings.
+    Nothing is kept in module globals, so several searchers can run side by side in one process
+    (or one per worker process, see ChessParallelSearch), and a search returns all it found as a SearchResult.
+
+    Usage:
+        searcher = Searcher()
+        result = searcher.search(gameState, maxDepth=6, timeLimit=2.0)
+        gameState.makeMove(result.bestMove)
+
+    Scores are in the units of ChessEvaluation.evaluate. Inside the search they are for the side to move (negamax),
+    SearchResult.score is white-relative (> 0: good for white).
+"""
+
+logger = ChessLogging.getLogger("ChessSearch")
+
+# scores past MATE_BOUND (in absolute value) are mates, no evaluation gets there
+MATE_BOUND = MATE_SCORE - 1000
+# white-relative full window: the worst score for white (max player) and for black (min player)
+MAX_PLAYER_WORST = -MATE_SCORE
+MIN_PLAYER_WORST = MATE_SCORE
+
+# * Time control of the iterative deepening search
+MAX_SEARCH_DEPTH = 64
+# the clock is only read every TIME_CHECK_INTERVAL + 1 nodes (power of two minus one)
+TIME_CHECK_INTERVAL = 255
+# an iteration takes a few times longer than the previous one: do not start it past this share of the budget
+NEXT_ITERATION_TIME_SHARE = 0.5
+
+# * Move ordering: hash move, captures (most valuable victim, then least valuable attacker), killers, history,
+# * then the captures losing material by static exchange evaluation
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORE = 1 << 26
+LOSING_CAPTURE_SCORE = -CAPTURE_SCORE
+# index: piece type (EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+ORDERING_PIECE_VALUES = (0, 1, 3, 3, 5, 9, 10)
+MVV_LVA = [[victimValue * 16 - attackerValue for attackerValue in ORDERING_PIECE_VALUES]
+           for victimValue in ORDERING_PIECE_VALUES]
+KILLERS_PER_PLY = 2
+# history scores are halved at each new search so that old games do not drown the current position
+HISTORY_AGING_SHIFT = 1
+
+# * Quiescence search: captures only below the nominal depth, so that leaves are not scored mid exchange
+DEFAULT_QUIESCENCE_DEPTH = 8
+# delta pruning: skip a capture when even the captured piece plus this margin cannot reach the window
+DELTA_MARGIN = 20
+
+# * Selective search
+# null move: the opponent searches depth - 1 - NULL_MOVE_REDUCTION after the pass, from NULL_MOVE_MIN_DEPTH up
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+# late move reductions: quiet moves from the LMR_MIN_MOVE_INDEX-th on (0 based), at depth LMR_MIN_DEPTH or more,
+# lose LMR_REDUCTION plies, LMR_LATE_REDUCTION from the LMR_LATE_MOVE_INDEX-th on
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVE_INDEX = 3
+LMR_REDUCTION = 1
+LMR_LATE_MOVE_INDEX = 8
+LMR_LATE_REDUCTION = 2
+# frontier nodes (depth 1, extended: depth 2): the quiet moves not giving check are skipped when the static score
+# plus the margin (about a minor piece, a rook) cannot reach alpha
+FUTILITY_MARGIN = 30
+EXTENDED_FUTILITY_MARGIN = 50
+# razoring: up to RAZOR_MAX_DEPTH, a node whose static score is more than the margin below alpha is answered by
+# the quiescence search when the captures do not bring it back above alpha - margin
+RAZOR_MAX_DEPTH = 3
+RAZOR_MARGIN = 60
+
+# aspiration windows: from ASPIRATION_MIN_DEPTH on, the root window is the previous score +- ASPIRATION_WINDOW,
+# widened ASPIRATION_GROWTH times more on every fail
+ASPIRATION_MIN_DEPTH = 4
+ASPIRATION_WINDOW = 5
+ASPIRATION_GROWTH = 4
+
+# Searcher attributes set by its constructor / configure, copied to the workers of a parallel search
+SEARCHER_SETTINGS = ("quiescenceDepth", "moveOrdering", "nullMovePruning", "lateMoveReductions", "checkExtensions",
+                     "aspirationWindows", "staticExchange", "futilityPruning", "razoring", "futilityMargin",
+                     "extendedFutilityMargin", "razorMargin")
+
+
+'''
+Mate scores count the plies from the root; the table keeps them counted from the stored node instead,
+so that an entry reads the same whatever the ply it is found at
+'''
+
+
+def scoreToTable(score, ply):
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+# Material, piece-square tables and pawn structure, tapered between midgame and endgame (ChessEvaluation)
+# pawnStructure: packed pawn structure score of the position if known (pawn hash table)
+def calculateHeuristicScoreForNode(gs: GameState, pawnStructure=None):
+    return evaluate(gs, pawnStructure)
+
+
+def captureScore(move):
+    return MVV_LVA[move.pieceCaptured & PIECE_TYPE_MASK][move.pieceMoved & PIECE_TYPE_MASK] + \
+        ORDERING_PIECE_VALUES[move.promotionPiece] * 16
+
+
+def captureGain(move):
+    gain = MATERIAL_MIDGAME[move.pieceCaptured & PIECE_TYPE_MASK]
+    if move.promotionPiece:
+        gain += MATERIAL_MIDGAME[move.promotionPiece] - MATERIAL_MIDGAME[PAWN]
+    return gain
+
+
+'''
+Does the capture lose material once the exchange on its square is over (GameState.staticExchange).
+Taking a piece worth at least the capturing one never does, so only the other captures are evaluated.
+'''
+
+
+def isLosingCapture(gs: GameState, move):
+    if EXCHANGE_VALUES[move.pieceCaptured & PIECE_TYPE_MASK] >= EXCHANGE_VALUES[move.pieceMoved & PIECE_TYPE_MASK]:
+        return False
+    return gs.staticExchange(move) < 0
+
+
+'''
+Does the move leave the king of the side making it out of check: the cheap legality test of the moves
+coming from other positions (hash move, killers), run by the asserts of Searcher.pickMoves
+'''
+
+
+def leavesKingSafe(gs: GameState, move):
+    gs.makeMove(move)
+    if gs.whiteToMove:
+        safe = not gs.isSquareAttacked(gs.blackKingSquare, WHITE)
+    else:
+        safe = not gs.isSquareAttacked(gs.whiteKingSquare, BLACK)
+    gs.undoMove()
+    return safe
+
+
+def orderCaptures(moves):
+    moves.sort(key=captureScore, reverse=True)
+    return moves
+
+
+class SearchStats:
+    '''
+    Counters of one search, over all its iterations:
+        nodes: positions searched (negamax and quiescence), qnodes: the quiescence ones among them
+        ttProbes, ttHits, ttCutoffs: table lookups of negamax, entries found, entries answering the node
+        cutoffs: beta cutoffs, firstMoveCutoffs: the ones caused by the first move searched (ordering quality)
+        evaluations: static evaluations computed, evalCacheProbes / evalCacheHits: evaluations asked for / found in the
+        evaluation cache, pawnTableProbes / pawnTableHits: pawn structures asked for / found in the pawn hash table
+        extensions: check extensions, nullMoves / nullMoveCutoffs: null moves tried / pruning the node,
+        reductions / reSearches: late moves searched reduced / searched again at full depth after beating alpha
+        pvsReSearches: zero-window searches beating alpha, searched again with the full window
+        aspirationReSearches: root iterations searched again because the score fell outside the aspiration window
+        seePrunes: quiescence captures skipped as losing material by static exchange evaluation
+        futilityPrunes / extendedFutilityPrunes: quiet moves skipped at depth 1 / 2 by futility pruning,
+        razorCutoffs: nodes answered by the quiescence search (razoring)
+        iterations: one dict per completed iteration of the iterative deepening (depth, score, move, nodes, time)
+    '''
+
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.ttCutoffs = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.evaluations = 0
+        self.evalCacheProbes = 0
+        self.evalCacheHits = 0
+        self.pawnTableProbes = 0
+        self.pawnTableHits = 0
+        self.extensions = 0
+        self.nullMoves = 0
+        self.nullMoveCutoffs = 0
+        self.reductions = 0
+        self.reSearches = 0
+        self.pvsReSearches = 0
+        self.aspirationReSearches = 0
+        self.seePrunes = 0
+        self.futilityPrunes = 0
+        self.extendedFutilityPrunes = 0
+        self.razorCutoffs = 0
+        self.iterations = []
+
+    '''
+    Add the counters of another search of the same position (a parallel worker)
+    '''
+
+    def merge(self, other):
+        self.nodes += other.nodes
+        self.qnodes += other.qnodes
+        self.ttProbes += other.ttProbes
+        self.ttHits += other.ttHits
+        self.ttCutoffs += other.ttCutoffs
+        self.cutoffs += other.cutoffs
+        self.firstMoveCutoffs += other.firstMoveCutoffs
+        self.evaluations += other.evaluations
+        self.evalCacheProbes += other.evalCacheProbes
+        self.evalCacheHits += other.evalCacheHits
+        self.pawnTableProbes += other.pawnTableProbes
+        self.pawnTableHits += other.pawnTableHits
+        self.extensions += other.extensions
+        self.nullMoves += other.nullMoves
+        self.nullMoveCutoffs += other.nullMoveCutoffs
+        self.reductions += other.reductions
+        self.reSearches += other.reSearches
+        self.pvsReSearches += other.pvsReSearches
+        self.aspirationReSearches += other.aspirationReSearches
+        self.seePrunes += other.seePrunes
+        self.futilityPrunes += other.futilityPrunes
+        self.extendedFutilityPrunes += other.extendedFutilityPrunes
+        self.razorCutoffs += other.razorCutoffs
+
+    @property
+    def ttHitRate(self):
+        return self.ttHits / self.ttProbes if self.ttProbes else 0.0
+
+    @property
+    def evalCacheHitRate(self):
+        return self.evalCacheHits / self.evalCacheProbes if self.evalCacheProbes else 0.0
+
+    @property
+    def pawnTableHitRate(self):
+        return self.pawnTableHits / self.pawnTableProbes if self.pawnTableProbes else 0.0
+
+    @property
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    '''
+    Effective branching factor: nodes of the last iteration / nodes of the one before,
+    or the depth-th root of the nodes when a single iteration ran
+    '''
+
+    @property
+    def branchingFactor(self):
+        if len(self.iterations) >= 2 and self.iterations[-2]["nodes"]:
+            return self.iterations[-1]["nodes"] / self.iterations[-2]["nodes"]
+        if self.iterations and self.iterations[-1]["depth"]:
+            return self.iterations[-1]["nodes"] ** (1 / self.iterations[-1]["depth"])
+        return None
+
+    def toDict(self):
+        branchingFactor = self.branchingFactor
+        return {
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "ttProbes": self.ttProbes,
+            "ttHits": self.ttHits,
+            "ttHitRate": round(self.ttHitRate, 4),
+            "ttCutoffs": self.ttCutoffs,
+            "cutoffs": self.cutoffs,
+            "firstMoveCutoffs": self.firstMoveCutoffs,
+            "firstMoveCutoffRate": round(self.firstMoveCutoffRate, 4),
+            "evaluations": self.evaluations,
+            "evalCacheProbes": self.evalCacheProbes,
+            "evalCacheHits": self.evalCacheHits,
+            "evalCacheHitRate": round(self.evalCacheHitRate, 4),
+            "pawnTableProbes": self.pawnTableProbes,
+            "pawnTableHits": self.pawnTableHits,
+            "pawnTableHitRate": round(self.pawnTableHitRate, 4),
+            "extensions": self.extensions,
+            "nullMoves": self.nullMoves,
+            "nullMoveCutoffs": self.nullMoveCutoffs,
+            "reductions": self.reductions,
+            "reSearches": self.reSearches,
+            "pvsReSearches": self.pvsReSearches,
+            "aspirationReSearches": self.aspirationReSearches,
+            "seePrunes": self.seePrunes,
+            "futilityPrunes": self.futilityPrunes,
+            "extendedFutilityPrunes": self.extendedFutilityPrunes,
+            "razorCutoffs": self.razorCutoffs,
+            "branchingFactor": round(branchingFactor, 2) if branchingFactor is not None else None,
+            "iterations": self.iterations,
+        }
+
+
+class SearchResult:
+    '''
+    bestMove: Move to play, None when the side to move has no legal move
+    score: white-relative score of the last completed iteration
+    pv: principal variation, the expected line starting with bestMove
+    depth: depth of the last completed iteration
+    nodes: nodes searched over all the iterations, elapsed: seconds
+    stats: SearchStats of the search
+    '''
+
+    def __init__(self, bestMove=None, score=0, pv=(), depth=0, nodes=0, elapsed=0.0, stats=None):
+        self.bestMove = bestMove
+        self.score = score
+        self.pv = list(pv)
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.stats = SearchStats() if stats is None else stats
+
+    @property
+    def nodesPerSecond(self):
+        return round(self.nodes / self.elapsed) if self.elapsed > 0 else None
+
+    def toDict(self):
+        return {
+            "bestMove": self.bestMove.getUciNotation() if self.bestMove else None,
+            "score": self.score,
+            "pv": [move.getUciNotation() for move in self.pv],
+            "depth": self.depth,
+            "nodes": self.nodes,
+            "seconds": round(self.elapsed, 4),
+            "nodesPerSecond": self.nodesPerSecond,
+            "stats": self.stats.toDict(),
+        }
+
+    def __repr__(self):
+        pv = " ".join(move.getUciNotation() for move in self.pv)
+        return f"SearchResult(depth={self.depth}, score={self.score}, pv=[{pv}], nodes={self.nodes}, " \
+               f"elapsed={self.elapsed:.3f})"
+
+
+class Searcher:
+    '''
+    transpositionTable: TranspositionTable or SharedTranspositionTable, a new TranspositionTable by default.
+    Reusing one Searcher for all the moves of a game keeps its table, killers and (aged) history between them.
+    quiescenceDepth: longest capture sequence searched at the leaves (0: static evaluation)
+    moveOrdering: False to only search the hash move first, for measuring the ordering
+    nullMovePruning, lateMoveReductions, checkExtensions: switches of the selective search (see negamax)
+    aspirationWindows: False to search every iteration with the full window (see searchAspiration)
+    staticExchange: False to order the captures by MVV-LVA only and search all of them in the quiescence search
+    (see isLosingCapture)
+    futilityPruning, razoring: switches of the pruning of the frontier nodes (see negamax),
+    futilityMargin, extendedFutilityMargin, razorMargin: their margins, in evaluation units (pawn = 10)
+    evaluationCacheSizeMB, pawnTableSizeMB: sizes of the evaluation cache and of the pawn hash table (see evaluateNode),
+    kept from search to search like the transposition table
+    '''
+
+    def __init__(self, transpositionTable=None, quiescenceDepth=DEFAULT_QUIESCENCE_DEPTH, moveOrdering=True,
+                 nullMovePruning=True, lateMoveReductions=True, checkExtensions=True, aspirationWindows=True,
+                 staticExchange=True, futilityPruning=True, razoring=True, futilityMargin=FUTILITY_MARGIN,
+                 extendedFutilityMargin=EXTENDED_FUTILITY_MARGIN, razorMargin=RAZOR_MARGIN,
+                 evaluationCacheSizeMB=EVALUATION_CACHE_SIZE_MB, pawnTableSizeMB=PAWN_TABLE_SIZE_MB):
+        self.transpositionTable = TranspositionTable() if transpositionTable is None else transpositionTable
+        self.evaluationCache = ScoreTable(evaluationCacheSizeMB)
+        self.pawnTable = ScoreTable(pawnTableSizeMB)
+        self.quiescenceDepth = quiescenceDepth
+        self.moveOrdering = moveOrdering
+        self.nullMovePruning = nullMovePruning
+        self.lateMoveReductions = lateMoveReductions
+        self.checkExtensions = checkExtensions
+        self.aspirationWindows = aspirationWindows
+        self.staticExchange = staticExchange
+        self.futilityPruning = futilityPruning
+        self.razoring = razoring
+        self.futilityMargin = futilityMargin
+        self.extendedFutilityMargin = extendedFutilityMargin
+        self.razorMargin = razorMargin
+        # triangular pv table: pvTable[ply] is the best line found from the node at that ply
+        self.pvTable = [[] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        # depth of the current root iteration: check extensions stop at twice this ply
+        self.rootDepth = MAX_SEARCH_DEPTH // 2
+        # killerMoves[ply]: the last quiet moves causing a cutoff at this ply
+        self.killerMoves = [[None] * KILLERS_PER_PLY for _ in range(MAX_SEARCH_DEPTH + 1)]
+        # historyScores[piece code][end square]: how often (weighted by depth * depth) a quiet move caused a cutoff
+        self.historyScores = [[0] * 64 for _ in range(len(PIECE_NAMES))]
+        self.stats = SearchStats()
+        # time.perf_counter() value past which the search is aborted, None for no limit
+        self.deadline = None
+        self.aborted = False
+
+    '''
+    Settings of the searcher, as keyword arguments of configure (and of the constructor)
+    '''
+
+    def getSettings(self):
+        return {name: getattr(self, name) for name in SEARCHER_SETTINGS}
+
+    def configure(self, **settings):
+        for name, value in settings.items():
+            if name not in SEARCHER_SETTINGS:
+                raise RuntimeError(f"Unknown searcher setting {name}, expected one of {SEARCHER_SETTINGS}")
+            setattr(self, name, value)
+
+    '''
+    Reset the per search state: statistics, abort flag, killer moves, aged history and transposition table age
+    '''
+
+    def newSearch(self):
+        self.aborted = False
+        self.stats = SearchStats()
+        for killers in self.killerMoves:
+            for i in range(KILLERS_PER_PLY):
+                killers[i] = None
+        for pieceHistory in self.historyScores:
+            for sq in range(64):
+                pieceHistory[sq] >>= HISTORY_AGING_SHIFT
+        self.transpositionTable.newSearch()
+
+    # * ------------------- Iterative deepening ----------------
+    '''
+    Search depth minDepth, minDepth + 1... until maxDepth or until the time limit (seconds) is spent.
+    Every iteration starts with the best move of the previous one, and the transposition table orders the rest.
+    The first iteration always completes: there must be a move to play.
+    onIteration: optional callback, called with the SearchResult so far after every completed iteration
+    (live display of the search: depth, score, pv, nodes, stats)
+    '''
+
+    def search(self, gs: GameState, maxDepth=MAX_SEARCH_DEPTH, timeLimit=None, minDepth=1,
+               onIteration=None) -> SearchResult:
+        startTime = time.perf_counter()
+        self.newSearch()
+        self.deadline = None
+        stats = self.stats
+        result = SearchResult(stats=stats)
+        # the search scores for the side to move, the result for white
+        sign = 1 if gs.whiteToMove else -1
+        score = None
+        for depth in range(min(minDepth, maxDepth), maxDepth + 1):
+            iterationStart, iterationNodes = time.perf_counter(), stats.nodes
+            score, bestMove = self.searchAspiration(gs, depth, score, result.bestMove)
+            if self.aborted:
+                break
+            result.score, result.depth = sign * score, depth
+            if bestMove is None:
+                # no legal move: checkmate or stalemate
+                break
+            now = time.perf_counter()
+            result.bestMove = bestMove
+            result.pv = self.pvTable[0] or [bestMove]
+            result.nodes = stats.nodes
+            result.elapsed = now - startTime
+            bestMoveNotation = bestMove.getUciNotation()
+            stats.iterations.append({"depth": depth, "score": result.score, "bestMove": bestMoveNotation,
+                                     "nodes": stats.nodes - iterationNodes,
+                                     "seconds": round(now - iterationStart, 4)})
+            logger.info(f"Depth {depth}: best move {bestMoveNotation}, score {result.score}, {stats.nodes} nodes, "
+                        f"{result.elapsed:.2f}s")
+            ChessLogging.traceEvent("search_iteration", depth=depth, bestMove=bestMoveNotation, score=result.score,
+                                    nodes=stats.nodes, seconds=round(result.elapsed, 4))
+            if onIteration is not None:
+                onIteration(result)
+            if timeLimit is not None:
+                if result.elapsed >= timeLimit * NEXT_ITERATION_TIME_SHARE:
+                    break
+                self.deadline = startTime + timeLimit
+        # leave the flags clean for the searches run without a time limit
+        self.deadline = None
+        self.aborted = False
+        result.nodes = stats.nodes
+        result.elapsed = time.perf_counter() - startTime
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Search: {result}, transposition table: {self.transpositionTable.stats()}, "
+                        f"evaluation cache: {self.evaluationCache.stats()}, pawn table: {self.pawnTable.stats()}")
+        return result
+
+    '''
+    One iteration with an aspiration window: from ASPIRATION_MIN_DEPTH on, the root is searched with a window of
+    ASPIRATION_WINDOW around the score of the previous iteration. A score falling outside means the window was
+    wrong: the failing side is widened (ASPIRATION_GROWTH times more each time) and the iteration searched again.
+    Return: as searchRoot
+    '''
+
+    def searchAspiration(self, node: GameState, depth, previousScore, firstMove=None):
+        if not self.aspirationWindows or previousScore is None or depth < ASPIRATION_MIN_DEPTH or \
+                abs(previousScore) >= MATE_BOUND:
+            return self.searchRoot(node, depth, -MATE_SCORE, MATE_SCORE, firstMove)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previousScore - delta, previousScore + delta
+        while True:
+            score, bestMove = self.searchRoot(node, depth, alpha, beta, firstMove)
+            if self.aborted or bestMove is None or alpha < score < beta:
+                return score, bestMove
+            self.stats.aspirationReSearches += 1
+            delta *= ASPIRATION_GROWTH
+            if score <= alpha:
+                alpha = max(score - delta, -MATE_SCORE)
+            else:
+                beta = min(score + delta, MATE_SCORE)
+                # the move failing high is the one to beat
+                firstMove = bestMove
+
+    '''
+    One iteration at the root: like negamax, but the best move itself is needed, so the transposition table
+    only orders the moves and firstMove (best move of the previous iteration) goes first whatever the table kept.
+    Return: (score for the side to move, best Move), best Move None if there is no legal move or the search was aborted
+    '''
+
+    def searchRoot(self, node: GameState, depth, alpha, beta, firstMove=None):
+        self.rootDepth = depth
+        pvTable = self.pvTable
+        pvTable[0] = []
+        moves = node.getValidMoves()
+        if not moves:
+            return (-MATE_SCORE if node.inCheck else DRAW_SCORE), None
+        key = node.zobristKey
+        alphaOrig = alpha
+        moves = self.orderMoves(moves, self.transpositionTable.probe(key), 0, node)
+        if firstMove is not None and firstMove in moves:
+            moves.remove(firstMove)
+            moves.insert(0, firstMove)
+        bestScore, bestMove = -MATE_SCORE, None
+        for moveIndex, move in enumerate(moves):
+            node.makeMove(move)
+            if moveIndex == 0:
+                score = -self.negamax(node, depth - 1, -beta, -alpha, 1)
+            else:
+                score = -self.negamax(node, depth - 1, -alpha - 1, -alpha, 1)
+                if alpha < score < beta and not self.aborted:
+                    self.stats.pvsReSearches += 1
+                    score = -self.negamax(node, depth - 1, -beta, -alpha, 1)
+            node.undoMove()
+            if self.aborted:
+                return 0, None
+            if score > bestScore or bestMove is None:
+                bestScore, bestMove = score, move
+            if score > alpha:
+                alpha = score
+                pvTable[0] = [move] + pvTable[1]
+                if score >= beta:
+                    break
+        self.storeSearchResult(key, depth, bestScore, alphaOrig, beta, bestMove)
+        return bestScore, bestMove
+
+    # * ------------------- Principal variation search ----------------
+    '''
+    Negamax alpha-beta, scores for the side to move: the first move of a node is searched with the full window,
+    the others with a zero window (-alpha - 1, -alpha) that only tells whether they beat alpha, and searched again
+    with the full window when they do (PVS). On top of it, the selective search of the switches of the searcher:
+        + check extension: a node in check is searched one ply deeper
+        + null-move pruning: if passing still scores past beta at reduced depth, so would a real move
+        + late move reductions: the late quiet moves get a shallower zero-window search,
+          and a full depth one when they beat alpha
+        + razoring: a node whose static score is razorMargin below alpha, up to RAZOR_MAX_DEPTH, is left to the
+          quiescence search if the captures cannot make up for it
+        + futility pruning: at depth 1 (2), quiet moves not giving check are skipped when the static score plus
+          futilityMargin (extendedFutilityMargin) does not reach alpha
+    Neither the selective search nor the pruning applies to PV nodes, nodes in check or mate windows.
+    The moves raising alpha in a PV node (beta - alpha > 1) build the triangular pv table:
+    pvTable[ply] is the best line found from the node at that ply.
+    allowNullMove: False right after a null move, two passes in a row would prove nothing
+    '''
+
+    def negamax(self, node: GameState, depth, alpha, beta, ply, allowNullMove=True):
+        pvTable = self.pvTable
+        pvTable[ply] = []
+        inCheck = node.isInCheck() if depth > 0 or self.checkExtensions else False
+        if inCheck and self.checkExtensions and ply < 2 * self.rootDepth:
+            depth += 1
+            self.stats.extensions += 1
+        if depth <= 0:
+            return self.quiescence(node, alpha, beta, ply, self.quiescenceDepth)
+        if self.isAborted():
+            return 0
+        if ply >= MAX_SEARCH_DEPTH:
+            return self.evaluateNode(node)
+        stats = self.stats
+        pvNode = beta - alpha > 1
+        key = node.zobristKey
+        stats.ttProbes += 1
+        ttEntry = self.transpositionTable.probe(key)
+        if ttEntry is not None:
+            stats.ttHits += 1
+            # no cutoff in PV nodes: the line below them is needed
+            if not pvNode and ttEntry[ENTRY_DEPTH] >= depth:
+                score, bound = scoreFromTable(ttEntry[ENTRY_SCORE], ply), ttEntry[ENTRY_BOUND]
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or \
+                        (bound == UPPER_BOUND and score <= alpha):
+                    stats.ttCutoffs += 1
+                    return score
+        # static score of the node, for the pruning decisions
+        staticEval = None if pvNode or inCheck else self.evaluateNode(node)
+        # no margin pruning against a mate score: the margins mean nothing there
+        prune = staticEval is not None and abs(alpha) < MATE_BOUND
+        if self.razoring and prune and depth <= RAZOR_MAX_DEPTH and staticEval + self.razorMargin <= alpha:
+            razorAlpha = alpha - self.razorMargin
+            score = self.quiescence(node, razorAlpha, razorAlpha + 1, ply, self.quiescenceDepth)
+            if self.aborted:
+                return 0
+            if score <= razorAlpha:
+                stats.razorCutoffs += 1
+                return score
+        if self.nullMovePruning and allowNullMove and staticEval is not None and staticEval >= beta and \
+                depth >= NULL_MOVE_MIN_DEPTH and node.hasNonPawnMaterial(WHITE if node.whiteToMove else BLACK):
+            stats.nullMoves += 1
+            enPassantSquare = node.makeNullMove()
+            score = -self.negamax(node, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, False)
+            node.undoNullMove(enPassantSquare)
+            if self.aborted:
+                return 0
+            if score >= beta:
+                stats.nullMoveCutoffs += 1
+                return beta
+        alphaOrig = alpha
+        if self.moveOrdering:
+            moves = self.pickMoves(node, ttEntry, ply)
+        else:
+            moves = self.orderMoves(node.getValidMoves(), ttEntry, ply)
+        reduce = self.lateMoveReductions and depth >= LMR_MIN_DEPTH and not inCheck
+        # futilityScore: best score a skipped quiet move is expected to reach, None when nothing is skipped
+        futilityScore = None
+        if self.futilityPruning and prune and depth <= 2:
+            margin = self.futilityMargin if depth == 1 else self.extendedFutilityMargin
+            if staticEval + margin <= alpha:
+                futilityScore = staticEval + margin
+        futilityPrunes = 0
+        killers = self.killerMoves[ply]
+        bestScore, bestMove = -MATE_SCORE, None
+        for moveIndex, move in enumerate(moves):
+            node.makeMove(move)
+            if futilityScore is not None and not move.pieceCaptured and not move.promotionPiece and \
+                    not node.isInCheck():
+                node.undoMove()
+                futilityPrunes += 1
+                continue
+            if moveIndex == 0:
+                score = -self.negamax(node, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                reduction = 0
+                if reduce and moveIndex >= LMR_MIN_MOVE_INDEX and not move.pieceCaptured and \
+                        not move.promotionPiece and move not in killers and not node.isInCheck():
+                    stats.reductions += 1
+                    reduction = LMR_LATE_REDUCTION if moveIndex >= LMR_LATE_MOVE_INDEX else LMR_REDUCTION
+                score = -self.negamax(node, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if reduction and score > alpha and not self.aborted:
+                    stats.reSearches += 1
+                    score = -self.negamax(node, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta and not self.aborted:
+                    stats.pvsReSearches += 1
+                    score = -self.negamax(node, depth - 1, -beta, -alpha, ply + 1)
+            node.undoMove()
+            if self.aborted:
+                return 0
+            if score > bestScore or bestMove is None:
+                bestScore, bestMove = score, move
+                if score > alpha:
+                    alpha = score
+                    if pvNode:
+                        pvTable[ply] = [move] + pvTable[ply + 1]
+                    if score >= beta:
+                        self.recordCutoff(move, depth, ply, moveIndex)
+                        break
+        if futilityPrunes:
+            if depth == 1:
+                stats.futilityPrunes += futilityPrunes
+            else:
+                stats.extendedFutilityPrunes += futilityPrunes
+            if bestMove is None:
+                # every move was skipped: fail low with the score they were expected to reach at best
+                return futilityScore
+            bestScore = max(bestScore, futilityScore)
+        if bestMove is None:
+            # no legal move: checkmated (the closer to the root the worse) or stalemate
+            return -MATE_SCORE + ply if inCheck else DRAW_SCORE
+        self.storeSearchResult(key, depth, bestScore, alphaOrig, beta, bestMove, ply)
+        return bestScore
+
+    # * ------------------- Quiescence search ----------------
+    '''
+    Search the captures (and queen promotions) of the leaf until the position is quiet.
+    The side to move may also stand pat, i.e. keep the static score, unless it is in check: then every evasion
+    is searched. qDepth bounds the length of the capture sequences (0: static score only).
+    '''
+
+    def quiescence(self, node: GameState, alpha, beta, ply, qDepth):
+        if self.isAborted():
+            return 0
+        self.stats.qnodes += 1
+        standPat = self.evaluateNode(node)
+        if qDepth <= 0:
+            return standPat
+        inCheck = node.checkForPinsAndChecks()[0]
+        if inCheck:
+            moves = node.getValidMoves()
+            if not moves:
+                return -MATE_SCORE + ply
+            bestScore = -MATE_SCORE
+        else:
+            if standPat >= beta:
+                return standPat
+            bestScore = standPat
+            alpha = max(alpha, standPat)
+            moves = orderCaptures([move for move in node.getValidMoves(CAPTURE_MOVES)
+                                   if move.promotionPiece == EMPTY or move.promotionPiece == QUEEN])
+        for move in moves:
+            if not inCheck:
+                if standPat + captureGain(move) + DELTA_MARGIN <= alpha:
+                    continue
+                if self.staticExchange and isLosingCapture(node, move):
+                    self.stats.seePrunes += 1
+                    continue
+            node.makeMove(move)
+            score = -self.quiescence(node, -beta, -alpha, ply + 1, qDepth - 1)
+            node.undoMove()
+            if self.aborted:
+                return 0
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    if score >= beta:
+                        break  # Beta cutofff
+        return bestScore
+
+    '''
+    Static score for the side to move, read from the evaluation cache when the position was already evaluated,
+    and with the pawn structure from the pawn hash table when only the pawns were already seen
+    '''
+
+    def evaluateNode(self, node: GameState):
+        stats = self.stats
+        stats.evalCacheProbes += 1
+        # the evaluation only depends on the pieces: side to move, castling and en passant stay out of the key
+        key = node.boardHash
+        score = self.evaluationCache.probe(key)
+        if score is not None:
+            stats.evalCacheHits += 1
+        else:
+            stats.evaluations += 1
+            stats.pawnTableProbes += 1
+            pawnStructure = self.pawnTable.probe(node.pawnHash)
+            if pawnStructure is not None:
+                stats.pawnTableHits += 1
+            else:
+                pawnStructure = evaluatePawnStructure(node)
+                self.pawnTable.store(node.pawnHash, pawnStructure)
+            score = calculateHeuristicScoreForNode(node, pawnStructure)
+            self.evaluationCache.store(key, score)
+        return score if node.whiteToMove else -score
+
+    '''
+    Count the node, and abort the search once the deadline has passed
+    '''
+
+    def isAborted(self):
+        if self.aborted:
+            return True
+        stats = self.stats
+        stats.nodes += 1
+        if self.deadline is not None and stats.nodes & TIME_CHECK_INTERVAL == 0 and \
+                time.perf_counter() >= self.deadline:
+            self.aborted = True
+        return self.aborted
+
+    # * ------------------- Transposition table ----------------
+    '''
+    value is the fail-soft score of the node at the given ply, searched with the window (alpha, beta)
+    '''
+
+    def storeSearchResult(self, key, depth, value, alpha, beta, bestMove, ply=0):
+        if value <= alpha:
+            bound = UPPER_BOUND
+        elif value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.transpositionTable.store(key, depth, bound, scoreToTable(value, ply), bestMove)
+
+    '''
+    Expected line: bestMove, then the hash moves of the positions it leads to, at most maxLength moves
+    '''
+
+    def principalVariation(self, gs: GameState, bestMove, maxLength):
+        if bestMove is None:
+            return []
+        pv = [bestMove]
+        gs.makeMove(bestMove)
+        seen = {gs.zobristKey}
+        while len(pv) < maxLength:
+            entry = self.transpositionTable.probe(gs.zobristKey)
+            move = gs.findLegalMove(entry[ENTRY_MOVE]) if entry is not None and entry[ENTRY_MOVE] else None
+            if move is None:
+                break
+            gs.makeMove(move)
+            pv.append(move)
+            if gs.zobristKey in seen:
+                break  # repetition: the line would loop
+            seen.add(gs.zobristKey)
+        for _ in pv:
+            gs.undoMove()
+        return pv
+
+    # * ------------------- Move ordering ----------------
+    '''
+    Sort the moves so that the ones most likely to cause a cutoff are searched first:
+    the best move of a previous search of the position (hash move), captures and promotions by MVV-LVA,
+    the killer moves of this ply, then the quiet moves by history score.
+    node: position of the moves, to put the captures losing material last (static exchange evaluation)
+    '''
+
+    def orderMoves(self, moves, ttEntry, ply, node=None):
+        hashMove = ttEntry[ENTRY_MOVE] if ttEntry is not None else None
+        if not self.moveOrdering:
+            # hash move only
+            if hashMove is not None and hashMove in moves:
+                moves.remove(hashMove)
+                moves.insert(0, hashMove)
+            return moves
+        killers = self.killerMoves[ply]
+        historyScores = self.historyScores
+        staticExchange = self.staticExchange and node is not None
+
+        def moveScore(move):
+            if hashMove is not None and move == hashMove:
+                return HASH_MOVE_SCORE
+            if move.pieceCaptured or move.promotionPiece:
+                if staticExchange and isLosingCapture(node, move):
+                    return LOSING_CAPTURE_SCORE + captureScore(move)
+                return CAPTURE_SCORE + captureScore(move)
+            if move in killers:
+                return KILLER_SCORE - killers.index(move)
+            return historyScores[move.pieceMoved][move.endSq]
+
+        moves.sort(key=moveScore, reverse=True)
+        return moves
+
+    def historyScore(self, move):
+        return self.historyScores[move.pieceMoved][move.endSq]
+
+    '''
+    Staged move picker: same order as orderMoves, but every stage is only generated when the previous ones
+    did not cause a cutoff. The hash move and the killers come from other searches and are checked against
+    the position (GameState.findLegalMove) before being played.
+    '''
+
+    def pickMoves(self, node: GameState, ttEntry, ply):
+        hashMove = ttEntry[ENTRY_MOVE] if ttEntry is not None else None
+        if hashMove is not None:
+            hashMove = node.findLegalMove(hashMove)
+            if hashMove is not None:
+                assert leavesKingSafe(node, hashMove), f"illegal hash move {hashMove.getUciNotation()}"
+                yield hashMove
+        captures = node.getValidMoves(CAPTURE_MOVES)
+        captures.sort(key=captureScore, reverse=True)
+        losingCaptures = []
+        for move in captures:
+            if move != hashMove:
+                if self.staticExchange and isLosingCapture(node, move):
+                    losingCaptures.append(move)
+                else:
+                    yield move
+        killers = []
+        for killer in list(self.killerMoves[ply]):
+            if killer is not None and killer != hashMove:
+                killer = node.findLegalMove(killer)
+                # a killer is a quiet move, but the same squares can be a capture here
+                if killer is not None and not killer.pieceCaptured and not killer.promotionPiece:
+                    assert leavesKingSafe(node, killer), f"illegal killer move {killer.getUciNotation()}"
+                    killers.append(killer)
+                    yield killer
+        quiets = node.getValidMoves(QUIET_MOVES)
+        quiets.sort(key=self.historyScore, reverse=True)
+        for move in quiets:
+            if move != hashMove and move not in killers:
+                yield move
+        yield from losingCaptures
+
+    '''
+    A quiet move refuting the position is remembered as a killer of its ply and gains history.
+    moveIndex: rank of the move in the ordered moves of the node (0: the first one searched)
+    '''
+
+    def recordCutoff(self, move, depth, ply, moveIndex=0):
+        stats = self.stats
+        stats.cutoffs += 1
+        if moveIndex == 0:
+            stats.firstMoveCutoffs += 1
+        if move.pieceCaptured or move.promotionPiece:
+            return
+        killers = self.killerMoves[ply]
+        if killers[0] != move:
+            killers[1:] = killers[:-1]
+            killers[0] = move
+        self.historyScores[move.pieceMoved][move.endSq] += depth * depth
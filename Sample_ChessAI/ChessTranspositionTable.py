@@ -0,0 +1,351 @@
+from multiprocessing import shared_memory
+
+from ChessEngine import packMove, unpackMove
+
+"""
+    Transposition table: search results indexed by the Zobrist key of the position (GameState.zobristKey).
+
+    The table is a fixed number of buckets (a power of two, the low bits of the key pick the bucket),
+    each bucket holding two entries:
+        + slot 0, depth-preferred: only replaced by a search at least as deep (or from a new search, see newSearch)
+        + slot 1, always-replace: takes whatever the depth-preferred slot refused
+    An entry is the tuple (key, depth, bound, score, bestMove, age) and bound tells how to read the score:
+        + EXACT: score is the value of the position
+        + LOWER_BOUND: the search failed high, the value is >= score
+        + UPPER_BOUND: the search failed low, the value is <= score
+
+    SharedTranspositionTable has the same interface and replacement scheme, but lives in a
+    multiprocessing.shared_memory block so that the processes of a parallel search share their results.
+
+    ScoreTable is the plain version for the evaluation: one score per key in a single always-replace slot,
+    used by the search as evaluation cache (keyed by GameState.boardHash) and pawn hash table (GameState.pawnHash).
+"""
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+ENTRIES_PER_BUCKET = 2
+# Rough size of one stored entry in CPython: the 6-tuple, its int fields and the list slot
+ENTRY_SIZE_BYTES = 128
+DEFAULT_SIZE_MB = 16
+
+# Fields of an entry tuple
+ENTRY_KEY, ENTRY_DEPTH, ENTRY_BOUND, ENTRY_SCORE, ENTRY_MOVE, ENTRY_AGE = range(6)
+
+
+class TranspositionTable:
+    def __init__(self, sizeMB=DEFAULT_SIZE_MB):
+        if sizeMB <= 0:
+            raise RuntimeError(f"Transposition table size must be positive, got {sizeMB} MB")
+        buckets = 1
+        # biggest power of two number of buckets fitting in the memory budget
+        while buckets * 2 * ENTRIES_PER_BUCKET * ENTRY_SIZE_BYTES <= sizeMB * 1024 * 1024:
+            buckets *= 2
+        self.sizeMB = sizeMB
+        self.bucketMask = buckets - 1
+        self.entries = [None] * (buckets * ENTRIES_PER_BUCKET)
+        self.age = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        self.entries = [None] * len(self.entries)
+        self.age = 0
+        self.resetStats()
+
+    '''
+    Called once per search (Searcher.search, findBestMoveParallel), not per root move: ages the whole table,
+    so that the entries of the previous searches become replaceable
+    '''
+
+    def newSearch(self):
+        self.age += 1
+
+    @property
+    def capacity(self):
+        return len(self.entries)
+
+    def probe(self, key):
+        self.probes += 1
+        index = (key & self.bucketMask) * ENTRIES_PER_BUCKET
+        entries = self.entries
+        entry = entries[index]
+        if entry is not None and entry[ENTRY_KEY] == key:
+            self.hits += 1
+            return entry
+        entry = entries[index + 1]
+        if entry is not None and entry[ENTRY_KEY] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, bound, score, bestMove=None):
+        self.stores += 1
+        index = (key & self.bucketMask) * ENTRIES_PER_BUCKET
+        entries = self.entries
+        deepest = entries[index]
+        if deepest is not None and deepest[ENTRY_KEY] == key and bestMove is None:
+            # keep the best move known for this position
+            bestMove = deepest[ENTRY_MOVE]
+        entry = (key, depth, bound, score, bestMove, self.age)
+        if deepest is None or deepest[ENTRY_KEY] == key or depth >= deepest[ENTRY_DEPTH] or \
+                deepest[ENTRY_AGE] != self.age:
+            if deepest is not None and deepest[ENTRY_KEY] != key:
+                self.overwrites += 1
+            entries[index] = entry
+        else:
+            if entries[index + 1] is not None and entries[index + 1][ENTRY_KEY] != key:
+                self.overwrites += 1
+            entries[index + 1] = entry
+
+    @property
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    '''
+    Share of the slots in use, sampled on the first 1000 buckets like the UCI hashfull
+    '''
+
+    def usage(self):
+        sample = self.entries[:1000 * ENTRIES_PER_BUCKET]
+        return sum(1 for entry in sample if entry is not None) / len(sample)
+
+    def stats(self):
+        return {
+            "sizeMB": self.sizeMB,
+            "capacity": self.capacity,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hitRate": round(self.hitRate, 4),
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "usage": round(self.usage(), 4),
+        }
+
+
+# * Shared table layout: an array of unsigned 64-bit words, word 0 holding the age of the current search,
+# * then two words per entry: (key ^ data, data), data packing the fields of the entry:
+# *     move (ChessEngine.packMove, 27 bits) | score + SCORE_OFFSET << 27 (16 bits) | depth << 43 (8 bits)
+# *     | bound << 51 (2 bits) | age << 53 (8 bits)
+# * No lock: two processes writing the same entry at once can leave the words of different writes,
+# * then key ^ data no longer gives the key back and the entry is read as a miss (lockless hashing, R. Hyatt).
+SHARED_ENTRY_SIZE_BYTES = 16
+SHARED_HEADER_WORDS = 1
+SCORE_OFFSET = 1 << 15
+MOVE_BITS = (1 << 27) - 1
+NO_MOVE = MOVE_BITS
+KEY_MASK = (1 << 64) - 1
+
+
+class SharedTranspositionTable:
+    '''
+    name: None to create the shared block (this process owns it: newSearch, unlink), or the name of the block
+    created by another process to attach to it. Pickling a table attaches to the same block in the other process.
+    '''
+
+    def __init__(self, sizeMB=DEFAULT_SIZE_MB, name=None):
+        if sizeMB <= 0:
+            raise RuntimeError(f"Transposition table size must be positive, got {sizeMB} MB")
+        buckets = 1
+        while buckets * 2 * ENTRIES_PER_BUCKET * SHARED_ENTRY_SIZE_BYTES <= sizeMB * 1024 * 1024:
+            buckets *= 2
+        size = (SHARED_HEADER_WORDS + buckets * ENTRIES_PER_BUCKET * 2) * 8
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.memory.buf[:size] = bytes(size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.sizeMB = sizeMB
+        self.bucketMask = buckets - 1
+        self.words = self.memory.buf.cast('Q')
+        self.resetStats()
+
+    def __getstate__(self):
+        return self.sizeMB, self.memory.name
+
+    def __setstate__(self, state):
+        sizeMB, name = state
+        self.__init__(sizeMB, name)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def age(self):
+        return self.words[0]
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        words = self.words
+        for i in range(len(words)):
+            words[i] = 0
+        self.resetStats()
+
+    '''
+    Only the owner ages the table, once per findBestMoveParallel: the workers also call it when they start on a new
+    search (Searcher.newSearch), which must not age the table once per worker
+    '''
+
+    def newSearch(self):
+        if self.owner:
+            self.words[0] = (self.words[0] + 1) & 0xFF
+
+    @property
+    def capacity(self):
+        return (self.bucketMask + 1) * ENTRIES_PER_BUCKET
+
+    def unpack(self, key, data):
+        moveKey = data & MOVE_BITS
+        return (key, data >> 43 & 0xFF, data >> 51 & 3, (data >> 27 & 0xFFFF) - SCORE_OFFSET,
+                None if moveKey == NO_MOVE else unpackMove(moveKey), data >> 53 & 0xFF)
+
+    def probe(self, key):
+        self.probes += 1
+        words = self.words
+        index = SHARED_HEADER_WORDS + (key & self.bucketMask) * ENTRIES_PER_BUCKET * 2
+        for slot in (index, index + 2):
+            data = words[slot + 1]
+            if data and words[slot] ^ data == key:
+                self.hits += 1
+                return self.unpack(key, data)
+        return None
+
+    def store(self, key, depth, bound, score, bestMove=None):
+        self.stores += 1
+        words = self.words
+        age = words[0]
+        index = SHARED_HEADER_WORDS + (key & self.bucketMask) * ENTRIES_PER_BUCKET * 2
+        deepestData = words[index + 1]
+        deepestKey = words[index] ^ deepestData if deepestData else None
+        if bestMove is not None:
+            moveKey = packMove(bestMove)
+        elif deepestKey == key:
+            # keep the best move known for this position
+            moveKey = deepestData & MOVE_BITS
+        else:
+            moveKey = NO_MOVE
+        data = moveKey | (score + SCORE_OFFSET) << 27 | depth << 43 | bound << 51 | age << 53
+        if deepestKey is None or deepestKey == key or depth >= deepestData >> 43 & 0xFF or \
+                deepestData >> 53 & 0xFF != age:
+            slot = index
+            if deepestKey is not None and deepestKey != key:
+                self.overwrites += 1
+        else:
+            slot = index + 2
+            if words[slot + 1] and words[slot] ^ words[slot + 1] != key:
+                self.overwrites += 1
+        words[slot] = (key ^ data) & KEY_MASK
+        words[slot + 1] = data
+
+    @property
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def usage(self):
+        sample = min(1000, self.bucketMask + 1) * ENTRIES_PER_BUCKET
+        words = self.words
+        return sum(1 for i in range(sample) if words[SHARED_HEADER_WORDS + i * 2 + 1]) / sample
+
+    def stats(self):
+        return {
+            "sizeMB": self.sizeMB,
+            "capacity": self.capacity,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hitRate": round(self.hitRate, 4),
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "usage": round(self.usage(), 4),
+            "shared": self.name,
+        }
+
+    '''
+    Detach from the block, and remove it if this process created it
+    '''
+
+    def close(self):
+        self.words.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+# Rough size of one ScoreTable entry in CPython: the (key, score) tuple, its ints and the list slot
+SCORE_ENTRY_SIZE_BYTES = 96
+EVALUATION_CACHE_SIZE_MB = 4
+PAWN_TABLE_SIZE_MB = 1
+
+
+class ScoreTable:
+    def __init__(self, sizeMB):
+        if sizeMB <= 0:
+            raise RuntimeError(f"Score table size must be positive, got {sizeMB} MB")
+        entries = 1
+        while entries * 2 * SCORE_ENTRY_SIZE_BYTES <= sizeMB * 1024 * 1024:
+            entries *= 2
+        self.sizeMB = sizeMB
+        self.indexMask = entries - 1
+        self.entries = [None] * entries
+        self.resetStats()
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        self.entries = [None] * len(self.entries)
+        self.resetStats()
+
+    @property
+    def capacity(self):
+        return len(self.entries)
+
+    '''
+    Return: the score stored for the key, None if there is none
+    '''
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.entries[key & self.indexMask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        return None
+
+    def store(self, key, score):
+        self.stores += 1
+        index = key & self.indexMask
+        entry = self.entries[index]
+        if entry is not None and entry[0] != key:
+            self.overwrites += 1
+        self.entries[index] = (key, score)
+
+    @property
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self):
+        return {
+            "sizeMB": self.sizeMB,
+            "capacity": self.capacity,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hitRate": round(self.hitRate, 4),
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+        }
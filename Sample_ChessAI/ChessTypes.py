@@ -12,3 +12,33 @@ BISHOP_PIECE = "B"
 # Type declaration
 MoveTuple = tuple[int, int]
 PiecePosTuple = tuple[str, MoveTuple]
+
+# * Integer piece codes used by the engine board (GameState.squares)
+# * A code is a side bit OR'ed with a piece type:
+# *     code & PIECE_TYPE_MASK -> piece type,  code & WHITE / code & BLACK -> side
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+PIECE_TYPE_MASK = 7
+
+WHITE = 8
+BLACK = 16
+
+WHITE_PAWN, WHITE_KNIGHT, WHITE_BISHOP = WHITE | PAWN, WHITE | KNIGHT, WHITE | BISHOP
+WHITE_ROOK, WHITE_QUEEN, WHITE_KING = WHITE | ROOK, WHITE | QUEEN, WHITE | KING
+BLACK_PAWN, BLACK_KNIGHT, BLACK_BISHOP = BLACK | PAWN, BLACK | KNIGHT, BLACK | BISHOP
+BLACK_ROOK, BLACK_QUEEN, BLACK_KING = BLACK | ROOK, BLACK | QUEEN, BLACK | KING
+
+# Conversion between the integer codes and the 'wp' / 'bR' names used by the UI and helpers
+PIECE_TYPE_LETTERS = {PAWN: PAWN_PIECE, KNIGHT: KNIGHT_PIECE, BISHOP: BISHOP_PIECE,
+                      ROOK: ROOK_PIECE, QUEEN: QUEEN_PIECE, KING: KING_PIECE}
+PIECE_CODES = {side_prefix + letter: side | piece_type
+               for side_prefix, side in ((WHITE_PIECE_PREFIX, WHITE), (BLACK_PIECE_PREFIX, BLACK))
+               for piece_type, letter in PIECE_TYPE_LETTERS.items()}
+PIECE_NAMES = [EMPTY_CELL] * ((BLACK | PIECE_TYPE_MASK) + 1)
+for _name, _code in PIECE_CODES.items():
+    PIECE_NAMES[_code] = _name
@@ -0,0 +1,154 @@
+import random
+
+import pytest
+
+import ChessEngine
+from ChessEvaluation import evaluate
+from ChessPerft import PERFT_SUITE, runPosition
+
+"""
+    Regression checks of the move generators, the Zobrist keys, the FEN parser and the evaluation,
+    on both engines (ChessEngine.AVAILABLE_ENGINES).
+
+    Usage:
+        python -m pytest -q
+"""
+
+ENGINES = list(ChessEngine.AVAILABLE_ENGINES)
+PERFT_DEPTH = 3
+# plies of the random games the FEN and evaluation checks walk through, from every perft position
+RANDOM_GAME_PLIES = 40
+# king in check by a slider: the square behind the king on the checking ray is attacked too
+KING_IN_CHECK_FENS = [
+    "4r2k/8/8/8/4K3/8/8/8 w - - 0 1",
+    "7k/8/8/8/3K4/8/8/b7 w - - 0 1",
+    "k7/8/8/8/q3K3/8/8/8 w - - 0 1",
+    "r1b1k2r/pppp1ppp/5q2/2b1n3/3KP3/2N3PN/PPP4P/R1BQ1BR1 w kq - 1 2",
+    "4k3/8/8/8/8/8/8/R3K2r w Q - 0 1",
+]
+# random games walked from every perft position to collect the positions in check
+CHECK_GAMES_PER_POSITION = 10
+CHECK_GAME_PLIES = 60
+
+'''
+The same position with the colours swapped: board flipped upside down, side to move and castling rights swapped
+(en passant dropped)
+'''
+
+
+def mirrorFen(fen):
+    board, side, castling = fen.split()[:3]
+    board = "/".join(row.swapcase() for row in reversed(board.split("/")))
+    side = "b" if side == "w" else "w"
+    castling = "".join(sorted(castling.swapcase())) if castling != "-" else "-"
+    return f"{board} {side} {castling} - 0 1"
+
+
+'''
+Positions of a random game from every perft position, the same on every run
+'''
+
+
+def randomGamePositions(engine):
+    rng = random.Random(0)
+    for fen, _ in PERFT_SUITE.values():
+        gameState = ChessEngine.createGameState(engine, fen)
+        for _ in range(RANDOM_GAME_PLIES):
+            moves = gameState.getValidMoves()
+            if not moves:
+                break
+            gameState.makeMove(rng.choice(moves))
+            yield gameState
+
+
+'''
+Positions in check met along random games from every perft position, the same on every run
+'''
+
+
+def checkPositions(engine):
+    rng = random.Random(0)
+    for fen in KING_IN_CHECK_FENS:
+        yield ChessEngine.createGameState(engine, fen)
+    for fen, _ in PERFT_SUITE.values():
+        for _ in range(CHECK_GAMES_PER_POSITION):
+            gameState = ChessEngine.createGameState(engine, fen)
+            for _ in range(CHECK_GAME_PLIES):
+                moves = gameState.getValidMoves()
+                if not moves:
+                    break
+                gameState.makeMove(rng.choice(moves))
+                if gameState.isInCheck():
+                    yield gameState
+
+
+'''
+Moves findLegalMove can be asked about in this position: the pseudo-legal moves of the side to move
+(the piece generators without the pins), every king step and the castles of a king on its starting square
+'''
+
+
+def pseudoMoves(gameState):
+    squares = gameState.squares
+    kingSq = gameState.whiteKingSquare if gameState.whiteToMove else gameState.blackKingSquare
+    pins = gameState.pins
+    gameState.pins = {}
+    moves = gameState.getAllPossibleMoves()
+    gameState.pins = pins
+    moves += [ChessEngine.getMove(kingSq, endSq, squares) for endSq in ChessEngine.KING_TARGETS[kingSq]]
+    if kingSq in (4, 60):
+        moves += [ChessEngine.getMove(kingSq, kingSq + offset, squares, isCastleMove=True) for offset in (-2, 2)]
+    return moves
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", list(PERFT_SUITE))
+def test_perft(engine, name):
+    fen, expected = PERFT_SUITE[name]
+    # checkHash: the incremental Zobrist key is compared with a full recomputation after every move
+    report = runPosition(name, fen, PERFT_DEPTH, engine, expected, checkHash=True)
+    for result in report["results"]:
+        assert result["nodes"] == result["expected"], f"{name} depth {result['depth']}"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_fen_round_trip(engine):
+    for fen, _ in PERFT_SUITE.values():
+        assert ChessEngine.createGameState(engine, fen).getFen() == fen
+    for gameState in randomGamePositions(engine):
+        fen = gameState.getFen()
+        copy = ChessEngine.createGameState(engine, fen)
+        assert copy.getFen() == fen
+        assert copy.zobristKey == gameState.zobristKey, fen
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_evaluation_mirror_symmetry(engine):
+    for gameState in randomGamePositions(engine):
+        mirrored = ChessEngine.createGameState(engine, mirrorFen(gameState.getFen()))
+        assert evaluate(mirrored) == -evaluate(gameState), gameState.getFen()
+
+
+@pytest.mark.parametrize("fen", KING_IN_CHECK_FENS)
+def test_find_legal_king_steps_in_check(fen):
+    found = {}
+    for engine in ENGINES:
+        gameState = ChessEngine.createGameState(engine, fen)
+        validMoves = gameState.getValidMoves()
+        kingSq = gameState.whiteKingSquare if gameState.whiteToMove else gameState.blackKingSquare
+        steps = [ChessEngine.getMove(kingSq, endSq, gameState.squares) for endSq in ChessEngine.KING_TARGETS[kingSq]]
+        found[engine] = [gameState.findLegalMove(step) is not None for step in steps]
+        assert found[engine] == [step in validMoves for step in steps], engine
+    assert len(set(map(tuple, found.values()))) == 1
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_find_legal_move_in_check(engine):
+    positions = 0
+    for gameState in checkPositions(engine):
+        validMoves = gameState.getValidMoves()
+        for move in pseudoMoves(gameState):
+            assert (gameState.findLegalMove(move) is not None) == (move in validMoves), \
+                f"{gameState.getFen()} {move.getUciNotation()}"
+        positions += 1
+    assert positions > len(KING_IN_CHECK_FENS)